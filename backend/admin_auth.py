@@ -0,0 +1,32 @@
+# backend/admin_auth.py
+"""
+运维接口（/api/metrics、打卡导出）的访问控制：请求须带 X-Admin-Token 或 Authorization: Bearer，
+与 ADMIN_TOKEN 一致才放行。未配置 ADMIN_TOKEN 时这些接口关闭，返回 403。
+"""
+import hmac
+import os
+from functools import wraps
+
+from flask import jsonify, request
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def _request_token():
+    token = request.headers.get('X-Admin-Token')
+    if token:
+        return token
+    scheme, _, value = request.headers.get('Authorization', '').partition(' ')
+    return value.strip() if scheme.lower() == 'bearer' else None
+
+
+def require_admin(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': '未配置 ADMIN_TOKEN，运维接口已关闭'}), 403
+        token = _request_token()
+        if token is None or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({'error': '需要管理员令牌'}), 401
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,283 @@
+# backend/admission.py
+"""
+AI 接口的准入控制：
+- 按客户端（IP 或 user_id）的令牌桶限流，超出返回 429 + Retry-After；
+- 全局的上游并发上限：同时在途的 DeepSeek 调用数不超过 AI_UPSTREAM_CONCURRENCY，
+  等不到名额的调用走本地兜底；
+- 过载判断（shed_reason）：排队超出预算、熔断打开或上游名额用完时，
+  接口不再排队，直接用缓存/本地模板/知识库回答并标记 degraded。
+计数默认在进程内（AI_LIMIT_BACKEND=memory），不占用 SQLite 的写锁；
+多个 worker 需要共享限额时设为 sqlite，每次限流判断和取名额都是一次写事务。
+"""
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import request
+from sqlalchemy import text
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from deepseek_client import DeepSeekError
+from extensions import db
+
+# memory：进程内；sqlite：计数在数据库文件中，各 worker 共享
+AI_LIMIT_BACKEND = os.getenv("AI_LIMIT_BACKEND", "memory")
+# 每个客户端每分钟补充的请求数与桶容量（允许的突发数），为 0 时不限流
+AI_RATE_LIMIT_PER_MINUTE = float(os.getenv("AI_RATE_LIMIT_PER_MINUTE", 20))
+AI_RATE_LIMIT_BURST = int(os.getenv("AI_RATE_LIMIT_BURST", 10))
+# ip：按客户端地址；user：请求带 user_id 时按用户（user_id 未经认证，可被伪造），否则按地址
+AI_RATE_LIMIT_KEY = os.getenv("AI_RATE_LIMIT_KEY", "ip")
+# memory 后端最多记录的客户端数
+AI_RATE_LIMIT_MAX_KEYS = int(os.getenv("AI_RATE_LIMIT_MAX_KEYS", 10000))
+# 所有 worker 合计同时在途的 DeepSeek 调用数；等待名额的最长时间（秒）
+AI_UPSTREAM_CONCURRENCY = int(os.getenv("AI_UPSTREAM_CONCURRENCY", 8))
+AI_UPSTREAM_WAIT = float(os.getenv("AI_UPSTREAM_WAIT", 1.0))
+# 名额的租约时长（秒），进程崩溃未释放的名额到期自动回收，应大于一次调用（含重试）的最长耗时
+AI_UPSTREAM_LEASE_TTL = float(os.getenv("AI_UPSTREAM_LEASE_TTL", 120))
+# AI 线程池中等待执行的任务数达到该值时直接降级（0 表示不按排队数降级）
+AI_SHED_QUEUE_DEPTH = int(os.getenv("AI_SHED_QUEUE_DEPTH", 4))
+# 部署在反向代理之后时代理的层数，用 X-Forwarded-For 取客户端地址
+PROXY_FIX_X_FOR = int(os.getenv("PROXY_FIX_X_FOR", 0))
+
+_PRUNE_INTERVAL = 60.0
+# sqlite 后端：等待名额时重新检查的间隔；在途数的缓存时间（过载判断用）
+_LEASE_POLL = 0.25
+_IN_USE_CACHE = 0.5
+
+
+class UpstreamBusy(DeepSeekError):
+    """等待上游并发名额超时，本次调用未发出请求"""
+
+
+# ==================== 令牌桶 ====================
+
+class MemoryBuckets:
+    """进程内令牌桶，按最近使用淘汰"""
+
+    def __init__(self, rate, burst, max_keys=AI_RATE_LIMIT_MAX_KEYS, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()  # key -> [令牌数, 更新时间]
+        self._lock = threading.Lock()
+
+    def take(self, key, cost=1):
+        """取 cost 个令牌，返回 (是否允许, 需要等待的秒数)"""
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            if tokens >= cost:
+                bucket[0], bucket[1] = tokens - cost, now
+                return True, 0.0
+            return False, (cost - tokens) / self.rate
+
+
+class SqliteBuckets:
+    """数据库中的令牌桶，补充和扣减在一条 UPSERT 中完成，多个 worker 并发也不会多放行"""
+
+    _TAKE = text(
+        'INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (:key, :burst - :cost, :now) '
+        'ON CONFLICT(key) DO UPDATE SET '
+        'tokens = min(:burst, tokens + max(:now - updated_at, 0) * :rate) - :cost, updated_at = :now '
+        'WHERE min(:burst, tokens + max(:now - updated_at, 0) * :rate) >= :cost '
+        'RETURNING tokens'
+    )
+
+    def __init__(self, rate, burst, clock=time.time):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._pruned_at = 0.0
+
+    def take(self, key, cost=1):
+        now = self._clock()
+        params = {'key': key, 'cost': cost, 'burst': self.burst, 'rate': self.rate, 'now': now}
+        with db.engine.begin() as conn:
+            if conn.execute(self._TAKE, params).first() is not None:
+                allowed, wait = True, 0.0
+            else:
+                tokens, updated_at = conn.execute(
+                    text('SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = :key'), params
+                ).one()
+                tokens = min(self.burst, tokens + max(now - updated_at, 0) * self.rate)
+                allowed, wait = False, (cost - tokens) / self.rate
+            if now - self._pruned_at > _PRUNE_INTERVAL:
+                # 已经补满的桶与不存在等价
+                self._pruned_at = now
+                conn.execute(text('DELETE FROM rate_limit_buckets WHERE updated_at < :cutoff'),
+                             {'cutoff': now - self.burst / self.rate})
+        return allowed, wait
+
+
+class RateLimiter:
+    def __init__(self, per_minute=AI_RATE_LIMIT_PER_MINUTE, burst=AI_RATE_LIMIT_BURST,
+                 backend=AI_LIMIT_BACKEND):
+        self.enabled = per_minute > 0 and burst > 0
+        rate = per_minute / 60
+        self._buckets = SqliteBuckets(rate, burst) if backend == 'sqlite' else MemoryBuckets(rate, burst)
+        self.burst = burst
+
+    def take(self, key, cost=1):
+        """返回 (是否允许, Retry-After 秒数)；cost 超过桶容量时按容量计"""
+        if not self.enabled:
+            return True, 0
+        allowed, wait = self._buckets.take(key, min(cost, self.burst))
+        if allowed:
+            return True, 0
+        return False, max(math.ceil(wait), 1)
+
+
+def client_key(user_id=None):
+    """限流的客户端标识"""
+    if AI_RATE_LIMIT_KEY == 'user' and user_id is not None:
+        return f'user:{user_id}'
+    return f'ip:{request.remote_addr}'
+
+
+# ==================== 上游并发名额 ====================
+
+class MemorySlots:
+    def __init__(self, limit):
+        self.limit = limit
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._in_use >= self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            self._in_use += 1
+            return True
+
+    def release(self, lease):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def in_use(self):
+        return self._in_use
+
+
+class SqliteSlots:
+    """
+    以 upstream_leases 表中未过期的租约数作为全局在途调用数。
+    等待时先做只读计数，有空位才发起写事务；本进程释放名额时立即唤醒等待者，
+    其他 worker 释放的名额最迟 _LEASE_POLL 秒后被发现。
+    """
+
+    _ACQUIRE = text(
+        'INSERT INTO upstream_leases (id, expires_at) SELECT :id, :expires_at '
+        'WHERE (SELECT count(*) FROM upstream_leases WHERE expires_at > :now) < :limit'
+    )
+
+    def __init__(self, limit, ttl=AI_UPSTREAM_LEASE_TTL):
+        self.limit = limit
+        self.ttl = ttl
+        self._released = threading.Condition()
+        self._in_use_cache = (0.0, 0)
+
+    def _count(self):
+        with db.engine.connect() as conn:
+            return conn.execute(text('SELECT count(*) FROM upstream_leases WHERE expires_at > :now'),
+                                {'now': time.time()}).scalar()
+
+    def _try_acquire(self):
+        lease = uuid.uuid4().hex
+        now = time.time()
+        with db.engine.begin() as conn:
+            conn.execute(text('DELETE FROM upstream_leases WHERE expires_at <= :now'), {'now': now})
+            inserted = conn.execute(self._ACQUIRE, {
+                'id': lease, 'expires_at': now + self.ttl, 'now': now, 'limit': self.limit,
+            }).rowcount
+        return lease if inserted else None
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._count() < self.limit:
+                lease = self._try_acquire()
+                if lease is not None:
+                    return lease
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with self._released:
+                self._released.wait(min(remaining, _LEASE_POLL))
+
+    def release(self, lease):
+        with db.engine.begin() as conn:
+            conn.execute(text('DELETE FROM upstream_leases WHERE id = :id'), {'id': lease})
+        with self._released:
+            self._released.notify()
+
+    def in_use(self):
+        """在途调用数，缓存 _IN_USE_CACHE 秒"""
+        checked_at, count = self._in_use_cache
+        now = time.monotonic()
+        if now - checked_at >= _IN_USE_CACHE:
+            count = self._count()
+            self._in_use_cache = (now, count)
+        return count
+
+
+class UpstreamSlots:
+    def __init__(self, limit=AI_UPSTREAM_CONCURRENCY, backend=AI_LIMIT_BACKEND):
+        self.limit = limit
+        self._slots = SqliteSlots(limit) if backend == 'sqlite' else MemorySlots(limit)
+
+    @contextmanager
+    def hold(self, timeout=AI_UPSTREAM_WAIT):
+        """占用一个上游名额，timeout 秒内等不到时抛出 UpstreamBusy；limit 为 0 时不限制"""
+        if self.limit <= 0:
+            yield
+            return
+        lease = self._slots.acquire(timeout)
+        if lease is None:
+            raise UpstreamBusy('上游并发已满')
+        try:
+            yield
+        finally:
+            self._slots.release(lease)
+
+    def saturated(self):
+        return self.limit > 0 and self._slots.in_use() >= self.limit
+
+
+limiter = RateLimiter()
+upstream_slots = UpstreamSlots()
+
+
+# ==================== 过载降级 ====================
+
+def shed_reason():
+    """当前是否应当降级，返回原因（queue / circuit_open / upstream_busy）或 None"""
+    from ai_executor import executor
+    from ai_service import circuit_open
+
+    if AI_SHED_QUEUE_DEPTH and executor.queued() >= AI_SHED_QUEUE_DEPTH:
+        return 'queue'
+    if circuit_open():
+        return 'circuit_open'
+    if upstream_slots.saturated():
+        return 'upstream_busy'
+    return None
+
+
+def init_app(app):
+    if PROXY_FIX_X_FOR:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_X_FOR)
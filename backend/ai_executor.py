@@ -0,0 +1,232 @@
+# backend/ai_executor.py
+"""
+AI 调用专用的有界线程池：并发数和排队数都有上限，排队超过 AI_QUEUE_WAIT 秒的任务直接放弃。
+流式响应在请求线程内调用上游，另有 AI_MAX_STREAMS 个名额，与线程池互不占用。
+名额用完时 AI 接口立即返回 503（或降级），不会占满服务器的请求线程，目录等普通接口始终有余量。
+同步请求最多等待 AI_RESULT_TIMEOUT 秒；job 模式下请求立即返回 202 和任务 id，结果写入 ai_jobs 表供轮询。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from extensions import db
+from models import AiJob
+
+AI_MAX_WORKERS = int(os.getenv("AI_MAX_WORKERS", 4))
+# 在执行中的任务之外最多再排队的任务数
+AI_QUEUE_SIZE = int(os.getenv("AI_QUEUE_SIZE", 8))
+# 同时进行的流式响应数。AI_MAX_WORKERS + AI_QUEUE_SIZE + AI_MAX_STREAMS 即同时占用请求线程的 AI 请求上限，
+# 应小于服务器线程数，差值就是留给目录、健康检查等接口的容量
+AI_MAX_STREAMS = int(os.getenv("AI_MAX_STREAMS", 4))
+AI_QUEUE_WAIT = float(os.getenv("AI_QUEUE_WAIT", 5.0))
+# 同步请求等待结果的最长时间（含排队），应明显小于服务器的 worker 超时（gunicorn 默认 30 秒）；
+# 超时后返回降级结果，任务继续执行并写入缓存。需要等待更久的客户端应使用 job 模式
+AI_RESULT_TIMEOUT = float(os.getenv("AI_RESULT_TIMEOUT", 10.0))
+AI_RETRY_AFTER = int(os.getenv("AI_RETRY_AFTER", 2))
+# job 模式的客户端不占连接，允许排队更久
+AI_JOB_QUEUE_WAIT = float(os.getenv("AI_JOB_QUEUE_WAIT", 120.0))
+AI_JOB_TTL = float(os.getenv("AI_JOB_TTL", 3600))
+
+
+class AiBusy(Exception):
+    """AI 线程池已满"""
+
+
+class AiQueueTimeout(Exception):
+    """任务排队超过 AI_QUEUE_WAIT"""
+
+
+class AiExecutor:
+    def __init__(self, max_workers=AI_MAX_WORKERS, queue_size=AI_QUEUE_SIZE, queue_wait=AI_QUEUE_WAIT,
+                 max_streams=AI_MAX_STREAMS):
+        self.max_workers = max_workers
+        self.queue_wait = queue_wait
+        self.capacity = max_workers + queue_size
+        self.max_streams = max_streams
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai')
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._stream_slots = threading.BoundedSemaphore(max_streams)
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'rejected': 0, 'expired': 0, 'completed': 0,
+                       'failed': 0, 'queued': 0, 'running': 0, 'streams': 0}
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._stats[key] += delta
+
+    def _acquire(self, slots=None):
+        if not (slots or self._slots).acquire(blocking=False):
+            self._count('rejected')
+            raise AiBusy('AI 服务繁忙，请稍后重试')
+
+    def submit(self, fn, *args, queue_wait=None, **kwargs):
+        """在线程池中执行 fn（带应用上下文），名额已满时抛出 AiBusy"""
+        self._acquire()
+        app = current_app._get_current_object()
+        enqueued = time.monotonic()
+        queue_wait = self.queue_wait if queue_wait is None else queue_wait
+        self._count('submitted')
+        self._count('queued')
+
+        def run():
+            try:
+                self._count('queued', -1)
+                if time.monotonic() - enqueued > queue_wait:
+                    self._count('expired')
+                    raise AiQueueTimeout('AI 任务排队超时')
+                self._count('running')
+                try:
+                    with app.app_context():
+                        result = fn(*args, **kwargs)
+                except Exception:
+                    self._count('failed')
+                    raise
+                finally:
+                    self._count('running', -1)
+                self._count('completed')
+                return result
+            finally:
+                self._slots.release()
+
+        try:
+            return self._pool.submit(run)
+        except RuntimeError:
+            self._count('queued', -1)
+            self._slots.release()
+            raise AiBusy('AI 服务正在关闭')
+
+    def call(self, fn, *args, timeout=AI_RESULT_TIMEOUT, **kwargs):
+        """提交并等待结果；等待超时抛出 concurrent.futures.TimeoutError（任务继续执行，结果仍会写入缓存）"""
+        return self.submit(fn, *args, **kwargs).result(timeout=timeout)
+
+    @contextmanager
+    def stream_slot(self):
+        """流式响应在请求线程内调用上游，占用一个流式名额（不占线程池的名额）"""
+        self._acquire(self._stream_slots)
+        self._count('streams')
+        try:
+            yield
+        finally:
+            self._count('streams', -1)
+            self._stream_slots.release()
+
+    def queued(self):
+        """已提交、尚未开始执行的任务数"""
+        with self._lock:
+            return self._stats['queued']
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, capacity=self.capacity, max_workers=self.max_workers,
+                        max_streams=self.max_streams)
+
+
+executor = AiExecutor()
+
+
+class GuardedStream:
+    """
+    占用一个流式名额的生成器包装，名额不足时在构造时抛出 AiBusy。
+    迭代结束或 close()（客户端断开）时释放名额；未开始迭代就关闭也会释放。
+    """
+
+    def __init__(self, events):
+        self._slot = executor.stream_slot()
+        self._slot.__enter__()
+        self._events = events
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._events)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            close = getattr(self._events, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._slot.__exit__(None, None, None)
+
+
+# ==================== job 模式 ====================
+
+def _cleanup_jobs():
+    cutoff = datetime.utcnow() - timedelta(seconds=AI_JOB_TTL)
+    AiJob.query.filter(AiJob.created_at < cutoff).delete(synchronize_session=False)
+
+
+def _finish_job(job_id, status, result=None, error=None):
+    job = db.session.get(AiJob, job_id)
+    if job is None:
+        return
+    job.status = status
+    job.result = json.dumps(result, ensure_ascii=False) if result is not None else None
+    job.error = error
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def submit_job(kind, params, fn, *args):
+    """
+    创建任务记录并提交到线程池，返回 AiJob。fn 的返回值须可 JSON 序列化。
+    名额已满时抛出 AiBusy，不创建任务。
+    """
+    job_id = uuid.uuid4().hex
+
+    def run():
+        job = db.session.get(AiJob, job_id)
+        if job is not None:
+            job.status = 'running'
+            db.session.commit()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            db.session.rollback()
+            _finish_job(job_id, 'failed', error=str(e))
+            return
+        _finish_job(job_id, 'done', result=result)
+
+    _cleanup_jobs()
+    job = AiJob(id=job_id, kind=kind, status='queued', params=json.dumps(params, ensure_ascii=False))
+    db.session.add(job)
+    db.session.commit()
+
+    try:
+        future = executor.submit(run, queue_wait=AI_JOB_QUEUE_WAIT)
+    except AiBusy:
+        db.session.delete(job)
+        db.session.commit()
+        raise
+
+    app = current_app._get_current_object()
+
+    def on_done(f):
+        # 排队超时的任务没有执行 run，这里补记失败
+        if isinstance(f.exception(), AiQueueTimeout):
+            with app.app_context():
+                _finish_job(job_id, 'failed', error=str(f.exception()))
+
+    future.add_done_callback(on_done)
+    return job
+
+
+def get_job(job_id):
+    return db.session.get(AiJob, job_id)
+
@@ -1,76 +1,125 @@
-import os
-import requests
+import hashlib
 import json
+import logging
+import os
 from dotenv import load_dotenv
 
+from admission import UpstreamBusy, upstream_slots
+from deepseek_client import CircuitOpenError, DeepSeekError, client_from_env
+from singleflight import SingleFlight, SingleFlightTimeout
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # DeepSeek API 配置
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "Your_key")
 DEEPSEEK_API_BASE = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com")
 
+if not DEEPSEEK_API_KEY:
+    logger.warning("未配置 DEEPSEEK_API_KEY，AI 接口将使用本地模板回答")
 
-def _call_deepseek(system_prompt: str, user_prompt: str) -> str:
-    """
-    调用 DeepSeek Chat 接口的简单封装。
-    """
-    if not DEEPSEEK_API_KEY:
-        print("⚠️ 警告：未配置 DEEPSEEK_API_KEY，使用本地模板回答")
-        return ""
+# 讲解词支持的目标人群
+AUDIENCE_TYPES = ("children", "youth", "elderly", "all")
 
-    url = f"{DEEPSEEK_API_BASE}/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json",
-    }
-    data = {
+
+# 进程内共享的 DeepSeek 客户端（连接池 + 重试 + 熔断）
+_client = client_from_env(DEEPSEEK_API_KEY, DEEPSEEK_API_BASE)
+
+# 相同请求的合并器；等待者最多等待的秒数
+_inflight = SingleFlight()
+AI_SINGLEFLIGHT_TIMEOUT = float(os.getenv("AI_SINGLEFLIGHT_TIMEOUT", 30))
+
+# 批量讲解：每次调用最多包含的景点数、输出 token 上限、每段讲解词的预估 token 数
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", 5))
+AI_BATCH_MAX_TOKENS = int(os.getenv("AI_BATCH_MAX_TOKENS", 2048))
+AI_BATCH_TOKENS_PER_VARIANT = int(os.getenv("AI_BATCH_TOKENS_PER_VARIANT", 200))
+
+
+def circuit_open():
+    """DeepSeek 熔断器是否打开（half_open 时放行探测请求，不算打开）"""
+    return _client.breaker.state == 'open'
+
+
+def singleflight_stats():
+    """请求合并统计：总调用、实际上游调用、被合并次数、等待超时次数"""
+    return _inflight.stats()
+
+
+def _chat_payload(system_prompt, user_prompt, max_tokens=256, json_mode=False):
+    payload = {
         "model": "deepseek-chat",
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ],
         "temperature": 0.7,
-        "max_tokens": 256,
-        "stream": False,
+        "max_tokens": max_tokens,
     }
+    if json_mode:
+        payload["response_format"] = {"type": "json_object"}
+    return payload
+
+
+def _request_key(payload):
+    """由提示词和模型参数计算请求指纹，作为 single-flight 合并的 key"""
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _call_deepseek(system_prompt: str, user_prompt: str, max_tokens=256, json_mode=False) -> str:
+    """
+    调用 DeepSeek Chat 接口的简单封装。
+    相同提示词的并发请求只会向上游发出一次，结果（包括失败）由所有调用方共享。
+    """
+    if not DEEPSEEK_API_KEY:
+        logger.debug("未配置 DEEPSEEK_API_KEY，使用本地模板回答")
+        return ""
 
+    payload = _chat_payload(system_prompt, user_prompt, max_tokens, json_mode)
     try:
-        print(f"📡 正在调用 DeepSeek API: {url}")
-        resp = requests.post(url, headers=headers, json=data, timeout=20)
-        
-        if resp.status_code != 200:
-            print(f"❌ DeepSeek API 返回错误状态码: {resp.status_code}")
-            print(f"响应内容: {resp.text}")
-            return ""
-        
-        j = resp.json()
-        
-        if "choices" not in j or not j["choices"]:
-            print("❌ DeepSeek API 返回的 choices 为空")
-            return ""
-        
-        content = j["choices"][0]["message"]["content"]
-        print(f"✅ DeepSeek API 调用成功，返回内容长度: {len(content)}")
-        return content
-        
-    except requests.exceptions.Timeout:
-        print("❌ DeepSeek API 请求超时（20秒）")
+        return _inflight.do(_request_key(payload), lambda: _fetch(payload),
+                            timeout=AI_SINGLEFLIGHT_TIMEOUT)
+    except SingleFlightTimeout:
+        logger.warning("等待相同请求超时，使用本地兜底", extra={'timeout': AI_SINGLEFLIGHT_TIMEOUT})
         return ""
-    except requests.exceptions.ConnectionError as e:
-        print(f"❌ DeepSeek API 连接失败: {e}")
+
+
+def _fetch(payload) -> str:
+    """实际发出一次 DeepSeek 请求，失败返回空字符串"""
+    try:
+        with upstream_slots.hold():
+            logger.debug("正在调用 DeepSeek API", extra={'url': _client.url})
+            content, _ = _client.chat(payload)
+        logger.info("DeepSeek API 调用成功", extra={'chars': len(content)})
+        return content
+    except UpstreamBusy:
+        logger.info("DeepSeek 并发名额已满，使用本地兜底")
         return ""
-    except json.JSONDecodeError as e:
-        print(f"❌ DeepSeek API 返回的不是有效 JSON: {e}")
+    except CircuitOpenError:
+        logger.info("DeepSeek 熔断中，直接使用本地兜底")
         return ""
-    except Exception as e:
-        print(f"❌ DeepSeek API 调用出错: {type(e).__name__}: {e}")
+    except DeepSeekError as e:
+        logger.warning("DeepSeek API 调用失败", extra={'error': str(e)[:300]})
         return ""
 
 
-def generate_explanation(attraction_name, description, category, audience_type):
+def _stream_deepseek(system_prompt: str, user_prompt: str):
     """
-    生成景点讲解：优先调用 DeepSeek，失败则走本地模板。
+    以 stream=True 调用 DeepSeek，逐段产出增量文本。
+    任何失败（包括输出中途断开）都以 DeepSeekError 抛出，由调用方决定如何兜底。
     """
+    if not DEEPSEEK_API_KEY:
+        raise DeepSeekError("未配置 DEEPSEEK_API_KEY")
+
+    # 名额一直占用到流结束或客户端断开
+    with upstream_slots.hold():
+        logger.debug("正在流式调用 DeepSeek API", extra={'url': _client.url})
+        yield from _client.stream_chat(_chat_payload(system_prompt, user_prompt))
+
+
+def _explanation_prompts(attraction_name, description, category, audience_type):
+    """构造景点讲解的 system / user 提示词"""
     system_prompt = "你是华山景区的专业中文导游，用口语化、简洁的中文讲解景点，长度在80-120字左右。"
     user_prompt = f"""请为以下景点生成讲解词：
 
@@ -86,12 +135,13 @@ def generate_explanation(attraction_name, description, category, audience_type):
 - elderly: 强调安全提示和文化内涵
 - all: 平衡介绍历史、自然和风险
 - 不要超过120字"""
+    return system_prompt, user_prompt
 
-    ai_result = _call_deepseek(system_prompt, user_prompt)
-    if ai_result:
-        return ai_result
 
-    # 兜底模板
+def fallback_explanation(attraction_name, description, audience_type):
+    """
+    本地兜底模板讲解词（不经过 DeepSeek）。
+    """
     templates = {
         "children": f"{attraction_name}是华山最神奇的地方，这里有陡峭的悬崖、古老的故事和令人惊叹的景色。小朋友来这里就像在冒险，但要记住安全最重要哦！",
         "youth": f"{attraction_name}：{description}。这是年轻游客的打卡胜地，拍照效果绝赞！挑战自我的完美地点。",
@@ -101,10 +151,163 @@ def generate_explanation(attraction_name, description, category, audience_type):
     return templates.get(audience_type, templates["all"])
 
 
-def answer_huashan_question(question: str) -> str:
+def generate_ai_explanation(attraction_name, description, category, audience_type):
     """
-    AI 问答：优先调用 DeepSeek，失败走本地知识库。
+    仅调用 DeepSeek 生成讲解词，失败时返回空字符串（不走模板）。
+    """
+    system_prompt, user_prompt = _explanation_prompts(
+        attraction_name, description, category, audience_type
+    )
+    return _call_deepseek(system_prompt, user_prompt)
+
+
+def stream_ai_explanation(attraction_name, description, category, audience_type):
+    """
+    流式生成讲解词，逐段产出增量文本；失败抛出 DeepSeekError（不走模板）。
+    """
+    system_prompt, user_prompt = _explanation_prompts(
+        attraction_name, description, category, audience_type
+    )
+    return _stream_deepseek(system_prompt, user_prompt)
+
+
+def _explanation_batches(attractions, audience_types, batch_size, max_tokens):
+    """
+    按批大小和 token 预算把 (景点, 人群) 组合切分成多次调用。
+    每次调用的景点数不超过 batch_size，预计输出不超过 max_tokens。
     """
+    per_call = max(1, max_tokens // AI_BATCH_TOKENS_PER_VARIANT)
+    tasks = []
+    for attraction in attractions:
+        for i in range(0, len(audience_types), per_call):
+            tasks.append((attraction, tuple(audience_types[i:i + per_call])))
+
+    batch, variants = [], 0
+    for attraction, audiences in tasks:
+        if batch and (len(batch) >= batch_size or variants + len(audiences) > per_call):
+            yield batch
+            batch, variants = [], 0
+        batch.append((attraction, audiences))
+        variants += len(audiences)
+    if batch:
+        yield batch
+
+
+def _batch_prompts(batch):
+    system_prompt = (
+        "你是华山景区的专业中文导游，为多个景点、多类游客分别撰写讲解词，"
+        "每段口语化、简洁，长度在80-120字左右。只输出 JSON。"
+    )
+    items = [
+        {
+            "id": a["id"],
+            "name": a["name"],
+            "category": a.get("category"),
+            "description": a.get("description"),
+            "audiences": list(audiences),
+        }
+        for a, audiences in batch
+    ]
+    user_prompt = f"""请为以下每个景点、按 audiences 中列出的每类游客各生成一段讲解词：
+
+{json.dumps(items, ensure_ascii=False)}
+
+人群风格：
+- children: 用简单有趣的比喻和故事
+- youth: 强调刺激性和打卡价值
+- elderly: 强调安全提示和文化内涵
+- all: 平衡介绍历史、自然和风险
+
+每段不要超过120字。按如下 JSON 格式输出，不要输出其他内容：
+{{"items": [{{"id": 景点id, "explanations": {{"人群": "讲解词"}}}}]}}"""
+    return system_prompt, user_prompt
+
+
+def _parse_batch(text, batch):
+    """解析并校验批量结果，返回 {(景点id, 人群): 讲解词}；不合格的条目直接丢弃"""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("{"):]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return {}
+
+    wanted = {(a["id"], audience) for a, audiences in batch for audience in audiences}
+    results = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("explanations"), dict):
+            continue
+        for audience, content in item["explanations"].items():
+            key = (item.get("id"), audience)
+            if key in wanted and isinstance(content, str) and content.strip():
+                results[key] = content.strip()
+    return results
+
+
+def generate_explanations_batch(attractions, audience_types=AUDIENCE_TYPES,
+                                batch_size=None, max_tokens=None):
+    """
+    批量生成讲解词：一次调用为一个或多个景点返回所有目标人群的讲解词。
+    attractions 为含 id/name/description/category 的 dict 列表。
+    返回 {(景点id, 人群): (讲解词, 是否由 DeepSeek 生成)}，解析失败的条目逐条走本地模板。
+    """
+    batch_size = batch_size or AI_BATCH_SIZE
+    max_tokens = max_tokens or AI_BATCH_MAX_TOKENS
+    audience_types = list(audience_types)
+    results = {}
+    for batch in _explanation_batches(attractions, audience_types, batch_size, max_tokens):
+        system_prompt, user_prompt = _batch_prompts(batch)
+        generated = _parse_batch(
+            _call_deepseek(system_prompt, user_prompt, max_tokens=max_tokens, json_mode=True),
+            batch,
+        )
+        for attraction, audiences in batch:
+            for audience in audiences:
+                key = (attraction["id"], audience)
+                if key in generated:
+                    results[key] = (generated[key], True)
+                else:
+                    results[key] = (
+                        fallback_explanation(attraction["name"], attraction.get("description"), audience),
+                        False,
+                    )
+    return results
+
+
+def generate_explanation(attraction_name, description, category, audience_type):
+    """
+    生成景点讲解：优先调用 DeepSeek，失败则走本地模板。
+    """
+    ai_result = generate_ai_explanation(attraction_name, description, category, audience_type)
+    if ai_result:
+        return ai_result
+
+    # 兜底模板
+    return fallback_explanation(attraction_name, description, audience_type)
+
+
+# 本地知识库（兜底）
+LOCAL_QA = {
+    "怎么登华山": "华山有多种登山方式：1) 北峰索道（最常见，时间短）；2) 西峰索道（景色好）；3) 中路步行（全程体验）。大多数游客选择'西上北下'路线，用时6-8小时。",
+    "长空栈道": "长空栈道是华山最著名的险道，宽度不足1米，下面是千米悬崖。恐高症患者或有心血管疾病者强烈建议避免。需全程系安全带，手脚并用。",
+    "体力一般": "体力一般的游客建议：1) 选择北峰索道往返或西峰索道+北峰索道；2) 避免长空栈道等高难度路段；3) 安排充足休息时间；4) 做好防晒和补水。",
+    "看日出": "想看华山日出，建议前一天傍晚到达东峰附近，或者住在山上客栈。东峰是最佳观日出位置。记得带好头灯、防寒衣物和充足水源。",
+    "一日游": "一日游推荐'西上北下'路线：8:00西峰索道上山→游览西峰、中峰、南峰→14:00到达北峰→16:00北峰索道下山。全程需要体力支持。",
+    "儿童": "8岁以上儿童可考虑登华山，但要选择相对安全的路线（索道+北峰或简单路段）。做好防护措施，不要挑战高难度景点。",
+    "票价": "华山门票约100-150元，北峰索道往返约60-80元，西峰索道约100-120元。具体价格以华山景区官方公告为准。",
+    "天气": "华山天气多变，上山前检查天气预报。避免在恶劣天气登山，雷电天气必须下山。做好防晒和防雨准备。",
+}
+
+DEFAULT_ANSWER = "感谢您的提问！建议您访问华山景区官网或拨打景区咨询电话，获取最新的游览信息、票价和安全提示。祝您游览愉快！"
+
+
+def _question_prompts(question):
+    """构造智能问答的 system / user 提示词"""
     system_prompt = "你是华山景区的智能问答助手，用简洁、实用的中文回答游客的常见问题。回答长度控制在100-150字。"
     user_prompt = f"""游客提问：{question}
 
@@ -115,25 +318,57 @@ def answer_huashan_question(question: str) -> str:
 - 最佳季节：春秋季节
 
 请给出实用的建议和安全提醒。"""
+    return system_prompt, user_prompt
+
 
-    ai_result = _call_deepseek(system_prompt, user_prompt)
+def local_answer(question: str) -> str:
+    """
+    本地知识库回答（不经过 DeepSeek）。
+    """
+    for key, answer in LOCAL_QA.items():
+        if key in question:
+            return answer
+    return DEFAULT_ANSWER
+
+
+def generate_ai_answer(question: str) -> str:
+    """
+    仅调用 DeepSeek 回答问题，失败时返回空字符串（不走本地知识库）。
+    """
+    system_prompt, user_prompt = _question_prompts(question)
+    return _call_deepseek(system_prompt, user_prompt)
+
+
+def answer_huashan_question(question: str) -> str:
+    """
+    AI 问答：优先调用 DeepSeek，失败走本地知识库。
+    """
+    ai_result = generate_ai_answer(question)
     if ai_result:
         return ai_result
 
-    # 本地知识库（兜底）
-    qa_db = {
-        "怎么登华山": "华山有多种登山方式：1) 北峰索道（最常见，时间短）；2) 西峰索道（景色好）；3) 中路步行（全程体验）。大多数游客选择'西上北下'路线，用时6-8小时。",
-        "长空栈道": "长空栈道是华山最著名的险道，宽度不足1米，下面是千米悬崖。恐高症患者或有心血管疾病者强烈建议避免。需全程系安全带，手脚并用。",
-        "体力一般": "体力一般的游客建议：1) 选择北峰索道往返或西峰索道+北峰索道；2) 避免长空栈道等高难度路段；3) 安排充足休息时间；4) 做好防晒和补水。",
-        "看日出": "想看华山日出，建议前一天傍晚到达东峰附近，或者住在山上客栈。东峰是最佳观日出位置。记得带好头灯、防寒衣物和充足水源。",
-        "一日游": "一日游推荐'西上北下'路线：8:00西峰索道上山→游览西峰、中峰、南峰→14:00到达北峰→16:00北峰索道下山。全程需要体力支持。",
-        "儿童": "8岁以上儿童可考虑登华山，但要选择相对安全的路线（索道+北峰或简单路段）。做好防护措施，不要挑战高难度景点。",
-        "票价": "华山门票约100-150元，北峰索道往返约60-80元，西峰索道约100-120元。具体价格以华山景区官方公告为准。",
-        "天气": "华山天气多变，上山前检查天气预报。避免在恶劣天气登山，雷电天气必须下山。做好防晒和防雨准备。",
-    }
+    return local_answer(question)
 
-    for key, answer in qa_db.items():
-        if key in question:
-            return answer
 
-    return "感谢您的提问！建议您访问华山景区官网或拨打景区咨询电话，获取最新的游览信息、票价和安全提示。祝您游览愉快！"
+def stream_huashan_answer(question: str):
+    """
+    流式 AI 问答：逐段产出 ('delta', 文本)，最后产出 ('done', 来源)。
+    上游在输出任何内容前失败时，整段返回本地知识库回答。
+    """
+    system_prompt, user_prompt = _question_prompts(question)
+    stream = _stream_deepseek(system_prompt, user_prompt)
+    received = False
+    try:
+        for delta in stream:
+            received = True
+            yield 'delta', delta
+        yield 'done', 'ai'
+    except DeepSeekError as e:
+        if received:
+            logger.warning("DeepSeek 流式输出中断", extra={'error': str(e)[:300]})
+            yield 'done', 'ai_partial'
+        else:
+            yield 'delta', local_answer(question)
+            yield 'done', 'local'
+    finally:
+        stream.close()
@@ -1,13 +1,49 @@
 # backend/app.py
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import logging
+
+import click
 from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
 from extensions import db
+import admission
+import cache_warmup
+import checkin_stats
+import checkin_writer
+import compression
+import instrumentation
+import query_counter
+import serialization
+import storage
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# 导入本模块及其依赖的耗时（毫秒）
+_IMPORT_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+
+
+def create_app(test_config=None):
+    """
+    应用工厂：只做配置和注册，不访问数据库。
+    建表/迁移和初始数据分别由 `flask init-db`、`flask seed` 完成。
+    各阶段耗时记录在 app.extensions['startup_timings']（毫秒）。
+    """
+    timings = {'import': _IMPORT_MS}
+    phase = time.perf_counter()
+
+    def mark(name):
+        nonlocal phase
+        now = time.perf_counter()
+        timings[name] = round((now - phase) * 1000, 1)
+        phase = now
 
-def create_app():
+    instrumentation.configure_logging()
     app = Flask(__name__)
     
     # 配置 CORS - 允许来自所有域名的请求
@@ -19,28 +55,78 @@ def create_app():
             "supports_credentials": False
         }
     })
-    
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if test_config:
+        app.config.update(test_config)
+    mark('config')
 
-    db.init_app(app)
+    admission.init_app(app)
+    serialization.init_app(app)
+    compression.init_app(app)
+    storage.init_app(app, db)
+    query_counter.init_app(app)
+    instrumentation.init_app(app)
+    checkin_writer.init_app(app)
+    checkin_stats.init_app(app)
+    cache_warmup.init_app(app)
+    mark('db_init')
 
-    # 延迟导入，避免循环
     from routes import api_bp
-    from models import Attraction, Route
-
     app.register_blueprint(api_bp, url_prefix='/api')
+    register_commands(app)
+    mark('blueprints')
 
-    with app.app_context():
-        db.create_all()
-        if Attraction.query.first() is None:
-            init_attractions()
-        if Route.query.first() is None:
-            init_routes()
-
+    timings['total'] = round(sum(timings.values()), 1)
+    app.extensions['startup_timings'] = timings
+    logger.info("应用启动耗时(ms)", extra={'timings': timings})
     return app
 
 
+def init_db():
+    """建表、执行未应用的迁移，并检查常用查询的执行计划"""
+    from migrations import migrate
+
+    db.create_all()
+    version = migrate()
+    if storage.QUERY_PLAN_CHECK:
+        storage.check_query_plans(db)
+    return version
+
+
+def seed_db():
+    """写入初始数据；已有数据的表跳过，返回实际写入的表名"""
+    from models import Attraction, Route, FaqEntry, TrailSegment
+    from faq_index import seed_faq_entries
+
+    seeded = []
+    if Attraction.query.first() is None:
+        init_attractions()
+        seeded.append('attractions')
+    if Route.query.first() is None:
+        init_routes()
+        seeded.append('routes')
+    if FaqEntry.query.first() is None:
+        seed_faq_entries()
+        seeded.append('faq_entries')
+    if TrailSegment.query.first() is None:
+        init_trail_segments()
+        seeded.append('trail_segments')
+    return seeded
+
+
+def register_commands(app):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """建表并执行数据库迁移"""
+        version = init_db()
+        click.echo(f'数据库已就绪，schema 版本 {version}')
+
+    @app.cli.command('seed')
+    def seed_command():
+        """写入初始景点、路线、FAQ 和步道数据（已有数据的表跳过）"""
+        seeded = seed_db()
+        click.echo(f"已写入: {', '.join(seeded)}" if seeded else '已有数据，无需写入')
+
+
 def init_attractions():
     from models import Attraction
     from extensions import db
@@ -198,11 +284,50 @@ def init_routes():
         ),
     ]
     for r in routes:
+        r.set_attraction_ids(json.loads(r.attractions))
         db.session.add(r)
     db.session.commit()
 
 
-app = create_app()
+def init_trail_segments():
+    from models import Attraction, TrailSegment
+    from extensions import db
+
+    ids = {a.name: a.id for a in Attraction.query.all()}
+    # (起点, 终点, 名称, 类型, 耗时分钟, 难度, 是否临崖)
+    segments = [
+        ('玉泉院', '北峰（云台峰）', '北峰索道', 'cable_car', 20, 0, False),
+        ('玉泉院', '西峰（莲花峰）', '西峰索道', 'cable_car', 40, 0, False),
+        ('玉泉院', '北峰（云台峰）', '智取华山路', 'trail', 240, 3, True),
+        ('北峰（云台峰）', '苍龙岭', '擦耳崖-上天梯', 'trail', 60, 3, True),
+        ('苍龙岭', '中峰（玉女峰）', '金锁关', 'trail', 40, 2, False),
+        ('中峰（玉女峰）', '东峰（朝阳峰）', '中峰-东峰步道', 'trail', 30, 2, False),
+        ('中峰（玉女峰）', '西峰（莲花峰）', '中峰-西峰步道', 'trail', 50, 2, False),
+        ('中峰（玉女峰）', '南峰（落雁峰）', '中峰-南峰步道', 'trail', 40, 2, False),
+        ('西峰（莲花峰）', '南峰（落雁峰）', '西峰-南峰步道', 'trail', 40, 3, False),
+        ('东峰（朝阳峰）', '南峰（落雁峰）', '东峰-南峰步道', 'trail', 40, 3, False),
+        ('东峰（朝阳峰）', '鹞子翻身', '鹞子翻身铁索', 'trail', 20, 4, True),
+        ('南峰（落雁峰）', '长空栈道', '长空栈道入口', 'trail', 20, 4, True),
+    ]
+    for start, end, name, kind, minutes, difficulty, exposed in segments:
+        if start not in ids or end not in ids:
+            continue
+        db.session.add(TrailSegment(
+            from_attraction_id=ids[start],
+            to_attraction_id=ids[end],
+            name=name,
+            kind=kind,
+            walking_minutes=minutes,
+            difficulty_level=difficulty,
+            exposed=exposed,
+        ))
+    db.session.commit()
+
 
 if __name__ == '__main__':
+    # 本地开发：直接运行时顺带建表和写入初始数据
+    app = create_app()
+    with app.app_context():
+        init_db()
+        seed_db()
     app.run(debug=True, host='0.0.0.0', port=15500)
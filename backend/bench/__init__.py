@@ -0,0 +1,21 @@
+# backend/bench/__init__.py
+"""
+压测工具（在 backend 目录下运行）：
+
+    # 1. 本地 DeepSeek 替身，可配置延迟、错误率和流式输出
+    python -m bench.stub_server --port 18080 --latency-ms 800 --error-rate 0.02
+
+    # 2. 生成可复现的压测数据库
+    python -m bench.dataset --database sqlite:////tmp/bench.db --preset 100k
+
+    # 3. 用同一个数据库和替身启动服务（压测客户端只有一个地址，需关闭 AI 接口的按客户端限流；
+    #    指标和导出接口需要管理员令牌）
+    DATABASE_URL=sqlite:////tmp/bench.db DEEPSEEK_API_BASE=http://127.0.0.1:18080 DEEPSEEK_API_KEY=bench \
+        AI_RATE_LIMIT_PER_MINUTE=0 ADMIN_TOKEN=bench gunicorn -w 4 -k gthread --threads 16 -b 127.0.0.1:15500 "app:create_app()"
+
+    # 4. 并发访问全部 /api/* 接口，结果写入 JSON
+    ADMIN_TOKEN=bench python -m bench.run --base-url http://127.0.0.1:15500 --duration 60 --concurrency 32 -o before.json
+
+    # 5. 对比两次结果
+    python -m bench.compare before.json after.json
+"""
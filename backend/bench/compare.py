@@ -0,0 +1,64 @@
+# backend/bench/compare.py
+"""
+对比两次压测结果（bench.run 输出的 JSON），逐个接口列出吞吐量和 p50/p95/p99 的变化。
+--fail-over 给出 p99 允许的最大增幅（百分比），超出时以状态码 1 退出，便于在 CI 中使用。
+"""
+import argparse
+import json
+
+METRICS = ('throughput', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def _change(before, after):
+    if not before:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+def compare(before, after):
+    """返回 {接口: {指标: (之前, 之后, 变化百分比)}}；只在一侧出现的接口值为 None"""
+    result = {}
+    for name in sorted(set(before['endpoints']) | set(after['endpoints'])):
+        b = before['endpoints'].get(name)
+        a = after['endpoints'].get(name)
+        if b is None or a is None:
+            result[name] = None
+            continue
+        result[name] = {m: (b[m], a[m], _change(b[m], a[m])) for m in METRICS}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比两次压测结果')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--fail-over', type=float, help='p99 增幅超过该百分比时返回非零状态')
+    args = parser.parse_args(argv)
+
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+
+    print(f"之前: {before['meta'].get('commit')}  之后: {after['meta'].get('commit')}")
+    print(f"{'接口':<52}" + ''.join(f'{m:>22}' for m in METRICS))
+    regressions = []
+    for name, row in compare(before, after).items():
+        if row is None:
+            print(f'{name:<52}  （只在一次结果中出现）')
+            continue
+        cells = []
+        for m in METRICS:
+            b, a, change = row[m]
+            cells.append(f"{b:>8} → {a:<8}{'' if change is None else f'{change:+.1f}%':>6}")
+        print(f'{name:<52}' + ''.join(f'{c:>22}' for c in cells))
+        change = row['p99_ms'][2]
+        if args.fail_over is not None and change is not None and change > args.fail_over:
+            regressions.append(name)
+    if regressions:
+        print(f'p99 增幅超过 {args.fail_over}%: {", ".join(regressions)}')
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# backend/bench/dataset.py
+"""
+压测数据生成：在初始数据之外按固定随机种子批量生成景点、商家、用户和打卡，
+相同的种子和规模总是得到相同的数据，不同提交之间的压测结果才可比较。
+数据直接批量插入，结束后递增相关数据版本号、重建搜索索引并重算打卡汇总。
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+
+# 各规模的行数：(景点, 商家, 用户, 打卡)
+PRESETS = {
+    '10k': (200, 2000, 2000, 10000),
+    '100k': (1000, 10000, 20000, 100000),
+    '1m': (5000, 50000, 100000, 1000000),
+}
+BATCH_SIZE = 5000
+
+# 华山景区范围，生成的坐标落在其中
+LAT_RANGE = (34.455, 34.500)
+LON_RANGE = (110.060, 110.110)
+CENTER = (34.4775, 110.0850)
+
+MERCHANT_CATEGORIES = ('餐饮', '住宿', '购物', '交通', '娱乐')
+AGE_GROUPS = ('child', 'youth', 'adult', 'elderly')
+FITNESS_LEVELS = ('weak', 'normal', 'good')
+CHECKIN_DAYS = 30
+
+
+def _chunks(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk_insert(model, rows, label, report):
+    from extensions import db
+
+    inserted = 0
+    for batch in _chunks(rows):
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+        inserted += len(batch)
+        report(f'{label}: {inserted}')
+    return inserted
+
+
+def _attractions(rng, count, templates):
+    for i in range(count):
+        template = rng.choice(templates)
+        yield {
+            'name': f'压测景点{i + 1:05d}',
+            'description': f'{template.description}（压测数据 {i + 1}）',
+            'category': template.category,
+            'latitude': rng.uniform(*LAT_RANGE),
+            'longitude': rng.uniform(*LON_RANGE),
+            'altitude': rng.randint(400, 2160),
+            'difficulty_level': rng.randint(1, 5),
+            'estimated_time': rng.choice((15, 30, 45, 60, 90, 120)),
+            'safety_level': template.safety_level,
+            'image_url': '',
+        }
+
+
+def _merchants(rng, count):
+    from geo_index import haversine
+
+    for i in range(count):
+        lat, lon = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+        yield {
+            'name': f'压测商家{i + 1:06d}',
+            'category': rng.choice(MERCHANT_CATEGORIES),
+            'location': f'华山景区{rng.randint(1, 99)}号',
+            'phone': f'0913-{rng.randint(1000000, 9999999)}',
+            # 保留一位小数，让排序键有大量重复值，覆盖 keyset 分页的并列情况
+            'rating': round(rng.uniform(3.0, 5.0), 1),
+            'commission_rate': round(rng.uniform(0.02, 0.2), 3),
+            'url': '',
+            'distance_from_center': round(haversine(lat, lon, *CENTER) / 1000, 3),
+            'latitude': lat,
+            'longitude': lon,
+        }
+
+
+def _users(rng, count, offset):
+    for i in range(count):
+        yield {
+            'username': f'bench_user_{offset + i + 1}',
+            'age_group': rng.choice(AGE_GROUPS),
+            'fitness_level': rng.choice(FITNESS_LEVELS),
+            'fear_of_heights': rng.random() < 0.2,
+            'has_medical_condition': rng.random() < 0.1,
+            'created_at': datetime.utcnow(),
+        }
+
+
+def _checkins(rng, count, user_ids, attraction_ids, now):
+    # 热门景点的打卡更多：按幂律给景点分配权重
+    weights = [1 / math.sqrt(i + 1) for i in range(len(attraction_ids))]
+    span = CHECKIN_DAYS * 24 * 3600
+    for _ in range(count):
+        yield {
+            'user_id': rng.choice(user_ids),
+            'attraction_id': rng.choices(attraction_ids, weights)[0],
+            'checked_in_at': now - timedelta(seconds=int(span * rng.random() ** 2)),
+            'notes': '',
+            'rating': rng.randint(1, 5) if rng.random() < 0.6 else None,
+        }
+
+
+def generate(attractions, merchants, users, checkins, seed=42, report=print):
+    """在当前应用上下文的数据库中生成数据，返回各表插入的行数"""
+    from catalog import CATALOG
+    from checkin_stats import rebuild_stats
+    from extensions import db
+    from geo_index import MERCHANTS
+    from models import Attraction, Merchant, User, UserCheckIn
+    from search_index import rebuild as rebuild_search
+    from trail_graph import TRAIL_GRAPH
+    from versioning import bump_version
+
+    rng = random.Random(seed)
+    templates = Attraction.query.order_by(Attraction.id).all()
+    if not templates:
+        raise RuntimeError('请先执行 flask seed 写入初始景点')
+    user_offset = db.session.query(func.count(User.id)).scalar()
+
+    counts = {
+        'attractions': _bulk_insert(Attraction, _attractions(rng, attractions, templates), '景点', report),
+        'merchants': _bulk_insert(Merchant, _merchants(rng, merchants), '商家', report),
+        'users': _bulk_insert(User, _users(rng, users, user_offset), '用户', report),
+    }
+    attraction_ids = [row[0] for row in db.session.query(Attraction.id).order_by(Attraction.id)]
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+    # 打卡数据不走批量写入队列，直接插入后统一重算汇总
+    counts['checkins'] = _bulk_insert(
+        UserCheckIn, _checkins(rng, checkins, user_ids, attraction_ids, datetime.utcnow()), '打卡', report)
+
+    # 批量插入不经过 ORM flush，需手动递增版本号，让运行中的服务重建快照和索引
+    with db.engine.begin() as conn:
+        for name in (CATALOG, MERCHANTS, TRAIL_GRAPH):
+            bump_version(conn, name)
+        report(f'搜索文档: {rebuild_search(conn)}')
+    rebuild_stats(progress=lambda n: report(f'汇总: {n}'))
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成可复现的压测数据')
+    parser.add_argument('--database', required=True, help='目标数据库地址，例如 sqlite:////tmp/bench.db')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='10k', help='数据规模')
+    parser.add_argument('--attractions', type=int, help='覆盖预设的景点数')
+    parser.add_argument('--merchants', type=int, help='覆盖预设的商家数')
+    parser.add_argument('--users', type=int, help='覆盖预设的用户数')
+    parser.add_argument('--checkins', type=int, help='覆盖预设的打卡数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--quiet', action='store_true', help='不输出进度')
+    args = parser.parse_args(argv)
+
+    from app import create_app, init_db, seed_db
+    from models import UserCheckIn
+
+    preset = PRESETS[args.preset]
+    sizes = [
+        preset[i] if value is None else value
+        for i, value in enumerate((args.attractions, args.merchants, args.users, args.checkins))
+    ]
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database})
+    report = (lambda message: None) if args.quiet else print
+    with app.app_context():
+        init_db()
+        seed_db()
+        if UserCheckIn.query.first() is not None:
+            raise SystemExit('目标数据库已有打卡数据，请使用新的数据库文件')
+        started = time.monotonic()
+        counts = generate(*sizes, seed=args.seed, report=report)
+    print(f'生成完成: {counts}，用时 {time.monotonic() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
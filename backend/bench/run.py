@@ -0,0 +1,217 @@
+# backend/bench/run.py
+"""
+压测执行：concurrency 个线程在 duration 秒内按场景权重循环发起请求（闭环，每个线程同一时刻只有一个请求），
+按接口统计请求数、吞吐量、状态码和 p50/p95/p99 延迟，写入 JSON 文件。
+延迟为发出请求到读完整个响应体（流式接口即整段输出结束）的时间。
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import requests
+
+from bench.scenarios import MIXES, Context
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """最近秩法的百分位数；sorted_values 须已排序"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class Recorder:
+    """线程安全地收集每个请求的 (名称, 状态码, 耗时)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(list)
+        self._statuses = defaultdict(lambda: defaultdict(int))
+
+    def add(self, name, status, seconds):
+        with self._lock:
+            self._latencies[name].append(seconds)
+            self._statuses[name][status] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        total = errors = 0
+        with self._lock:
+            names = sorted(self._latencies)
+            for name in names:
+                values = sorted(self._latencies[name])
+                statuses = dict(sorted(self._statuses[name].items()))
+                failed = sum(n for s, n in statuses.items() if s == 'error' or int(s) >= 500)
+                total += len(values)
+                errors += failed
+                endpoints[name] = {
+                    'requests': len(values),
+                    'errors': failed,
+                    'throughput': round(len(values) / elapsed, 2),
+                    'status': statuses,
+                    'mean_ms': round(sum(values) / len(values) * 1000, 2),
+                    **{f'p{p}_ms': round(percentile(values, p) * 1000, 2) for p in PERCENTILES},
+                    'max_ms': round(values[-1] * 1000, 2),
+                }
+        return {
+            'requests': total,
+            'errors': errors,
+            'throughput': round(total / elapsed, 2),
+        }, endpoints
+
+
+class Client:
+    """场景使用的 HTTP 客户端：每个线程一个 keep-alive 会话，记录每个请求"""
+
+    def __init__(self, base_url, recorder, timeout, deadline, admin_token=None):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.deadline = deadline
+        self.session = requests.Session()
+        if admin_token:
+            # 指标、导出等运维接口需要管理员令牌
+            self.session.headers['X-Admin-Token'] = admin_token
+
+    def request(self, method, path, name, **kwargs):
+        started = time.perf_counter()
+        try:
+            resp = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            body = resp.content
+            status = str(resp.status_code)
+        except requests.RequestException:
+            self.recorder.add(f'{method} {name}', 'error', time.perf_counter() - started)
+            return None
+        self.recorder.add(f'{method} {name}', status, time.perf_counter() - started)
+        if 'json' not in resp.headers.get('Content-Type', ''):
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    def get(self, path, name, **kwargs):
+        return self.request('GET', path, name, **kwargs)
+
+    def post(self, path, name, **kwargs):
+        return self.request('POST', path, name, **kwargs)
+
+    def sleep(self, seconds):
+        time.sleep(max(min(seconds, self.deadline - time.monotonic()), 0))
+
+
+def discover(base_url, timeout=30):
+    """读取景点和路线 id，作为场景的参数来源"""
+    session = requests.Session()
+    attractions = session.get(f'{base_url}/api/attractions', timeout=timeout).json()
+    routes = session.get(f'{base_url}/api/routes', timeout=timeout).json()
+    route_stops = {r['id']: [s['id'] if isinstance(s, dict) else s for s in r.get('attractions') or []]
+                   for r in routes}
+    route_stops = {k: v for k, v in route_stops.items() if v}
+    if not attractions or not route_stops:
+        raise SystemExit('服务中没有景点或路线数据，请先执行 flask seed / python -m bench.dataset')
+    return [a['id'] for a in attractions], sorted(route_stops), route_stops
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(base_url, mix='all', duration=30.0, concurrency=16, seed=1, max_user_id=1000, timeout=60.0,
+        warmup=0.0, admin_token=None):
+    """执行一次压测，返回结果 dict"""
+    base_url = base_url.rstrip('/')
+    attraction_ids, route_ids, route_stops = discover(base_url)
+    scenarios = MIXES[mix]
+    functions, weights = list(scenarios), list(scenarios.values())
+
+    def work(index, recorder, deadline):
+        ctx = Context(attraction_ids, route_ids, route_stops, max_user_id, random.Random(seed * 1000 + index))
+        client = Client(base_url, recorder, timeout, deadline, admin_token)
+        while time.monotonic() < deadline:
+            ctx.rng.choices(functions, weights)[0](client, ctx)
+
+    def phase(seconds):
+        recorder = Recorder()
+        deadline = time.monotonic() + seconds
+        threads = [threading.Thread(target=work, args=(i, recorder, deadline), daemon=True)
+                   for i in range(concurrency)]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return recorder, time.monotonic() - started
+
+    if warmup > 0:
+        phase(warmup)
+    recorder, elapsed = phase(duration)
+    totals, endpoints = recorder.summary(elapsed)
+    return {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'base_url': base_url,
+            'mix': mix,
+            'duration': duration,
+            'elapsed': round(elapsed, 2),
+            'concurrency': concurrency,
+            'seed': seed,
+            'python': platform.python_version(),
+            'host': platform.node(),
+        },
+        'totals': totals,
+        'endpoints': endpoints,
+    }
+
+
+def print_table(result):
+    print(f"{'接口':<52}{'请求':>8}{'错误':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, e in result['endpoints'].items():
+        print(f"{name:<52}{e['requests']:>8}{e['errors']:>6}{e['throughput']:>9}"
+              f"{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}")
+    t = result['totals']
+    print(f"合计 {t['requests']} 个请求，{t['errors']} 个错误，{t['throughput']} req/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='并发压测 /api/* 接口')
+    parser.add_argument('--base-url', default='http://127.0.0.1:15500')
+    parser.add_argument('--mix', choices=sorted(MIXES), default='all', help='场景组合')
+    parser.add_argument('--duration', type=float, default=30, help='压测秒数')
+    parser.add_argument('--warmup', type=float, default=5, help='正式统计前的预热秒数')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发线程数')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-user-id', type=int, default=1000, help='随机用户 id 的上限，与数据规模一致')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--admin-token', default=os.getenv('ADMIN_TOKEN'), help='运维接口的管理员令牌，默认取 ADMIN_TOKEN')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件')
+    args = parser.parse_args(argv)
+
+    result = run(args.base_url, args.mix, args.duration, args.concurrency, args.seed, args.max_user_id,
+                 args.timeout, args.warmup, args.admin_token)
+    print_table(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, sort_keys=False)
+            f.write('\n')
+        print(f'结果已写入 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
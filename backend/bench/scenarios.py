@@ -0,0 +1,240 @@
+# backend/bench/scenarios.py
+"""
+压测场景：每个场景是一次用户操作，可能包含多个请求（例如提交 job 后轮询结果）。
+请求按 方法 + 路由模板 命名（与 /api/metrics 中的 endpoint 标签一致，流式和 job 模式另加参数后缀），
+结果按名称分别统计。
+MIXES 定义各组合中场景的权重；all 覆盖全部 /api/* 接口。
+"""
+import itertools
+from datetime import datetime, timedelta
+
+QUESTIONS = (
+    '华山门票多少钱？', '华山索道几点开门？', '西峰索道和北峰索道怎么选？', '东峰看日出几点出发？',
+    '华山一日游怎么安排？', '长空栈道需要排队多久？', '带老人爬华山要注意什么？', '夜爬华山安全吗？',
+)
+AUDIENCE_TYPES = ('children', 'youth', 'elderly', 'all')
+SEARCH_TERMS = ('西峰', '索道', '日出', '华山', '栈道', '峰', 'cable', '餐饮')
+
+
+class Context:
+    """压测开始前从服务读取的 id 列表，以及每个工作线程自己的随机数发生器"""
+
+    def __init__(self, attraction_ids, route_ids, route_stops, max_user_id, rng):
+        self.attraction_ids = attraction_ids
+        self.route_ids = route_ids
+        self.route_stops = route_stops  # 路线 id -> 途经景点 id
+        self.max_user_id = max_user_id
+        self.rng = rng
+
+    def attraction(self):
+        return self.rng.choice(self.attraction_ids)
+
+    def route(self):
+        return self.rng.choice(self.route_ids)
+
+    def user(self):
+        return self.rng.randint(1, self.max_user_id)
+
+    def point(self):
+        return round(self.rng.uniform(34.455, 34.500), 5), round(self.rng.uniform(110.060, 110.110), 5)
+
+
+_unique = itertools.count()
+
+
+# ==================== 目录 ====================
+
+def attractions(client, ctx):
+    client.get('/api/attractions', '/api/attractions')
+
+
+def attraction_detail(client, ctx):
+    client.get(f'/api/attractions/{ctx.attraction()}', '/api/attractions/<int:attraction_id>')
+
+
+def attractions_nearby(client, ctx):
+    lat, lon = ctx.point()
+    client.get(f'/api/attractions/nearby?lat={lat}&lon={lon}&k=10', '/api/attractions/nearby')
+
+
+def attractions_heat(client, ctx):
+    client.get(f'/api/attractions/heat?hours={ctx.rng.choice((1, 6, 24))}', '/api/attractions/heat')
+
+
+def attraction_stats(client, ctx):
+    client.get(f'/api/attractions/{ctx.attraction()}/stats?hours=24',
+               '/api/attractions/<int:attraction_id>/stats')
+
+
+def routes(client, ctx):
+    suffix = '?expand=attractions' if ctx.rng.random() < 0.5 else ''
+    client.get(f'/api/routes{suffix}', '/api/routes')
+
+
+def route_detail(client, ctx):
+    client.get(f'/api/routes/{ctx.route()}', '/api/routes/<int:route_id>')
+
+
+def route_recommend(client, ctx):
+    client.post('/api/routes/recommend', '/api/routes/recommend', json={
+        'fitness_level': ctx.rng.choice(('weak', 'normal', 'good')),
+        'fear_of_heights': ctx.rng.random() < 0.2,
+    })
+
+
+def route_plan(client, ctx):
+    stops = ctx.route_stops[ctx.route()]
+    client.post('/api/routes/plan', '/api/routes/plan', json={
+        'start_id': stops[0],
+        'must_see': ctx.rng.sample(stops, min(2, len(stops))),
+        'fear_of_heights': ctx.rng.random() < 0.3,
+    })
+
+
+# ==================== 商家 ====================
+
+def merchants_page(client, ctx):
+    sort = ctx.rng.choice(('rating', 'distance', 'commission_rate'))
+    data = client.get(f'/api/merchants?limit=20&sort={sort}', '/api/merchants')
+    cursor = data.get('next_cursor') if isinstance(data, dict) else None
+    if cursor:
+        client.get(f'/api/merchants?limit=20&sort={sort}&cursor={cursor}', '/api/merchants')
+
+
+def merchants_nearby(client, ctx):
+    lat, lon = ctx.point()
+    client.get(f'/api/merchants/nearby?lat={lat}&lon={lon}&radius=500', '/api/merchants/nearby')
+
+
+# ==================== 用户与打卡 ====================
+
+def user_create_and_get(client, ctx):
+    data = client.post('/api/users', '/api/users', json={
+        'username': f'bench_{ctx.rng.getrandbits(32):08x}_{next(_unique)}',
+        'age_group': 'adult',
+        'fitness_level': ctx.rng.choice(('weak', 'normal', 'good')),
+    })
+    user_id = data.get('id') if isinstance(data, dict) else None
+    client.get(f'/api/users/{user_id or ctx.user()}', '/api/users/<int:user_id>')
+
+
+def checkin(client, ctx):
+    client.post('/api/checkin', '/api/checkin', json={
+        'user_id': ctx.user(),
+        'attraction_id': ctx.attraction(),
+        'rating': ctx.rng.randint(1, 5),
+    })
+
+
+def user_checkins(client, ctx):
+    client.get(f'/api/checkins/{ctx.user()}', '/api/checkins/<int:user_id>')
+
+
+def export_recent(client, ctx):
+    since = (datetime.utcnow() - timedelta(minutes=10)).isoformat()
+    client.get(f'/api/checkins/export?since={since}', '/api/checkins/export')
+
+
+def export_user(client, ctx):
+    fmt = ctx.rng.choice(('ndjson', 'csv'))
+    client.get(f'/api/checkins/{ctx.user()}/export?format={fmt}', '/api/checkins/<int:user_id>/export')
+
+
+# ==================== 安全检查 ====================
+
+def safety_check(client, ctx):
+    client.post('/api/safety-check', '/api/safety-check',
+                json={'attraction_id': ctx.attraction(), 'user_id': ctx.user()})
+
+
+def safety_check_batch(client, ctx):
+    client.post('/api/safety-check/batch', '/api/safety-check/batch',
+                json={'route_id': ctx.route(), 'profile': {'fear_of_heights': ctx.rng.random() < 0.5}})
+
+
+# ==================== AI ====================
+
+def ai_explain(client, ctx):
+    suffix = '?stream=1' if ctx.rng.random() < 0.3 else ''
+    client.post(f'/api/ai/explain/{ctx.attraction()}{suffix}', f'/api/ai/explain/<int:attraction_id>{suffix}',
+                json={'audience_type': ctx.rng.choice(AUDIENCE_TYPES)})
+
+
+def ai_explain_batch(client, ctx):
+    ids = ctx.rng.sample(ctx.attraction_ids, min(3, len(ctx.attraction_ids)))
+    client.post('/api/ai/explain/batch', '/api/ai/explain/batch',
+                json={'attraction_ids': ids, 'audience_types': ['all']})
+
+
+def ai_ask(client, ctx):
+    # 一半是常见问题（命中 FAQ），一半是新问题（调用上游）
+    if ctx.rng.random() < 0.5:
+        question = ctx.rng.choice(QUESTIONS)
+    else:
+        question = f'第{next(_unique)}个问题：{ctx.rng.choice(QUESTIONS)}'
+    suffix = '?stream=1' if ctx.rng.random() < 0.3 else ''
+    client.post(f'/api/ai/ask{suffix}', f'/api/ai/ask{suffix}', json={'question': question})
+
+
+def ai_job(client, ctx):
+    data = client.post(f'/api/ai/explain/{ctx.attraction()}?mode=job',
+                       '/api/ai/explain/<int:attraction_id>?mode=job',
+                       json={'audience_type': ctx.rng.choice(AUDIENCE_TYPES)})
+    job_id = data.get('job_id') if isinstance(data, dict) else None
+    for _ in range(20):
+        if not job_id:
+            return
+        data = client.get(f'/api/ai/jobs/{job_id}', '/api/ai/jobs/<job_id>')
+        if not isinstance(data, dict) or data.get('status') in ('done', 'failed'):
+            return
+        client.sleep(0.25)
+
+
+# ==================== 离线包 ====================
+
+def offline_bundle(client, ctx):
+    data = client.get('/api/offline/bundle', '/api/offline/bundle')
+    version = data.get('version') if isinstance(data, dict) else None
+    if version:
+        client.get(f'/api/offline/bundle?since={version}', '/api/offline/bundle?since')
+
+
+# ==================== 搜索 ====================
+
+def search(client, ctx):
+    params = {'q': ctx.rng.choice(SEARCH_TERMS)}
+    if ctx.rng.random() < 0.3:
+        params['type'] = ctx.rng.choice(('attraction', 'explanation', 'merchant'))
+    data = client.get('/api/search', '/api/search', params=params)
+    next_offset = data.get('next_offset') if isinstance(data, dict) else None
+    if next_offset is not None:
+        client.get('/api/search', '/api/search', params={**params, 'offset': next_offset})
+
+
+# ==================== 运维 ====================
+
+def health(client, ctx):
+    client.get('/api/health', '/api/health')
+
+
+def metrics(client, ctx):
+    client.get('/api/metrics', '/api/metrics')
+
+
+READ = {
+    attractions: 10, attraction_detail: 8, attractions_nearby: 6, attractions_heat: 4, attraction_stats: 4,
+    routes: 5, route_detail: 4, route_recommend: 2, route_plan: 3,
+    merchants_page: 6, merchants_nearby: 6, user_checkins: 3, safety_check: 3, safety_check_batch: 2,
+    offline_bundle: 1, search: 4,
+}
+WRITE = {checkin: 10, user_create_and_get: 1}
+AI = {ai_explain: 4, ai_explain_batch: 1, ai_ask: 4, ai_job: 1}
+OPS = {health: 1, metrics: 1}
+EXPORT = {export_recent: 1, export_user: 2}
+
+MIXES = {
+    'read': READ,
+    'write': WRITE,
+    'ai': AI,
+    'all': {**READ, **WRITE, **AI, **OPS, **EXPORT},
+}
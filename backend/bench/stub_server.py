@@ -0,0 +1,154 @@
+# backend/bench/stub_server.py
+"""
+DeepSeek /v1/chat/completions 的本地替身：按配置的延迟、抖动和错误率返回，支持 stream=True 的 SSE 输出。
+把服务的 DEEPSEEK_API_BASE 指向它即可在不消耗额度的情况下压测 AI 接口。GET /stats 返回调用计数。
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ('华山是五岳中的西岳，以险著称。长空栈道、鹞子翻身等景点需要格外注意安全，'
+         '建议穿防滑鞋、量力而行，雨雪天气请勿攀登险峻路段。')
+
+
+class StubConfig:
+    def __init__(self, latency_ms=500, jitter_ms=200, error_rate=0.0, error_status=503,
+                 chunk_chars=8, chunk_delay_ms=30, reply_chars=120, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.chunk_chars = chunk_chars
+        self.chunk_delay_ms = chunk_delay_ms
+        self.reply_chars = reply_chars
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'streams': 0, 'errors': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def latency(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            return max(self.latency_ms + jitter, 0) / 1000
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def reply(self, prompt):
+        text = (REPLY * (self.reply_chars // len(REPLY) + 1))[:self.reply_chars]
+        # 带上问题摘要，便于在缓存中区分不同请求
+        return f'{prompt[:20]}：{text}'
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, data):
+            body = json.dumps(data, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, data):
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path != '/stats':
+                return self._send_json(404, {'error': 'not found'})
+            with config.lock:
+                self._send_json(200, dict(config.stats))
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                payload = json.loads(self.rfile.read(length))
+            except ValueError:
+                return self._send_json(400, {'error': 'invalid json'})
+            if not self.path.endswith('/chat/completions'):
+                return self._send_json(404, {'error': 'not found'})
+
+            config.count('requests')
+            time.sleep(config.latency())
+            if config.should_fail():
+                config.count('errors')
+                return self._send_json(config.error_status, {'error': {'message': 'stub error'}})
+
+            messages = payload.get('messages') or [{}]
+            prompt = messages[-1].get('content', '')
+            text = config.reply(prompt)
+            usage = {'prompt_tokens': len(prompt), 'completion_tokens': len(text),
+                     'total_tokens': len(prompt) + len(text)}
+            if not payload.get('stream'):
+                return self._send_json(200, {
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                                 'finish_reason': 'stop'}],
+                    'usage': usage,
+                })
+
+            config.count('streams')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                for i in range(0, len(text), config.chunk_chars):
+                    event = {'choices': [{'index': 0, 'delta': {'content': text[i:i + config.chunk_chars]}}]}
+                    self._write_chunk(f'data: {json.dumps(event, ensure_ascii=False)}\n\n'.encode())
+                    time.sleep(config.chunk_delay_ms / 1000)
+                self._write_chunk(b'data: [DONE]\n\n')
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=0, config=None):
+    """在后台线程启动替身，返回 (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(config or StubConfig()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='deepseek-stub', daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DeepSeek API 本地替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--latency-ms', type=float, default=500, help='平均响应延迟')
+    parser.add_argument('--jitter-ms', type=float, default=200, help='延迟的均匀抖动范围 ±')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回错误的比例 0-1')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--chunk-chars', type=int, default=8, help='流式输出每段字数')
+    parser.add_argument('--chunk-delay-ms', type=float, default=30, help='流式输出每段间隔')
+    parser.add_argument('--reply-chars', type=int, default=120, help='回答长度')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status,
+                        args.chunk_chars, args.chunk_delay_ms, args.reply_chars, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    server.daemon_threads = True
+    print(f'DeepSeek 替身已启动: DEEPSEEK_API_BASE=http://{args.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+# backend/cache_warmup.py
+"""
+缓存预热：为所有 景点 × 人群 预生成讲解词，并为常见问题预生成 FAQ 答案，
+结果写入服务路径读取的 explanations / faq_entries 表。
+仍然新鲜的条目直接跳过，每条结果生成后立即提交，因此中断后重新执行即从未完成处继续。
+WARMUP_ON_STARTUP 时多个 worker 中只有抢到 ai_jobs 中预热记录的一个执行。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from ai_service import AUDIENCE_TYPES, generate_ai_answer
+from catalog import get_snapshot
+from explanation_cache import get_explanation, is_cached
+from extensions import db
+from faq_index import learn, lookup
+from models import AiJob
+
+logger = logging.getLogger(__name__)
+
+WARMUP_WORKERS = int(os.getenv("WARMUP_WORKERS", 4))
+# 每秒最多发起的 DeepSeek 请求数，0 表示不限
+WARMUP_RATE = float(os.getenv("WARMUP_RATE", 2.0))
+# 每行一个问题的文本文件；未配置时使用 WARMUP_QUESTIONS
+WARMUP_FAQ_FILE = os.getenv("WARMUP_FAQ_FILE")
+# 为 1 时在第一个请求到来后于后台预热
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+# 启动预热在 ai_jobs 中的记录 id；记录随 AI_JOB_TTL 清理，之后重启的 worker 会再预热一次（新鲜条目跳过）
+WARMUP_JOB_ID = 'cache-warmup'
+
+WARMUP_QUESTIONS = [
+    '华山门票多少钱？',
+    '华山索道几点开门？',
+    '西峰索道和北峰索道怎么选？',
+    '东峰看日出几点出发？',
+    '华山一日游怎么安排？',
+    '长空栈道需要排队多久？',
+    '带老人爬华山要注意什么？',
+    '夜爬华山安全吗？',
+    '华山山顶可以住宿吗？',
+    '从西安怎么去华山？',
+]
+
+
+class RateLimiter:
+    """按固定间隔放行的限速器，多线程共享"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def load_questions(path=None):
+    path = path or WARMUP_FAQ_FILE
+    if not path:
+        return list(WARMUP_QUESTIONS)
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def _warm_explanation(attraction, audience_type, limiter):
+    if is_cached(attraction, audience_type):
+        return 'skipped'
+    limiter.acquire()
+    _, source = get_explanation(attraction, audience_type)
+    # 模板或过期内容说明 DeepSeek 调用失败，下次预热会重试
+    return 'done' if source == 'ai' else 'failed'
+
+
+def _warm_question(question, limiter):
+    if lookup(question) is not None:
+        return 'skipped'
+    limiter.acquire()
+    answer = generate_ai_answer(question)
+    if not answer:
+        return 'failed'
+    learn(question, answer, force=True)
+    return 'done'
+
+
+def warm_cache(explanations=True, questions=None, workers=WARMUP_WORKERS, rate=WARMUP_RATE, report=logger.info):
+    """
+    执行一次预热，返回 {'done', 'skipped', 'failed', 'failures', 'elapsed'}。
+    需在应用上下文中调用；report(消息) 用于输出进度。
+    """
+    app = current_app._get_current_object()
+    limiter = RateLimiter(rate)
+    tasks = []
+    if explanations:
+        for attraction in get_snapshot().attractions:
+            for audience_type in AUDIENCE_TYPES:
+                tasks.append((f'讲解 {attraction.name}/{audience_type}', _warm_explanation,
+                              (attraction, audience_type, limiter)))
+    for question in questions or ():
+        tasks.append((f'问答 {question}', _warm_question, (question, limiter)))
+
+    def run(fn, args):
+        with app.app_context():
+            return fn(*args)
+
+    summary = {'done': 0, 'skipped': 0, 'failed': 0, 'failures': []}
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='warmup')
+    try:
+        futures = {pool.submit(run, fn, args): label for label, fn, args in tasks}
+        for finished, future in enumerate(as_completed(futures), 1):
+            label = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                status = 'failed'
+                label = f'{label}: {e}'
+            summary[status] += 1
+            if status == 'failed':
+                summary['failures'].append(label)
+            report(f'[{finished}/{len(tasks)}] {status:<7} {label}')
+    except KeyboardInterrupt:
+        # 已完成的条目都已提交，重新执行会跳过它们
+        pool.shutdown(wait=False, cancel_futures=True)
+        report('预热被中断，已完成的条目已保存，重新执行即可继续')
+        raise
+    pool.shutdown()
+    summary['elapsed'] = round(time.monotonic() - started, 2)
+    report(f"预热完成：生成 {summary['done']}，跳过 {summary['skipped']}，"
+           f"失败 {summary['failed']}，用时 {summary['elapsed']}s")
+    return summary
+
+
+def _claim_startup_warmup():
+    """插入固定 id 的预热记录，插入成功（本进程负责预热）返回 True"""
+    db.session.add(AiJob(id=WARMUP_JOB_ID, kind='warmup', status='running'))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+def _finish_startup_warmup(status, result=None):
+    job = db.session.get(AiJob, WARMUP_JOB_ID)
+    if job is None:
+        return
+    job.status = status
+    job.result = json.dumps(result, ensure_ascii=False) if result is not None else None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def init_app(app):
+    @app.cli.command('warm-cache')
+    @click.option('--workers', default=WARMUP_WORKERS, show_default=True, help='并发线程数')
+    @click.option('--rate', default=WARMUP_RATE, show_default=True, help='每秒最多请求数，0 为不限')
+    @click.option('--questions-file', type=click.Path(exists=True, dir_okay=False), help='每行一个问题')
+    @click.option('--skip-explanations', is_flag=True, help='只预热 FAQ')
+    @click.option('--skip-faq', is_flag=True, help='只预热讲解词')
+    def warm_cache_command(workers, rate, questions_file, skip_explanations, skip_faq):
+        """预生成所有景点讲解词和常见问题答案"""
+        questions = [] if skip_faq else load_questions(questions_file)
+        summary = warm_cache(not skip_explanations, questions, workers, rate, report=click.echo)
+        for failure in summary['failures']:
+            click.echo(f'  失败: {failure}')
+        if summary['failed']:
+            raise SystemExit(1)
+
+    if WARMUP_ON_STARTUP:
+        started = threading.Event()
+        lock = threading.Lock()
+
+        @app.before_request
+        def _start_warmup():
+            # 在第一个请求时启动，避免 flask 命令行也触发预热
+            if started.is_set():
+                return
+            with lock:
+                if started.is_set():
+                    return
+                started.set()
+
+            def run():
+                with app.app_context():
+                    if not _claim_startup_warmup():
+                        logger.info("其他 worker 正在或已经完成启动预热，跳过")
+                        return
+                    try:
+                        summary = warm_cache(questions=load_questions())
+                    except Exception:
+                        db.session.rollback()
+                        logger.exception("后台缓存预热失败")
+                        _finish_startup_warmup('failed')
+                    else:
+                        _finish_startup_warmup('done', {k: v for k, v in summary.items() if k != 'failures'})
+
+            threading.Thread(target=run, name='cache-warmup', daemon=True).start()
@@ -0,0 +1,198 @@
+# backend/catalog.py
+"""
+进程内只读目录快照：景点、路线列表及路线详情在构建时一次性序列化为 JSON 字节，
+GET 请求直接返回，并用 ETag 支持 304。
+景点/路线写入会递增 data_versions 中的 catalog 版本号，各 worker 发现版本变化后重建快照。
+?fields= 选择的景点字段子集在首次请求时序列化，随快照一起缓存。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, request
+
+from compression import mark_immutable, matching_etag
+from extensions import db
+from models import Attraction, Route, RouteStop
+from serialization import dumps, encoder_for, make_encoder
+from versioning import get_version, on_commit, track_changes
+
+CATALOG = 'catalog'
+
+# 两次检查数据库版本号的最小间隔（秒）
+CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv("CATALOG_VERSION_CHECK_INTERVAL", 1.0))
+# 每个快照最多缓存的景点字段子集数
+CATALOG_FIELD_SUBSETS = int(os.getenv("CATALOG_FIELD_SUBSETS", 16))
+
+track_changes(CATALOG, Attraction, Route, RouteStop)
+
+
+class AttractionRecord:
+    __slots__ = ('id', 'name', 'description', 'category', 'latitude', 'longitude',
+                 'altitude', 'difficulty_level', 'estimated_time', 'safety_level',
+                 'image_url', 'tips')
+
+    def __init__(self, row):
+        for field in self.__slots__:
+            object.__setattr__(self, field, getattr(row, field))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('快照记录是只读的')
+
+    def to_dict(self, fields=None):
+        # 字段与 Attraction 模型相同，直接复用模型的编码函数
+        return encoder_for(Attraction, fields)(self)
+
+
+class RouteRecord:
+    __slots__ = ('id', 'name', 'description', 'difficulty', 'estimated_duration',
+                 'attractions', 'recommended_for', 'cable_car_usage', 'image_url')
+
+    def __init__(self, row, stop_ids=None):
+        for field in self.__slots__:
+            value = getattr(row, field)
+            if field == 'attractions':
+                # route_stops 为准；尚未迁移的路线退回 JSON 列
+                if stop_ids is not None:
+                    value = tuple(stop_ids)
+                else:
+                    value = tuple(json.loads(value)) if value else ()
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('快照记录是只读的')
+
+    def to_dict(self):
+        return _encode_route(self)
+
+
+_encode_route = make_encoder(
+    [('attractions', lambda r: list(r.attractions)) if f == 'attractions' else f for f in RouteRecord.__slots__],
+    name='encode_route_record',
+)
+
+
+class CatalogSnapshot:
+    """某一版本的景点和路线目录，包含预先序列化好的响应体"""
+
+    __slots__ = ('version', 'attractions', 'routes', 'attractions_json', 'routes_json',
+                 'attractions_etag', 'routes_etag', 'routes_expanded_json',
+                 'routes_expanded_etag', 'route_details', 'attractions_by_id',
+                 'routes_by_id', 'built_at', '_subsets', '_subsets_lock')
+
+    def __init__(self, version, attractions, routes):
+        self.version = version
+        self.attractions = tuple(attractions)
+        self.routes = tuple(routes)
+        self.attractions_by_id = {a.id: a for a in self.attractions}
+        self.routes_by_id = {r.id: r for r in self.routes}
+        self.attractions_json = dumps([a.to_dict() for a in self.attractions])
+        self.routes_json = dumps([r.to_dict() for r in self.routes])
+        self.attractions_etag = _etag(version, self.attractions_json)
+        self.routes_etag = _etag(version, self.routes_json)
+
+        # 路线连同按顺序展开的景点详情
+        by_id = self.attractions_by_id
+        expanded = []
+        details = {}
+        for route in self.routes:
+            data = route.to_dict()
+            data['attraction_details'] = [
+                by_id[attraction_id].to_dict()
+                for attraction_id in route.attractions if attraction_id in by_id
+            ]
+            expanded.append(data)
+            body = dumps(data)
+            details[route.id] = (body, _etag(version, body))
+        self.routes_expanded_json = dumps(expanded)
+        self.routes_expanded_etag = _etag(version, self.routes_expanded_json)
+        self.route_details = details
+        self.built_at = time.time()
+        self._subsets = {}
+        self._subsets_lock = threading.Lock()
+
+    def attractions_subset(self, fields):
+        """只含 fields 的景点列表 (body, etag)，例如地图只需要 id、名称和坐标"""
+        cached = self._subsets.get(fields)
+        if cached is not None:
+            return cached
+        encode = encoder_for(Attraction, fields)
+        body = dumps([encode(a) for a in self.attractions])
+        cached = (body, _etag(self.version, body))
+        with self._subsets_lock:
+            if len(self._subsets) >= CATALOG_FIELD_SUBSETS:
+                self._subsets.clear()
+            self._subsets[fields] = cached
+        return cached
+
+
+def _etag(version, body):
+    return f'{version}-{hashlib.sha1(body).hexdigest()[:12]}'
+
+
+_snapshot = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _invalidate():
+    global _checked_at
+    _checked_at = 0.0
+
+
+on_commit(CATALOG, _invalidate)
+
+
+def build_snapshot(version):
+    """用固定的三次查询构建快照（景点、路线、途经站点），与路线和站点数量无关"""
+    attractions = [AttractionRecord(a) for a in Attraction.query.order_by(Attraction.id).all()]
+    stops = defaultdict(list)
+    rows = (
+        db.session.query(RouteStop.route_id, RouteStop.attraction_id)
+        .order_by(RouteStop.route_id, RouteStop.position)
+    )
+    for route_id, attraction_id in rows:
+        stops[route_id].append(attraction_id)
+    routes = [
+        RouteRecord(r, stops.get(r.id))
+        for r in Route.query.order_by(Route.id).all()
+    ]
+    return CatalogSnapshot(version, attractions, routes)
+
+
+def get_snapshot():
+    """返回当前目录快照；版本号变化时重建并原子替换"""
+    global _snapshot, _checked_at
+    now = time.monotonic()
+    snapshot = _snapshot
+    if snapshot is not None and now - _checked_at < CATALOG_VERSION_CHECK_INTERVAL:
+        return snapshot
+
+    version = get_version(CATALOG)
+    if snapshot is not None and snapshot.version == version:
+        _checked_at = now
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.version != version:
+            snapshot = build_snapshot(version)
+            _snapshot = snapshot
+        _checked_at = now
+    return snapshot
+
+
+def snapshot_response(body, etag):
+    """返回预序列化的 JSON；If-None-Match 命中（任一内容编码）时返回 304，ETag 与客户端持有的一致"""
+    matched = matching_etag(etag, request.if_none_match)
+    if matched is not None:
+        resp = Response(status=304)
+        resp.set_etag(matched)
+    else:
+        resp = mark_immutable(Response(body, mimetype='application/json'), etag)
+        resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
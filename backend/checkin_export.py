@@ -0,0 +1,124 @@
+# backend/checkin_export.py
+"""
+打卡记录流式导出：按 id 做 keyset 分块读取，逐行输出 NDJSON 或 CSV，内存占用与导出总量无关。
+每行都带 id，连接中断后用最后收到的 id 作为 cursor 重新请求即可续传。
+CSV 中以 = + - @ 等开头的文本前加 '，避免用户填写的备注在表格软件中被当作公式执行。
+"""
+import csv
+import io
+import os
+from datetime import datetime, timezone
+
+from extensions import db
+from models import UserCheckIn
+from serialization import dumps
+
+CHECKIN_EXPORT_CHUNK = int(os.getenv("CHECKIN_EXPORT_CHUNK", 1000))
+
+EXPORT_FIELDS = ('id', 'user_id', 'attraction_id', 'checked_in_at', 'notes', 'rating')
+# 表格软件会当作公式解析的开头字符
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportError(ValueError):
+    """导出参数无效"""
+
+
+def _parse_time(value, name):
+    if not value:
+        return None
+    try:
+        value = datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{name} 不是有效的 ISO 时间')
+    # 打卡时间以不带时区的 UTC 存储
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_export_args(args):
+    """解析 format / since / until / cursor 参数"""
+    fmt = args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f'不支持的格式: {fmt}')
+    try:
+        cursor = int(args.get('cursor', 0))
+    except ValueError:
+        raise ExportError('cursor 必须是上次收到的最后一条打卡 id')
+    return {
+        'fmt': fmt,
+        'since': _parse_time(args.get('since'), 'since'),
+        'until': _parse_time(args.get('until'), 'until'),
+        'cursor': cursor,
+    }
+
+
+def iter_chunks(user_id=None, since=None, until=None, cursor=0, chunk_size=CHECKIN_EXPORT_CHUNK):
+    """按 id 升序逐块读取 id > cursor 的打卡，每次产出一块行元组；时间范围为 [since, until)"""
+    columns = [getattr(UserCheckIn, f) for f in EXPORT_FIELDS]
+    while True:
+        query = db.session.query(*columns).filter(UserCheckIn.id > cursor)
+        if user_id is not None:
+            query = query.filter(UserCheckIn.user_id == user_id)
+        if since is not None:
+            query = query.filter(UserCheckIn.checked_in_at >= since)
+        if until is not None:
+            query = query.filter(UserCheckIn.checked_in_at < until)
+        rows = query.order_by(UserCheckIn.id).limit(chunk_size).all()
+        # 每块之后结束读事务，长时间导出不会一直占着同一个快照
+        db.session.rollback()
+        if not rows:
+            return
+        yield rows
+        cursor = rows[-1].id
+        if len(rows) < chunk_size:
+            return
+
+
+def _record(row):
+    data = dict(zip(EXPORT_FIELDS, row))
+    if data['checked_in_at'] is not None:
+        data['checked_in_at'] = data['checked_in_at'].isoformat()
+    return data
+
+
+def ndjson_chunks(chunks):
+    for rows in chunks:
+        yield b''.join(dumps(_record(row)) + b'\n' for row in rows)
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(chunks, header=True):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    for rows in chunks:
+        for row in rows:
+            record = _record(row)
+            writer.writerow([_csv_cell(record[f]) for f in EXPORT_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # 没有任何数据时也输出表头
+        yield buffer.getvalue()
+
+
+def export_stream(fmt, since=None, until=None, cursor=0, user_id=None):
+    """按格式生成导出内容（每块一段）；续传（cursor > 0）时 CSV 不重复输出表头"""
+    chunks = iter_chunks(user_id=user_id, since=since, until=until, cursor=cursor)
+    if fmt == 'csv':
+        return csv_chunks(chunks, header=not cursor)
+    return ndjson_chunks(chunks)
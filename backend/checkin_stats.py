@@ -0,0 +1,230 @@
+# backend/checkin_stats.py
+"""
+景点打卡汇总：打卡批量写入时在同一事务内增量更新 attraction_stats（总数、评分和/数）
+与 checkin_hourly（最近若干小时的每小时打卡数），统计和人流热度接口只读汇总表。
+`flask rebuild-stats` 按 id 分块流式扫描打卡明细，重新计算汇总。
+"""
+import calendar
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import click
+from sqlalchemy import func, text
+
+from extensions import db
+from models import AttractionStats, CheckinHourly
+
+CHECKIN_STATS_WINDOW_HOURS = int(os.getenv("CHECKIN_STATS_WINDOW_HOURS", 168))
+CHECKIN_STATS_PRUNE_INTERVAL = float(os.getenv("CHECKIN_STATS_PRUNE_INTERVAL", 60))
+CHECKIN_STATS_REBUILD_CHUNK = int(os.getenv("CHECKIN_STATS_REBUILD_CHUNK", 5000))
+
+# 热度等级：(相对最热景点的比例下限, 名称)，由高到低
+HEAT_LEVELS = ((0.67, '拥挤'), (0.34, '适中'), (0.0, '空闲'))
+
+_UPSERT_STATS = text(
+    'INSERT INTO attraction_stats (attraction_id, checkin_count, rating_sum, rating_count, last_checkin_at) '
+    'VALUES (:attraction_id, :checkin_count, :rating_sum, :rating_count, :last_checkin_at) '
+    'ON CONFLICT(attraction_id) DO UPDATE SET '
+    'checkin_count = checkin_count + excluded.checkin_count, '
+    'rating_sum = rating_sum + excluded.rating_sum, '
+    'rating_count = rating_count + excluded.rating_count, '
+    'last_checkin_at = MAX(COALESCE(last_checkin_at, excluded.last_checkin_at), excluded.last_checkin_at)'
+)
+_UPSERT_HOURLY = text(
+    'INSERT INTO checkin_hourly (attraction_id, hour, checkin_count) VALUES (:attraction_id, :hour, :checkin_count) '
+    'ON CONFLICT(attraction_id, hour) DO UPDATE SET checkin_count = checkin_count + excluded.checkin_count'
+)
+
+
+def hour_of(dt):
+    """UTC 时间（naive）所在的小时桶"""
+    return calendar.timegm(dt.utctimetuple()) // 3600
+
+
+def current_hour():
+    return int(time.time() // 3600)
+
+
+def _hour_iso(hour):
+    return datetime.utcfromtimestamp(hour * 3600).isoformat()
+
+
+def _db_time(dt):
+    # 与 SQLAlchemy DateTime 在 SQLite 中的存储格式一致，便于字符串比较
+    return dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+class _Rollup:
+    """在内存中累加一批打卡，再一次性写入汇总表"""
+
+    def __init__(self, min_hour):
+        self.min_hour = min_hour
+        self.stats = {}
+        self.hourly = defaultdict(int)
+
+    def add(self, attraction_id, hour, rating, checked_in_at):
+        entry = self.stats.get(attraction_id)
+        if entry is None:
+            entry = self.stats[attraction_id] = {
+                'attraction_id': attraction_id, 'checkin_count': 0, 'rating_sum': 0,
+                'rating_count': 0, 'last_checkin_at': None,
+            }
+        entry['checkin_count'] += 1
+        if rating is not None:
+            entry['rating_sum'] += rating
+            entry['rating_count'] += 1
+        if checked_in_at is not None and (entry['last_checkin_at'] is None or checked_in_at > entry['last_checkin_at']):
+            entry['last_checkin_at'] = checked_in_at
+        if hour is not None and hour >= self.min_hour:
+            self.hourly[(attraction_id, hour)] += 1
+
+    def write(self, conn):
+        if self.stats:
+            conn.execute(_UPSERT_STATS, list(self.stats.values()))
+        if self.hourly:
+            conn.execute(_UPSERT_HOURLY, [
+                {'attraction_id': a, 'hour': h, 'checkin_count': n}
+                for (a, h), n in self.hourly.items()
+            ])
+
+
+_last_prune = 0.0
+
+
+def apply_checkins(conn, rows):
+    """checkin_writer 的 after_flush 回调：在写入打卡的同一事务内更新汇总"""
+    global _last_prune
+    rollup = _Rollup(current_hour() - CHECKIN_STATS_WINDOW_HOURS)
+    for row in rows:
+        if row['attraction_id'] is None:
+            continue
+        checked_in_at = row['checked_in_at']
+        rollup.add(row['attraction_id'], hour_of(checked_in_at), row['rating'], _db_time(checked_in_at))
+    rollup.write(conn)
+
+    now = time.monotonic()
+    if now - _last_prune >= CHECKIN_STATS_PRUNE_INTERVAL:
+        _last_prune = now
+        conn.execute(text('DELETE FROM checkin_hourly WHERE hour < :cutoff'),
+                     {'cutoff': rollup.min_hour})
+
+
+def _scan_chunk(conn, rollup, after_id, upto_id=None, chunk_size=CHECKIN_STATS_REBUILD_CHUNK):
+    """读取 id 在 (after_id, upto_id] 内的下一块打卡累加到 rollup，返回 (最后一个 id, 行数)"""
+    sql = ("SELECT id, attraction_id, CAST(strftime('%s', checked_in_at) AS INTEGER) / 3600, "
+           "rating, checked_in_at FROM user_checkins WHERE id > :after_id")
+    params = {'after_id': after_id, 'limit': chunk_size}
+    if upto_id is not None:
+        sql += ' AND id <= :upto_id'
+        params['upto_id'] = upto_id
+    rows = conn.execute(text(sql + ' ORDER BY id LIMIT :limit'), params).fetchall()
+    for _, attraction_id, hour, rating, checked_in_at in rows:
+        if attraction_id is not None:
+            rollup.add(attraction_id, hour, rating, checked_in_at)
+    return (rows[-1][0] if rows else after_id), len(rows)
+
+
+def _replace(conn, rollup):
+    conn.execute(text('DELETE FROM attraction_stats'))
+    conn.execute(text('DELETE FROM checkin_hourly'))
+    rollup.write(conn)
+
+
+def rebuild_in_transaction(conn, chunk_size=CHECKIN_STATS_REBUILD_CHUNK):
+    """在调用方的事务内重算全部汇总（供迁移使用），返回扫描的行数"""
+    rollup = _Rollup(current_hour() - CHECKIN_STATS_WINDOW_HOURS)
+    after_id, scanned = 0, 0
+    while True:
+        after_id, n = _scan_chunk(conn, rollup, after_id, None, chunk_size)
+        if not n:
+            break
+        scanned += n
+    _replace(conn, rollup)
+    return scanned
+
+
+def rebuild_stats(chunk_size=CHECKIN_STATS_REBUILD_CHUNK, progress=None):
+    """
+    从打卡明细重新计算汇总，返回扫描的行数。
+    先逐块在短读事务中扫描到开始时的最大 id；再在一个写事务里补上这期间新写入的打卡并整体替换汇总表。
+    写事务持有写锁，与并发的批量写入串行，不会重复或遗漏计数。
+    """
+    rollup = _Rollup(current_hour() - CHECKIN_STATS_WINDOW_HOURS)
+    after_id, scanned = 0, 0
+    with db.engine.connect() as conn:
+        high_water = conn.execute(text('SELECT COALESCE(MAX(id), 0) FROM user_checkins')).scalar()
+        conn.rollback()
+        while after_id < high_water:
+            after_id, n = _scan_chunk(conn, rollup, after_id, high_water, chunk_size)
+            conn.rollback()
+            if not n:
+                break
+            scanned += n
+            if progress:
+                progress(scanned)
+    with db.engine.begin() as conn:
+        after_id = high_water
+        while True:
+            after_id, n = _scan_chunk(conn, rollup, after_id, None, chunk_size)
+            if not n:
+                break
+            scanned += n
+        _replace(conn, rollup)
+    return scanned
+
+
+def attraction_stats(attraction_id, hours=24):
+    """单个景点的汇总及最近 hours 小时的逐小时打卡数"""
+    hours = min(max(hours, 1), CHECKIN_STATS_WINDOW_HOURS)
+    stats = db.session.get(AttractionStats, attraction_id)
+    data = stats.to_dict() if stats else AttractionStats(
+        attraction_id=attraction_id, checkin_count=0, rating_sum=0, rating_count=0).to_dict()
+    now = current_hour()
+    counts = dict(
+        db.session.query(CheckinHourly.hour, CheckinHourly.checkin_count)
+        .filter(CheckinHourly.attraction_id == attraction_id, CheckinHourly.hour > now - hours)
+    )
+    data['hourly'] = [
+        {'hour': _hour_iso(h), 'checkin_count': counts.get(h, 0)}
+        for h in range(now - hours + 1, now + 1)
+    ]
+    return data
+
+
+def crowd_heat(attractions, hours=1):
+    """全山人流热度：各景点最近 hours 小时的打卡数及相对最热景点的比例"""
+    hours = min(max(hours, 1), CHECKIN_STATS_WINDOW_HOURS)
+    counts = dict(
+        db.session.query(CheckinHourly.attraction_id, func.sum(CheckinHourly.checkin_count))
+        .filter(CheckinHourly.hour > current_hour() - hours)
+        .group_by(CheckinHourly.attraction_id)
+    )
+    peak = max(counts.values(), default=0)
+    result = []
+    for a in attractions:
+        count = counts.get(a.id, 0)
+        heat = round(count / peak, 3) if peak else 0.0
+        result.append({
+            'attraction_id': a.id,
+            'name': a.name,
+            'latitude': a.latitude,
+            'longitude': a.longitude,
+            'checkin_count': count,
+            'heat': heat,
+            'level': next(name for threshold, name in HEAT_LEVELS if heat >= threshold),
+        })
+    return {'window_hours': hours, 'attractions': result}
+
+
+def init_app(app):
+    app.extensions['checkin_writer'].after_flush(apply_checkins)
+
+    @app.cli.command('rebuild-stats')
+    @click.option('--chunk-size', default=CHECKIN_STATS_REBUILD_CHUNK, show_default=True, help='每块读取的打卡行数')
+    def rebuild_stats_command(chunk_size):
+        """从打卡明细重新计算景点打卡汇总"""
+        started = time.monotonic()
+        total = rebuild_stats(chunk_size, progress=lambda n: click.echo(f'已扫描 {n} 条打卡'))
+        click.echo(f'汇总重建完成：{total} 条打卡，用时 {time.monotonic() - started:.1f}s')
@@ -0,0 +1,207 @@
+# backend/checkin_writer.py
+"""
+打卡批量写入：请求校验后放入进程内有界队列，由后台线程每 CHECKIN_FLUSH_INTERVAL_MS 毫秒
+或攒满 CHECKIN_FLUSH_ROWS 行时用一次 executemany 事务写入，避免大量并发请求逐条争抢 SQLite 写锁。
+队列满时拒绝新请求（503 + Retry-After）；进程退出时把队列中剩余的打卡写完。
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models import UserCheckIn
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_QUEUE_SIZE = int(os.getenv("CHECKIN_QUEUE_SIZE", 2000))
+CHECKIN_FLUSH_INTERVAL_MS = int(os.getenv("CHECKIN_FLUSH_INTERVAL_MS", 50))
+CHECKIN_FLUSH_ROWS = int(os.getenv("CHECKIN_FLUSH_ROWS", 200))
+# flush：写入数据库后再返回（带 id）；enqueue：入队即返回 202，id 为空
+CHECKIN_ACK_MODE = os.getenv("CHECKIN_ACK_MODE", "flush")
+# flush 模式下等待写入的最长时间（秒），超时按已入队处理
+CHECKIN_ACK_TIMEOUT = float(os.getenv("CHECKIN_ACK_TIMEOUT", 5.0))
+CHECKIN_RETRY_AFTER = int(os.getenv("CHECKIN_RETRY_AFTER", 1))
+CHECKIN_WRITE_RETRIES = int(os.getenv("CHECKIN_WRITE_RETRIES", 3))
+
+
+class CheckinQueueFull(Exception):
+    """打卡队列已满"""
+
+
+class CheckinWriteError(Exception):
+    """批量写入失败"""
+
+
+class PendingCheckin:
+    """一条待写入的打卡；写入完成后 row['id'] 被填上"""
+
+    __slots__ = ('row', 'done', 'error')
+
+    def __init__(self, row):
+        self.row = row
+        self.done = threading.Event()
+        self.error = None
+
+    def wait(self, timeout):
+        return self.done.wait(timeout)
+
+    def to_dict(self):
+        row = dict(self.row)
+        row['checked_in_at'] = row['checked_in_at'].isoformat()
+        return row
+
+
+class CheckinWriter:
+    def __init__(self, app, maxsize=CHECKIN_QUEUE_SIZE, interval_ms=CHECKIN_FLUSH_INTERVAL_MS,
+                 max_rows=CHECKIN_FLUSH_ROWS):
+        self.app = app
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.interval = interval_ms / 1000
+        self.max_rows = max_rows
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._after_flush = []
+        self._stats = {'enqueued': 0, 'rejected': 0, 'flushed': 0, 'batches': 0, 'failed': 0}
+
+    def after_flush(self, callback):
+        """每批写入的同一事务内调用 callback(connection, rows)"""
+        self._after_flush.append(callback)
+
+    def _count(self, key, delta=1):
+        with self._stats_lock:
+            self._stats[key] += delta
+
+    def _ensure_started(self):
+        # 首次提交时才启动线程，避免在 fork 出 worker 之前就创建
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='checkin-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, user_id, attraction_id, notes='', rating=None):
+        """入队一条打卡，队列满时抛出 CheckinQueueFull"""
+        if self._stopping.is_set():
+            raise CheckinQueueFull('服务正在关闭')
+        self._ensure_started()
+        pending = PendingCheckin({
+            'id': None,
+            'user_id': user_id,
+            'attraction_id': attraction_id,
+            'checked_in_at': datetime.utcnow(),
+            'notes': notes,
+            'rating': rating,
+        })
+        try:
+            self.queue.put_nowait(pending)
+        except queue.Full:
+            self._count('rejected')
+            raise CheckinQueueFull('打卡队列已满')
+        self._count('enqueued')
+        return pending
+
+    def _next_batch(self):
+        try:
+            first = self.queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+        # 退出前写完剩余的打卡
+        while True:
+            batch = []
+            while len(batch) < self.max_rows:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _write(self, rows):
+        """一个事务写入整批；返回最后一行的 id。事务持有写锁，同批 id 连续分配"""
+        table = UserCheckIn.__table__
+        with db.engine.begin() as conn:
+            conn.execute(insert(table), [{k: v for k, v in r.items() if k != 'id'} for r in rows])
+            last_id = conn.execute(text('SELECT last_insert_rowid()')).scalar()
+            first_id = last_id - len(rows) + 1
+            for offset, row in enumerate(rows):
+                row['id'] = first_id + offset
+            for callback in self._after_flush:
+                callback(conn, rows)
+
+    def _flush(self, batch):
+        rows = [p.row for p in batch]
+        error = None
+        with self.app.app_context():
+            for attempt in range(CHECKIN_WRITE_RETRIES + 1):
+                try:
+                    self._write(rows)
+                    error = None
+                    break
+                except OperationalError as e:
+                    # 多为 database is locked，退避后重试
+                    error = e
+                    for row in rows:
+                        row['id'] = None
+                    if attempt < CHECKIN_WRITE_RETRIES:
+                        time.sleep(0.05 * 2 ** attempt)
+                except Exception as e:
+                    error = e
+                    for row in rows:
+                        row['id'] = None
+                    break
+        if error is None:
+            with self._stats_lock:
+                self._stats['flushed'] += len(batch)
+                self._stats['batches'] += 1
+        else:
+            self._count('failed', len(batch))
+            logger.error("打卡批量写入失败", extra={'rows': len(batch), 'error': str(error)[:300]})
+        for pending in batch:
+            if error is not None:
+                pending.error = CheckinWriteError(str(error))
+            pending.done.set()
+
+    def stop(self, timeout=10.0):
+        """停止接收新打卡，写完队列后返回"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, queued=self.queue.qsize(), capacity=self.queue.maxsize)
+
+
+def init_app(app):
+    writer = CheckinWriter(app)
+    app.extensions['checkin_writer'] = writer
+    atexit.register(writer.stop)
+    return writer
@@ -0,0 +1,124 @@
+# backend/compression.py
+"""
+响应压缩：按 Accept-Encoding 协商 br（安装了 brotli 时）或 gzip，只压缩足够大的 JSON/文本响应。
+目录快照这类内容不变的响应（由 snapshot_response 标记）以 ETag 为键缓存压缩结果，
+每个版本只压缩一次，并使用更高的压缩级别。流式响应（SSE、导出）不压缩。
+强 ETag 必须区分内容编码，压缩后的响应在 ETag 后加 "-gzip"/"-br"，比较 If-None-Match 时用 matching_etag。
+"""
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+# 缓存的压缩体数量上限
+COMPRESS_CACHE_SIZE = int(os.getenv("COMPRESS_CACHE_SIZE", 256))
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain', 'text/csv', 'application/x-ndjson')
+
+
+def _gzip(body, cached):
+    # mtime=0 让相同内容的压缩结果完全相同
+    return gzip.compress(body, compresslevel=9 if cached else COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _brotli(body, cached):
+    return brotli.compress(body, quality=11 if cached else COMPRESS_BROTLI_QUALITY)
+
+
+ENCODERS = {'gzip': _gzip}
+if brotli is not None:
+    ENCODERS = {'br': _brotli, 'gzip': _gzip}
+
+
+class _CompressedCache:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._items.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._items[key] = body
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+_cache = _CompressedCache(COMPRESS_CACHE_SIZE)
+
+
+def mark_immutable(response, key):
+    """标记响应体在 key（通常是 ETag）不变时内容不变，压缩结果可以缓存"""
+    response.compress_key = key
+    return response
+
+
+def matching_etag(etag, if_none_match):
+    """If-None-Match 中与 etag（任一内容编码）匹配的那个，没有时返回 None"""
+    for tag in (etag, *(f'{etag}-{encoding}' for encoding in ENCODERS)):
+        if tag in if_none_match:
+            return tag
+    return None
+
+
+def choose_encoding(accept_encodings):
+    """按客户端的 q 值在支持的编码中选择，都不接受时返回 None"""
+    return accept_encodings.best_match(list(ENCODERS))
+
+
+def compress_response(response):
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or request.method == 'HEAD'):
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    key = getattr(response, 'compress_key', None)
+    compressed = _cache.get((key, encoding)) if key is not None else None
+    if compressed is None:
+        compressed = ENCODERS[encoding](body, key is not None)
+        if key is not None:
+            _cache.put((key, encoding), compressed)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def cache_stats():
+    return {'hits': _cache.hits, 'misses': _cache.misses}
+
+
+def init_app(app):
+    app.after_request(compress_response)
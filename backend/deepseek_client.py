@@ -0,0 +1,266 @@
+# backend/deepseek_client.py
+"""
+DeepSeek HTTP 客户端：进程内共享的 keep-alive 连接池、分开的连接/读取超时、
+对 429/5xx 的有限次带抖动重试，以及连续失败后直接走本地兜底的熔断器。
+"""
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import record_tokens, record_upstream
+
+
+class DeepSeekError(Exception):
+    """DeepSeek 调用失败"""
+
+
+class CircuitOpenError(DeepSeekError):
+    """熔断器打开，本次调用未发出请求"""
+
+
+class DeepSeekRequestError(DeepSeekError):
+    """请求本身被拒绝（429 以外的 4xx，如参数错误、API Key 无效），不计入熔断"""
+
+
+class CircuitBreaker:
+    """
+    连续失败计数熔断器。
+    closed：正常放行；连续失败 failure_threshold 次后 open：直接拒绝；
+    经过 recovery_timeout 秒进入 half_open：只放行一个探测请求，成功则恢复，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at >= self.recovery_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """是否允许发出请求"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release(self):
+        """结束本次调用但不计成功或失败（调用方自身的错误），half_open 时允许下一个探测"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._probing = False
+
+
+class DeepSeekClient:
+    """
+    DeepSeek Chat 接口客户端，线程安全，可在多个请求之间复用。
+    """
+
+    RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, api_key, api_base, connect_timeout=3.05, read_timeout=20.0,
+                 max_retries=2, backoff_base=0.5, backoff_max=4.0, pool_size=10,
+                 breaker=None, session=None):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    @property
+    def url(self):
+        return f"{self.api_base}/v1/chat/completions"
+
+    def _headers(self, stream):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        if stream:
+            headers["Accept"] = "text/event-stream"
+        return headers
+
+    def _backoff(self, attempt, retry_after=None):
+        """计算第 attempt 次重试前的等待时间（全抖动指数退避，尊重 Retry-After）"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _post(self, payload, stream=False):
+        """
+        发送请求并返回状态码为 200 的响应；可重试错误按退避重试，最终失败抛出 DeepSeekError。
+        任何异常都会结束熔断器的 half_open 探测，否则熔断器会一直拒绝调用。
+        """
+        kind = 'stream' if stream else 'chat'
+        if not self.breaker.allow():
+            record_upstream(kind, 'circuit_open')
+            raise CircuitOpenError("DeepSeek 熔断中，跳过调用")
+        try:
+            return self._send(kind, payload, stream)
+        except DeepSeekRequestError:
+            self.breaker.release()
+            raise
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+
+    def _send(self, kind, payload, stream):
+        last_error = None
+        retry_after = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt - 1, retry_after))
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                resp = self.session.post(self.url, headers=self._headers(stream), json=payload,
+                                         timeout=self.timeout, stream=stream)
+            except requests.exceptions.ConnectTimeout as e:
+                record_upstream(kind, 'connect_timeout', time.perf_counter() - started)
+                last_error = DeepSeekError(f"连接超时: {e}")
+                continue
+            except requests.exceptions.ConnectionError as e:
+                record_upstream(kind, 'connect_error', time.perf_counter() - started)
+                last_error = DeepSeekError(f"连接失败: {e}")
+                continue
+            except requests.exceptions.Timeout as e:
+                # 读取超时不重试：上游可能仍在生成，重试只会加倍等待
+                record_upstream(kind, 'read_timeout', time.perf_counter() - started)
+                last_error = DeepSeekError(f"读取超时: {e}")
+                break
+            except requests.exceptions.RequestException as e:
+                record_upstream(kind, 'error', time.perf_counter() - started)
+                last_error = DeepSeekError(f"{type(e).__name__}: {e}")
+                break
+
+            record_upstream(kind, resp.status_code, time.perf_counter() - started)
+            if resp.status_code == 200:
+                return resp
+            body = resp.text[:200]
+            resp.close()
+            if 400 <= resp.status_code < 500 and resp.status_code not in self.RETRY_STATUS:
+                raise DeepSeekRequestError(f"状态码 {resp.status_code}: {body}")
+            last_error = DeepSeekError(f"状态码 {resp.status_code}: {body}")
+            if resp.status_code not in self.RETRY_STATUS:
+                break
+            retry_after = resp.headers.get('Retry-After')
+
+        raise last_error
+
+    def chat(self, payload):
+        """
+        非流式调用，返回 (回答文本, 原始 JSON)。
+        """
+        resp = self._post(dict(payload, stream=False))
+        try:
+            j = resp.json()
+            content = j["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            self.breaker.record_failure()
+            raise DeepSeekError(f"返回格式错误: {e}") from e
+        finally:
+            resp.close()
+        self.breaker.record_success()
+        record_tokens(j.get("usage"))
+        return content, j
+
+    def stream_chat(self, payload):
+        """
+        流式调用，逐段产出增量文本；中途断开或格式错误抛出 DeepSeekError。
+        """
+        resp = self._post(dict(payload, stream=True), stream=True)
+        try:
+            for line in resp.iter_lines():
+                if not line or not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    self.breaker.record_success()
+                    return
+                choices = json.loads(data).get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    yield delta
+            raise DeepSeekError("流式响应提前结束")
+        except requests.exceptions.RequestException as e:
+            self.breaker.record_failure()
+            raise DeepSeekError(f"{type(e).__name__}: {e}") from e
+        except (ValueError, KeyError, IndexError, AttributeError) as e:
+            self.breaker.record_failure()
+            raise DeepSeekError(f"流式响应格式错误: {e}") from e
+        except DeepSeekError:
+            self.breaker.record_failure()
+            raise
+        except GeneratorExit:
+            # 客户端主动断开：上游本身是正常的
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        finally:
+            resp.close()
+
+    def close(self):
+        self.session.close()
+
+
+def client_from_env(api_key, api_base):
+    """根据环境变量创建客户端"""
+    return DeepSeekClient(
+        api_key=api_key,
+        api_base=api_base,
+        connect_timeout=float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", 3.05)),
+        read_timeout=float(os.getenv("DEEPSEEK_READ_TIMEOUT", 20)),
+        max_retries=int(os.getenv("DEEPSEEK_MAX_RETRIES", 2)),
+        pool_size=int(os.getenv("DEEPSEEK_POOL_SIZE", 10)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("DEEPSEEK_BREAKER_THRESHOLD", 5)),
+            recovery_timeout=float(os.getenv("DEEPSEEK_BREAKER_RECOVERY", 30)),
+        ),
+    )
@@ -0,0 +1,227 @@
+# backend/explanation_cache.py
+"""
+AI 讲解词的读穿透缓存：以 Explanation 表为存储，
+按 (attraction_id, audience_type) 查找，命中直接返回，未命中再调用 DeepSeek 并回写。
+"""
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+
+from extensions import db
+from models import Attraction, Explanation
+from offline_bundle import record_changes
+from search_index import remove_documents
+from ai_service import (
+    AUDIENCE_TYPES, DeepSeekError, fallback_explanation, generate_ai_explanation,
+    generate_explanations_batch, stream_ai_explanation,
+)
+
+logger = logging.getLogger(__name__)
+
+# 缓存有效期（秒），默认 7 天
+EXPLANATION_CACHE_TTL = int(os.getenv("EXPLANATION_CACHE_TTL", 7 * 24 * 3600))
+
+# 景点的这些字段变化后，已生成的讲解词即失效
+_SOURCE_FIELDS = ('name', 'description', 'category')
+
+
+def attraction_fingerprint(attraction):
+    """计算景点讲解相关内容的指纹"""
+    raw = '\x1f'.join(str(getattr(attraction, f) or '') for f in _SOURCE_FIELDS)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _is_fresh(entry, fingerprint, now=None):
+    if entry.source_hash != fingerprint or entry.created_at is None:
+        return False
+    now = now or datetime.utcnow()
+    return now - entry.created_at < timedelta(seconds=EXPLANATION_CACHE_TTL)
+
+
+def _lookup(attraction_id, audience_type):
+    return (
+        Explanation.query
+        .filter_by(attraction_id=attraction_id, audience_type=audience_type)
+        .order_by(Explanation.id.desc())
+        .first()
+    )
+
+
+def store_explanation(attraction, audience_type, text, fingerprint=None, entry=None, commit=True):
+    """写入（或覆盖）一条由 DeepSeek 生成的讲解词"""
+    if entry is None:
+        entry = _lookup(attraction.id, audience_type)
+    if entry is None:
+        entry = Explanation(attraction_id=attraction.id, audience_type=audience_type)
+        db.session.add(entry)
+    entry.text_content = text
+    entry.source_hash = fingerprint or attraction_fingerprint(attraction)
+    entry.created_at = datetime.utcnow()
+    if commit:
+        db.session.commit()
+    return entry
+
+
+def is_cached(attraction, audience_type):
+    """该景点、人群的讲解词是否已缓存且仍然新鲜"""
+    entry = _lookup(attraction.id, audience_type)
+    return entry is not None and _is_fresh(entry, attraction_fingerprint(attraction))
+
+
+def get_explanation(attraction, audience_type, offline=False):
+    """
+    获取景点讲解词，返回 (讲解词, 来源)，来源为 cache / ai / stale / template。
+    模板兜底内容不会写入缓存。offline 时不调用 DeepSeek（过载降级）。
+    """
+    if audience_type not in AUDIENCE_TYPES:
+        audience_type = 'all'
+    fingerprint = attraction_fingerprint(attraction)
+    entry = _lookup(attraction.id, audience_type)
+    if entry is not None and _is_fresh(entry, fingerprint):
+        return entry.text_content, 'cache'
+
+    text = None if offline else generate_ai_explanation(
+        attraction_name=attraction.name,
+        description=attraction.description,
+        category=attraction.category,
+        audience_type=audience_type
+    )
+    if text:
+        store_explanation(attraction, audience_type, text, fingerprint, entry)
+        return text, 'ai'
+
+    # DeepSeek 不可用：内容未变、仅过期的讲解词仍优于模板
+    if entry is not None and entry.source_hash == fingerprint:
+        return entry.text_content, 'stale'
+    return fallback_explanation(attraction.name, attraction.description, audience_type), 'template'
+
+
+def get_explanations(attractions, audience_types, offline=False):
+    """
+    批量获取讲解词：先查缓存，未命中的 (景点, 人群) 合并成批量 DeepSeek 调用。
+    返回 {(景点id, 人群): (讲解词, 来源)}。offline 时未命中的直接用过期讲解词或模板。
+    """
+    audience_types = [a if a in AUDIENCE_TYPES else 'all' for a in audience_types]
+    audience_types = list(dict.fromkeys(audience_types))
+    ids = [a.id for a in attractions]
+    entries = {}
+    rows = (
+        Explanation.query
+        .filter(Explanation.attraction_id.in_(ids), Explanation.audience_type.in_(audience_types))
+        .order_by(Explanation.id)
+    )
+    for row in rows:
+        entries[(row.attraction_id, row.audience_type)] = row
+
+    results = {}
+    missing = {}
+    fingerprints = {a.id: attraction_fingerprint(a) for a in attractions}
+    for attraction in attractions:
+        for audience in audience_types:
+            entry = entries.get((attraction.id, audience))
+            if entry is not None and _is_fresh(entry, fingerprints[attraction.id]):
+                results[(attraction.id, audience)] = (entry.text_content, 'cache')
+            else:
+                missing.setdefault(attraction.id, (attraction, []))[1].append(audience)
+
+    # 按缺失的人群组合分组，同组景点一起生成
+    groups = {}
+    for attraction, audiences in missing.values():
+        groups.setdefault(tuple(audiences), []).append(attraction)
+    for audiences, group in groups.items():
+        if offline:
+            generated = {
+                (a.id, audience): (fallback_explanation(a.name, a.description, audience), False)
+                for a in group for audience in audiences
+            }
+        else:
+            generated = generate_explanations_batch(
+                [{'id': a.id, 'name': a.name, 'description': a.description, 'category': a.category}
+                 for a in group],
+                audiences,
+            )
+        for attraction in group:
+            for audience in audiences:
+                key = (attraction.id, audience)
+                text, from_ai = generated[key]
+                entry = entries.get(key)
+                if from_ai:
+                    store_explanation(attraction, audience, text, fingerprints[attraction.id],
+                                      entry, commit=False)
+                    results[key] = (text, 'ai')
+                elif entry is not None and entry.source_hash == fingerprints[attraction.id]:
+                    results[key] = (entry.text_content, 'stale')
+                else:
+                    results[key] = (text, 'template')
+    db.session.commit()
+    return results
+
+
+def stream_explanation(attraction, audience_type):
+    """
+    流式版 get_explanation：逐段产出 ('delta', 文本)，最后产出 ('done', 来源)。
+    缓存命中或兜底时整段作为一个 delta 返回；只有完整收到的 AI 输出才会写入缓存。
+    """
+    if audience_type not in AUDIENCE_TYPES:
+        audience_type = 'all'
+    fingerprint = attraction_fingerprint(attraction)
+    entry = _lookup(attraction.id, audience_type)
+    if entry is not None and _is_fresh(entry, fingerprint):
+        yield 'delta', entry.text_content
+        yield 'done', 'cache'
+        return
+
+    stream = stream_ai_explanation(
+        attraction_name=attraction.name,
+        description=attraction.description,
+        category=attraction.category,
+        audience_type=audience_type
+    )
+    parts = []
+    try:
+        for delta in stream:
+            parts.append(delta)
+            yield 'delta', delta
+    except DeepSeekError as e:
+        if parts:
+            logger.warning("DeepSeek 流式输出中断", extra={'error': str(e)[:300]})
+            yield 'done', 'ai_partial'
+            return
+        if entry is not None and entry.source_hash == fingerprint:
+            yield 'delta', entry.text_content
+            yield 'done', 'stale'
+        else:
+            yield 'delta', fallback_explanation(attraction.name, attraction.description, audience_type)
+            yield 'done', 'template'
+        return
+    finally:
+        stream.close()
+
+    store_explanation(attraction, audience_type, ''.join(parts), fingerprint, entry)
+    yield 'done', 'ai'
+
+
+def _delete_explanations(connection, attraction_id):
+    table = Explanation.__table__
+    deleted = connection.execute(
+        table.delete().where(table.c.attraction_id == attraction_id).returning(table.c.id)
+    ).scalars().all()
+    # 绕过了 ORM，离线包的删除记录和搜索文档要自己处理
+    record_changes(connection, {('explanations', explanation_id): True for explanation_id in deleted})
+    remove_documents(connection, 'explanation', deleted)
+
+
+@event.listens_for(Attraction, 'after_update')
+def _invalidate_on_update(mapper, connection, target):
+    """景点简介/类别等变化时，删除该景点已缓存的讲解词"""
+    state = inspect(target)
+    if any(state.attrs[f].history.has_changes() for f in _SOURCE_FIELDS):
+        _delete_explanations(connection, target.id)
+
+
+@event.listens_for(Attraction, 'after_delete')
+def _invalidate_on_delete(mapper, connection, target):
+    _delete_explanations(connection, target.id)
@@ -1,4 +1,6 @@
 # backend/extensions.py
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from storage import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
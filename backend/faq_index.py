@@ -0,0 +1,259 @@
+# backend/faq_index.py
+"""
+本地问答检索：在调用 DeepSeek 之前，先用字符 bigram 倒排索引在 FAQ 库中查找相似问题，
+置信度足够高时直接返回本地答案；DeepSeek 的回答会连同规范化后的问题一起写回 FAQ 库，
+超过 FAQ_LEARNED_TTL 后不再命中，下次提问重新调用 DeepSeek 并替换旧答案。
+"""
+import math
+import os
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import FaqEntry
+from ai_service import LOCAL_QA, generate_ai_answer, local_answer, stream_huashan_answer
+
+# 命中阈值：关键词条目按问题被关键词覆盖的比例计算，相似问题条目按余弦相似度计算
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", 0.75))
+# 从数据库增量加载其他进程新写入条目的间隔（秒）
+FAQ_REFRESH_INTERVAL = float(os.getenv("FAQ_REFRESH_INTERVAL", 30))
+# 是否把 DeepSeek 的回答写回 FAQ 库
+FAQ_LEARN = os.getenv("FAQ_LEARN", "1") == "1"
+# 写回的 DeepSeek 回答的有效期（秒），默认 7 天；种子和人工条目不过期
+FAQ_LEARNED_TTL = int(os.getenv("FAQ_LEARNED_TTL", 7 * 24 * 3600))
+
+
+def normalize_text(text):
+    """全角转半角、统一小写，并去掉空白和标点符号"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ''.join(ch for ch in text if unicodedata.category(ch)[0] not in 'PZSC')
+
+
+def ngrams(normalized):
+    """字符 bigram 集合；单字文本返回该字本身"""
+    if len(normalized) < 2:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+
+class FaqIndex:
+    """
+    FAQ 条目的 bigram 倒排索引。
+    keyword 条目按"关键词完整出现且占问题的大部分"打分：关键词命中比例 × 问题被覆盖的比例（均按 idf 加权），
+    只提到关键词的长问题得分很低，仍交给 DeepSeek；question 条目按 idf 加权的余弦相似度打分。
+    有过期时间的条目过期后不再参与检索，并在下次 prune 时移出索引。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(set)    # gram -> {条目 id}
+        self._entries = {}                   # 条目 id -> (规范化问题, grams, match_type, answer, 过期时间)
+        self._normalized = defaultdict(dict) # 规范化问题 -> {条目 id: 过期时间}
+        # 已从数据库加载到的最大 id，只由 _refresh 推进：本进程先写入的条目不能让其他进程 id 更小的条目被跳过
+        self.loaded_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry_id, normalized, answer, match_type='question', expires_at=None):
+        grams = ngrams(normalized)
+        if not grams:
+            return
+        with self._lock:
+            self._remove(entry_id)
+            self._entries[entry_id] = (normalized, grams, match_type, answer, expires_at)
+            self._normalized[normalized][entry_id] = expires_at
+            for g in grams:
+                self._postings[g].add(entry_id)
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        normalized, grams = entry[0], entry[1]
+        ids = self._normalized[normalized]
+        ids.pop(entry_id, None)
+        if not ids:
+            del self._normalized[normalized]
+        for g in grams:
+            postings = self._postings[g]
+            postings.discard(entry_id)
+            if not postings:
+                del self._postings[g]
+
+    def remove(self, entry_ids):
+        with self._lock:
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+
+    def prune(self, now=None):
+        """移除已过期的条目，返回移除条数"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            expired = [i for i, e in self._entries.items() if e[4] is not None and e[4] <= now]
+            for entry_id in expired:
+                self._remove(entry_id)
+        return len(expired)
+
+    def contains(self, normalized, now=None):
+        """是否有未过期的相同问题"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            return any(expires_at is None or expires_at > now
+                       for expires_at in self._normalized.get(normalized, {}).values())
+
+    def _idf(self, gram, n):
+        return math.log(1 + n / (1 + len(self._postings.get(gram, ()))))
+
+    def search(self, question, now=None):
+        """返回 (得分, 条目 id, 答案)，没有候选时返回 None"""
+        q_grams = ngrams(normalize_text(question))
+        if not q_grams:
+            return None
+        now = now or datetime.utcnow()
+        with self._lock:
+            n = len(self._entries)
+            idf = {g: self._idf(g, n) for g in q_grams}
+            overlap = defaultdict(float)
+            for g in q_grams:
+                for entry_id in self._postings.get(g, ()):
+                    overlap[entry_id] += idf[g] ** 2
+            if not overlap:
+                return None
+            q_norm = math.sqrt(sum(w * w for w in idf.values()))
+            q_total = sum(idf.values())
+
+            best = None
+            for entry_id, shared in overlap.items():
+                _, grams, match_type, answer, expires_at = self._entries[entry_id]
+                if expires_at is not None and expires_at <= now:
+                    continue
+                weights = [self._idf(g, n) for g in grams]
+                if match_type == 'keyword':
+                    hit = sum(w for g, w in zip(grams, weights) if g in q_grams)
+                    score = (hit / sum(weights)) * (hit / q_total)
+                else:
+                    score = shared / (q_norm * math.sqrt(sum(w * w for w in weights)))
+                if best is None or score > best[0]:
+                    best = (score, entry_id, answer)
+            return best
+
+
+_index = FaqIndex()
+_index_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def _expires_at(entry):
+    if entry.source != 'ai' or entry.created_at is None:
+        return None
+    return entry.created_at + timedelta(seconds=FAQ_LEARNED_TTL)
+
+
+def _refresh(force=False):
+    """增量加载 id 大于 loaded_id 的条目（包括其他 worker 进程写入的），并移出已过期的条目"""
+    global _last_refresh
+    now = time.monotonic()
+    if not force and now - _last_refresh < FAQ_REFRESH_INTERVAL:
+        return
+    with _index_lock:
+        if not force and now - _last_refresh < FAQ_REFRESH_INTERVAL:
+            return
+        rows = (
+            FaqEntry.query
+            .filter(FaqEntry.id > _index.loaded_id)
+            .order_by(FaqEntry.id)
+            .all()
+        )
+        for row in rows:
+            _index.add(row.id, row.normalized_question, row.answer, row.match_type, _expires_at(row))
+        if rows:
+            _index.loaded_id = rows[-1].id
+        _index.prune()
+        _last_refresh = now
+
+
+def reload_index():
+    """丢弃内存索引并从数据库重建（删除或修改条目后调用）"""
+    global _index
+    with _index_lock:
+        _index = FaqIndex()
+    _refresh(force=True)
+
+
+def lookup(question):
+    """在 FAQ 库中查找高置信度答案，未命中返回 None"""
+    _refresh()
+    best = _index.search(question)
+    if best is not None and best[0] >= FAQ_MATCH_THRESHOLD:
+        return best[2]
+    return None
+
+
+def learn(question, answer, force=False):
+    """
+    把 DeepSeek 的回答写回 FAQ 库；force 时忽略 FAQ_LEARN 开关（缓存预热用）。
+    相同问题已过期的回答会被删除，由新回答替换。
+    """
+    normalized = normalize_text(question)
+    if not (FAQ_LEARN or force) or not normalized or _index.contains(normalized):
+        return
+    expired = []
+    for row in FaqEntry.query.filter_by(normalized_question=normalized, source='ai'):
+        expired.append(row.id)
+        db.session.delete(row)
+    db.session.add(FaqEntry(question=question, normalized_question=normalized,
+                            answer=answer, match_type='question', source='ai'))
+    db.session.commit()
+    _index.remove(expired)
+    # 经 _refresh 加载新条目，连同其他进程此前写入、本进程尚未加载的条目
+    _refresh(force=True)
+
+
+def answer_question(question, offline=False):
+    """
+    回答游客问题，返回 (回答, 来源)，来源为 faq / ai / local。offline 时不调用 DeepSeek（过载降级）。
+    """
+    answer = lookup(question)
+    if answer is not None:
+        return answer, 'faq'
+
+    answer = None if offline else generate_ai_answer(question)
+    if answer:
+        learn(question, answer)
+        return answer, 'ai'
+    return local_answer(question), 'local'
+
+
+def stream_answer(question):
+    """
+    流式版 answer_question：FAQ 命中时整段返回，否则转发 DeepSeek 的流式输出。
+    """
+    answer = lookup(question)
+    if answer is not None:
+        yield 'delta', answer
+        yield 'done', 'faq'
+        return
+
+    parts = []
+    events = stream_huashan_answer(question)
+    try:
+        for kind, value in events:
+            if kind == 'delta':
+                parts.append(value)
+            elif value == 'ai':
+                learn(question, ''.join(parts))
+            yield kind, value
+    finally:
+        events.close()
+
+
+def seed_faq_entries():
+    """用本地知识库初始化 FAQ 库"""
+    for key, answer in LOCAL_QA.items():
+        db.session.add(FaqEntry(question=key, normalized_question=normalize_text(key),
+                                answer=answer, match_type='keyword', source='seed'))
+    db.session.commit()
@@ -0,0 +1,191 @@
+# backend/geo_index.py
+"""
+进程内空间索引：把景点、商家按经纬度放入等距网格，支持半径查询和 k 近邻查询，
+结果按 haversine 距离排序。数据版本号变化时整体重建。
+"""
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+from catalog import CATALOG
+from models import Attraction, Merchant
+from versioning import get_version, on_commit, track_changes
+
+EARTH_RADIUS_M = 6371008.8
+
+# 网格边长（度）；未配置时按点的密度自动选择，使每格平均约 GEO_POINTS_PER_CELL 个点
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", 0)) or None
+GEO_POINTS_PER_CELL = int(os.getenv("GEO_POINTS_PER_CELL", 8))
+GEO_VERSION_CHECK_INTERVAL = float(os.getenv("GEO_VERSION_CHECK_INTERVAL", 1.0))
+# 附近查询允许的最大 k 和最大半径（米）
+GEO_MAX_K = int(os.getenv("GEO_MAX_K", 100))
+GEO_MAX_RADIUS_M = float(os.getenv("GEO_MAX_RADIUS_M", 50000))
+
+MERCHANTS = 'merchants'
+track_changes(MERCHANTS, Merchant)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """两点间的球面距离（米）"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """经纬度网格索引，点为 (纬度, 经度, 负载)"""
+
+    def __init__(self, points, cell=GEO_CELL_DEGREES):
+        points = [p for p in points if p[0] is not None and p[1] is not None]
+        self.cell = cell or self._auto_cell(points)
+        self.cells = {}
+        self.size = 0
+        for lat, lon, payload in points:
+            self.cells.setdefault(self._key(lat, lon), []).append((lat, lon, payload))
+            self.size += 1
+        if self.cells:
+            self.bounds = (
+                min(i for i, _ in self.cells), max(i for i, _ in self.cells),
+                min(j for _, j in self.cells), max(j for _, j in self.cells),
+            )
+
+    @staticmethod
+    def _auto_cell(points):
+        if len(points) < 2:
+            return 0.005
+        lats = [p[0] for p in points]
+        lons = [p[1] for p in points]
+        area = max(max(lats) - min(lats), 1e-4) * max(max(lons) - min(lons), 1e-4)
+        cell = math.sqrt(area * GEO_POINTS_PER_CELL / len(points))
+        return min(max(cell, 0.0002), 0.05)
+
+    def _key(self, lat, lon):
+        return int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell))
+
+    def _ring(self, ci, cj, r):
+        """以 (ci, cj) 为中心、切比雪夫距离为 r 的一圈网格"""
+        if r == 0:
+            yield ci, cj
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield ci - r, j
+            yield ci + r, j
+        for i in range(ci - r + 1, ci + r):
+            yield i, cj - r
+            yield i, cj + r
+
+    def _ring_min_distance(self, lat, r):
+        """第 r 圈网格中的点与中心点的距离下界（米）"""
+        if r == 0:
+            return 0.0
+        lat_m = (r - 1) * self.cell * math.pi / 180 * EARTH_RADIUS_M
+        lon_m = lat_m * max(math.cos(math.radians(min(abs(lat) + r * self.cell, 89.9))), 0.0)
+        return min(lat_m, lon_m)
+
+    def within(self, lat, lon, radius_m, predicate=None):
+        """半径 radius_m 米内的点，按距离升序，返回 [(距离, 负载)]"""
+        dlat = radius_m / EARTH_RADIUS_M * 180 / math.pi
+        dlon = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        i0, j0 = self._key(lat - dlat, lon - dlon)
+        i1, j1 = self._key(lat + dlat, lon + dlon)
+        found = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                for plat, plon, payload in self.cells.get((i, j), ()):
+                    if predicate is not None and not predicate(payload):
+                        continue
+                    d = haversine(lat, lon, plat, plon)
+                    if d <= radius_m:
+                        found.append((d, payload))
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def nearest(self, lat, lon, k, max_radius_m=None, predicate=None):
+        """
+        k 近邻：由内向外逐圈扩展，直到下一圈不可能更近为止。
+        从数据范围的边缘所在圈开始；走过的网格数超过非空网格数时（查询点远离数据），改为逐点扫描。
+        """
+        if k <= 0 or not self.size:
+            return []
+        ci, cj = self._key(lat, lon)
+        heap = []  # 最大堆（距离取负），保留当前最近的 k 个
+        i_min, i_max, j_min, j_max = self.bounds
+        r = max(i_min - ci, ci - i_max, j_min - cj, cj - j_max, 0)
+        max_rings = max(ci - i_min, i_max - ci, cj - j_min, j_max - cj, 0)
+        walked = 0
+        order = itertools.count()  # 距离相同时按发现顺序，避免比较负载
+        while r <= max_rings:
+            if len(heap) == k and self._ring_min_distance(lat, r) > -heap[0][0]:
+                break
+            if max_radius_m is not None and self._ring_min_distance(lat, r) > max_radius_m:
+                break
+            walked += 8 * r or 1
+            if walked > len(self.cells):
+                heap = []
+                for points in self.cells.values():
+                    self._collect(heap, order, k, lat, lon, points, max_radius_m, predicate)
+                break
+            for key in self._ring(ci, cj, r):
+                self._collect(heap, order, k, lat, lon, self.cells.get(key, ()), max_radius_m, predicate)
+            r += 1
+        return sorted(((-nd, payload) for nd, _, payload in heap), key=lambda item: item[0])
+
+    @staticmethod
+    def _collect(heap, order, k, lat, lon, points, max_radius_m, predicate):
+        for plat, plon, payload in points:
+            if predicate is not None and not predicate(payload):
+                continue
+            d = haversine(lat, lon, plat, plon)
+            if max_radius_m is not None and d > max_radius_m:
+                continue
+            item = (-d, next(order), payload)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif d < -heap[0][0]:
+                heapq.heapreplace(heap, item)
+
+
+class _VersionedIndex:
+    """按数据版本号缓存的网格索引"""
+
+    def __init__(self, version_name, load):
+        self.version_name = version_name
+        self.load = load
+        self._index = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        on_commit(version_name, self.invalidate)
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < GEO_VERSION_CHECK_INTERVAL:
+            return self._index
+        version = get_version(self.version_name)
+        with self._lock:
+            if self._index is None or self._version != version:
+                self._index = GridIndex(self.load())
+                self._version = version
+            self._checked_at = now
+        return self._index
+
+
+def _load_attractions():
+    return [(a.latitude, a.longitude, a.to_dict()) for a in Attraction.query.all()]
+
+
+def _load_merchants():
+    return [(m.latitude, m.longitude, m.to_dict()) for m in Merchant.query.all()]
+
+
+# 景点的写入已由目录快照的 catalog 版本号跟踪
+attraction_index = _VersionedIndex(CATALOG, _load_attractions)
+merchant_index = _VersionedIndex(MERCHANTS, _load_merchants)
@@ -0,0 +1,348 @@
+# backend/instrumentation.py
+"""
+指标与日志：
+- 进程内的计数器/直方图，按 Prometheus 文本格式在 /api/metrics 输出：
+  各接口请求数与延迟、每个请求的数据库耗时、DeepSeek 上游耗时/状态/token 用量、缓存命中情况；
+- 分级的结构化日志（text 或 json），低于 WARNING 的日志可按比例采样或整体关闭。
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text / json
+# 低于 WARNING 的日志的保留比例，1 为全部输出，0 为全部丢弃
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+logger = logging.getLogger(__name__)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for k, v in items)
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self.samples()):
+            lines.append(f'{self.name}{_format_labels(key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # 标签 -> [各桶计数..., 总数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(key, [("le", _format_value(float(bound)))])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(key, [("le", "+Inf")])} {values[-2]}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {values[-2]}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(values[-1])}')
+        return lines
+
+
+class Gauges:
+    """由回调函数在输出时计算的一组 gauge：callback() 返回 [(标签 dict, 值)]"""
+
+    def __init__(self, name, help_text, callback):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        try:
+            samples = self.callback()
+        except Exception:
+            logger.exception('指标回调失败: %s', self.name)
+            return []
+        for labels, value in samples:
+            lines.append(f'{self.name}{_format_labels(_label_key(labels))} {_format_value(value)}')
+        return lines
+
+
+_metrics = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def counter(name, help_text):
+    return _register(Counter(name, help_text))
+
+
+def histogram(name, help_text, buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, help_text, buckets))
+
+
+def gauges(name, help_text, callback):
+    return _register(Gauges(name, help_text, callback))
+
+
+def render():
+    """所有指标的 Prometheus 文本格式"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ==================== 指标定义 ====================
+
+HTTP_REQUESTS = counter('http_requests_total', 'HTTP 请求数')
+HTTP_LATENCY = histogram('http_request_duration_seconds', 'HTTP 请求处理耗时（流式响应只计到响应头）')
+HTTP_DB_TIME = histogram('http_request_db_seconds', '每个请求内执行 SQL 的总耗时')
+DB_QUERIES = counter('db_queries_total', '按接口统计的 SQL 执行次数')
+
+UPSTREAM_REQUESTS = counter('deepseek_requests_total', 'DeepSeek 请求次数（每次重试单独计数）')
+UPSTREAM_LATENCY = histogram('deepseek_request_duration_seconds', 'DeepSeek 请求耗时（到响应头）',
+                             UPSTREAM_BUCKETS)
+UPSTREAM_TOKENS = counter('deepseek_tokens_total', 'DeepSeek 返回的 token 用量')
+
+AI_ADMISSION = counter('ai_admission_total', 'AI 接口准入结果（admitted / rate_limited / shed，shed 按原因区分）')
+CACHE_LOOKUPS = counter('cache_lookups_total', 'AI 内容来源统计（cache/faq 为命中）')
+CACHE_HIT_SOURCES = {'cache', 'faq'}
+
+
+def record_upstream(kind, status, seconds=None):
+    """记录一次 DeepSeek 请求：kind 为 chat/stream，status 为状态码或错误类别"""
+    UPSTREAM_REQUESTS.inc(kind=kind, status=str(status))
+    if seconds is not None:
+        UPSTREAM_LATENCY.observe(seconds, kind=kind)
+
+
+def record_tokens(usage):
+    for field in ('prompt_tokens', 'completion_tokens'):
+        value = (usage or {}).get(field)
+        if value:
+            UPSTREAM_TOKENS.inc(value, type=field.split('_')[0])
+
+
+def record_source(cache, source):
+    CACHE_LOOKUPS.inc(cache=cache, source=source)
+
+
+def _hit_ratios():
+    totals = defaultdict(float)
+    hits = defaultdict(float)
+    for key, value in CACHE_LOOKUPS.samples():
+        labels = dict(key)
+        totals[labels['cache']] += value
+        if labels['source'] in CACHE_HIT_SOURCES:
+            hits[labels['cache']] += value
+    return [({'cache': cache}, round(hits[cache] / total, 4)) for cache, total in totals.items() if total]
+
+
+gauges('cache_hit_ratio', 'AI 内容缓存命中率', _hit_ratios)
+
+
+# ==================== Flask 接入 ====================
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _db_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _db_end(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context() and 'db_time' in g:
+        g.db_time += elapsed
+        g.db_queries += 1
+
+
+def _stat_samples(stats):
+    return [({'stat': k}, v) for k, v in stats.items()]
+
+
+def _ai_executor_stats():
+    from ai_executor import executor
+    return _stat_samples(executor.stats())
+
+
+def _singleflight_stats():
+    from ai_service import singleflight_stats
+    return _stat_samples(singleflight_stats())
+
+
+def _circuit_state():
+    from ai_service import _client
+    return [({}, {'closed': 0, 'half_open': 0.5, 'open': 1}[_client.breaker.state])]
+
+
+def _compression_cache_stats():
+    from compression import cache_stats
+    return _stat_samples(cache_stats())
+
+
+def _checkin_writer_stats():
+    writer = current_app.extensions.get('checkin_writer')
+    return _stat_samples(writer.stats()) if writer else []
+
+
+gauges('ai_executor', 'AI 线程池计数（累计值与当前值）', _ai_executor_stats)
+gauges('ai_singleflight', 'DeepSeek 相同请求合并计数', _singleflight_stats)
+gauges('deepseek_circuit_open', 'DeepSeek 熔断器是否打开（half_open 记为 0.5）', _circuit_state)
+gauges('checkin_writer', '打卡批量写入计数（累计值与当前值）', _checkin_writer_stats)
+gauges('compression_cache', '不变响应的压缩结果缓存命中计数', _compression_cache_stats)
+
+
+def init_app(app):
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        g.db_time = 0.0
+        g.db_queries = 0
+
+    @app.after_request
+    def _record_request(response):
+        if 'request_started' not in g:
+            return response
+        # 用路由模板作为标签，避免 /attractions/<id> 之类的路径产生无限多的时间序列
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        elapsed = time.perf_counter() - g.request_started
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+        HTTP_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method)
+        HTTP_DB_TIME.observe(g.db_time, endpoint=endpoint)
+        if g.db_queries:
+            DB_QUERIES.inc(g.db_queries, endpoint=endpoint)
+        return response
+
+
+# ==================== 日志 ====================
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _extras(record):
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED and not k.startswith('_')}
+
+
+class TextFormatter(logging.Formatter):
+    """`时间 级别 logger 消息 key=value ...`"""
+
+    def format(self, record):
+        line = super().format(record)
+        extras = _extras(record)
+        if extras:
+            line += ' ' + ' '.join(f'{k}={v}' for k, v in extras.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(_extras(record))
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """WARNING 以下的日志按 rate 随机保留"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, sample_rate=LOG_SAMPLE_RATE):
+    """为根 logger 安装一个处理器（重复调用不会重复安装）"""
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if getattr(handler, '_huashan', False):
+            return
+    handler = logging.StreamHandler()
+    handler._huashan = True
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    handler.addFilter(SampleFilter(sample_rate))
+    root.addHandler(handler)
+    root.setLevel(level)
@@ -0,0 +1,133 @@
+# backend/merchant_search.py
+"""
+商家检索：按评分/距离/佣金比例排序的游标（keyset）分页、字段投影和总数估计。
+排序走 (category, 排序列) 复合索引，翻页不使用 OFFSET。
+"""
+import base64
+import json
+import threading
+
+from sqlalchemy import and_, func, or_, tuple_
+
+from extensions import db
+from geo_index import MERCHANTS
+from models import Merchant
+from serialization import encoder_for, field_names
+from versioning import get_version
+
+SORT_COLUMNS = {
+    'rating': Merchant.rating,
+    'distance': Merchant.distance_from_center,
+    'commission_rate': Merchant.commission_rate,
+}
+# 各排序方式的默认方向
+DEFAULT_ORDER = {'rating': 'desc', 'distance': 'asc', 'commission_rate': 'desc'}
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class SearchError(ValueError):
+    """检索参数无效"""
+
+
+def encode_cursor(sort, order, value, last_id):
+    raw = json.dumps([sort, order, value, last_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort, order, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(value, bool) or not isinstance(value, (int, float, str, type(None))):
+            raise TypeError(value)
+        if isinstance(last_id, bool) or not isinstance(last_id, int):
+            raise TypeError(last_id)
+        return sort, order, value, last_id
+    except (ValueError, TypeError):
+        raise SearchError('cursor 无效')
+
+
+def _after(column, order, value, last_id):
+    """
+    keyset 条件：排在 (value, last_id) 之后的行。
+    SQLite 中 NULL 在升序时排最前、降序时排最后。
+    """
+    if order == 'asc':
+        if value is None:
+            return or_(and_(column.is_(None), Merchant.id > last_id), column.isnot(None))
+        return tuple_(column, Merchant.id) > tuple_(value, last_id)
+    if value is None:
+        return and_(column.is_(None), Merchant.id < last_id)
+    return or_(tuple_(column, Merchant.id) < tuple_(value, last_id), column.is_(None))
+
+
+_counts = {'version': None, 'by_category': {}}
+_counts_lock = threading.Lock()
+
+
+def count_estimate(category=None):
+    """
+    按分类统计的商家数：每个数据版本只做一次走 category 索引的分组计数，之后直接读缓存。
+    """
+    version = get_version(MERCHANTS)
+    with _counts_lock:
+        if _counts['version'] != version:
+            rows = db.session.query(Merchant.category, func.count()).group_by(Merchant.category)
+            _counts['by_category'] = {c: n for c, n in rows}
+            _counts['version'] = version
+        by_category = _counts['by_category']
+    if category:
+        return by_category.get(category, 0)
+    return sum(by_category.values())
+
+
+def search_merchants(category=None, sort='rating', order=None, limit=None, cursor=None, fields=None):
+    """
+    返回 {'items', 'next_cursor', 'limit', 'total_estimate'}。
+    fields 为 serialization.parse_fields 解析出的字段（已含 id），None 表示全部字段。
+    """
+    if sort not in SORT_COLUMNS:
+        raise SearchError(f'不支持的排序: {sort}')
+    order = order or DEFAULT_ORDER[sort]
+    if order not in ('asc', 'desc'):
+        raise SearchError('order 只能是 asc 或 desc')
+    try:
+        limit = min(max(int(limit or DEFAULT_LIMIT), 1), MAX_LIMIT)
+    except ValueError:
+        raise SearchError('limit 无效')
+    fields = list(fields or field_names(Merchant))
+
+    column = SORT_COLUMNS[sort]
+    # 始终取出 id 和排序列以生成游标
+    selected = list(dict.fromkeys(['id', column.key] + list(fields)))
+    query = db.session.query(*[getattr(Merchant, f) for f in selected])
+    if category:
+        query = query.filter(Merchant.category == category)
+    if cursor:
+        c_sort, c_order, value, last_id = decode_cursor(cursor)
+        if (c_sort, c_order) != (sort, order):
+            raise SearchError('cursor 与排序参数不一致')
+        query = query.filter(_after(column, order, value, last_id))
+    if order == 'asc':
+        query = query.order_by(column.asc(), Merchant.id.asc())
+    else:
+        query = query.order_by(column.desc(), Merchant.id.desc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    encode = encoder_for(Merchant, fields)
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, order, getattr(last, column.key), last.id)
+
+    return {
+        'items': [encode(row) for row in rows],
+        'next_cursor': next_cursor,
+        'limit': limit,
+        'total_estimate': count_estimate(category),
+    }
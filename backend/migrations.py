@@ -0,0 +1,145 @@
+# backend/migrations.py
+"""
+带版本号的数据库迁移：当前版本记录在 SQLite 的 PRAGMA user_version 中，
+启动时按顺序执行尚未应用的迁移，每个迁移在一个事务内完成，不删除已有数据。
+pysqlite 默认不会在 DDL 前开启事务，因此迁移在自动提交的连接上显式 BEGIN IMMEDIATE / COMMIT，
+ALTER、CREATE 与 user_version 一起提交或回滚；写锁同时避免多个 worker 重复执行同一迁移。
+迁移须可重复执行：新库由 db.create_all() 建表后同样会依次跑一遍。
+"""
+import json
+import logging
+
+from sqlalchemy import inspect, text
+
+from catalog import CATALOG
+from extensions import db
+from versioning import bump_version
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []  # [(版本号, 说明, 函数)]
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def current_version(conn):
+    return conn.execute(text('PRAGMA user_version')).scalar() or 0
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def migrate():
+    """执行所有未应用的迁移，返回迁移后的版本号"""
+    with db.engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        version = current_version(conn)
+        for number, description, fn in MIGRATIONS:
+            if number <= version:
+                continue
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                # 拿到写锁后重新读取，其他 worker 可能已完成该迁移
+                version = current_version(conn)
+                if number > version:
+                    fn(conn)
+                    # user_version 写在数据库文件头中，随事务一起提交
+                    conn.execute(text(f'PRAGMA user_version = {int(number)}'))
+            except BaseException:
+                conn.exec_driver_sql('ROLLBACK')
+                raise
+            conn.exec_driver_sql('COMMIT')
+            if number > version:
+                logger.info("数据库迁移 %s: %s", number, description)
+                version = number
+    return version
+
+
+def _add_columns(conn, table, columns):
+    existing = {c['name'] for c in inspect(conn).get_columns(table)}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+
+
+@migration(1, '补齐讲解缓存和商家坐标列、模型中声明的索引，迁移路线途经站点')
+def _baseline(conn):
+    from models import RouteStop
+
+    _add_columns(conn, 'explanations', {
+        'source_hash': 'VARCHAR(64)',
+        'created_at': 'DATETIME',
+    })
+    _add_columns(conn, 'merchants', {
+        'latitude': 'FLOAT',
+        'longitude': 'FLOAT',
+    })
+    # 只建列已存在的索引，依赖后续迁移新增列的索引由对应迁移负责
+    inspector = inspect(conn)
+    for table in db.metadata.sorted_tables:
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if all(c.name in existing for c in index.columns):
+                index.create(bind=conn, checkfirst=True)
+
+    # 把 routes.attractions 中的 JSON id 列表迁移到 route_stops 表（已迁移的路线跳过）
+    migrated = {route_id for (route_id,) in conn.execute(text('SELECT DISTINCT route_id FROM route_stops'))}
+    stops = []
+    for route_id, attractions in conn.execute(text('SELECT id, attractions FROM routes')):
+        if route_id in migrated or not attractions:
+            continue
+        for position, attraction_id in enumerate(json.loads(attractions)):
+            stops.append({'route_id': route_id, 'position': position, 'attraction_id': attraction_id})
+    if stops:
+        conn.execute(RouteStop.__table__.insert(), stops)
+        bump_version(conn, CATALOG)
+
+
+@migration(2, '为 handler 常用的过滤列建索引')
+def _hot_column_indexes(conn):
+    # explanations.attraction_id 与 merchants.category 已是复合索引
+    # ix_explanations_attraction_audience、ix_merchants_category_* 的首列，无需单独建索引
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_user_checkins_user_id ON user_checkins (user_id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_attractions_safety_level ON attractions (safety_level)'))
+
+
+@migration(3, '根据已有打卡明细生成景点打卡汇总')
+def _checkin_stats(conn):
+    from checkin_stats import rebuild_in_transaction
+    from models import AttractionStats, CheckinHourly
+
+    AttractionStats.__table__.create(bind=conn, checkfirst=True)
+    CheckinHourly.__table__.create(bind=conn, checkfirst=True)
+    rebuild_in_transaction(conn)
+
+
+@migration(4, '建立离线包的行变更记录表')
+def _row_versions(conn):
+    from models import RowVersion
+
+    RowVersion.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(5, '建立 AI 接口限流令牌桶和上游并发名额表')
+def _admission_tables(conn):
+    from models import RateLimitBucket, UpstreamLease
+
+    RateLimitBucket.__table__.create(bind=conn, checkfirst=True)
+    UpstreamLease.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(6, '建立全文搜索表并索引现有景点、讲解词和商家')
+def _search_tables(conn):
+    import search_index
+    from models import SearchDocument
+
+    SearchDocument.__table__.create(bind=conn, checkfirst=True)
+    search_index.create_tables(conn)
+    search_index.rebuild(conn)
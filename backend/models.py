@@ -1,9 +1,15 @@
 # backend/models.py
+import json
 from datetime import datetime
 from extensions import db
+from serialization import SerializerMixin
 
 
-class User(db.Model):
+def _json_list(value):
+    return json.loads(value) if value else []
+
+
+class User(SerializerMixin, db.Model):
     __tablename__ = 'users'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -14,18 +20,12 @@ class User(db.Model):
     has_medical_condition = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'age_group': self.age_group,
-            'fitness_level': self.fitness_level,
-            'fear_of_heights': self.fear_of_heights,
-            'has_medical_condition': self.has_medical_condition,
-        }
+    __serialize__ = (
+        'id', 'username', 'age_group', 'fitness_level', 'fear_of_heights', 'has_medical_condition',
+    )
 
 
-class Attraction(db.Model):
+class Attraction(SerializerMixin, db.Model):
     __tablename__ = 'attractions'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -37,28 +37,17 @@ class Attraction(db.Model):
     altitude = db.Column(db.Integer)
     difficulty_level = db.Column(db.Integer)
     estimated_time = db.Column(db.Integer)
-    safety_level = db.Column(db.String(50))
+    safety_level = db.Column(db.String(50), index=True)
     image_url = db.Column(db.String(500))
     tips = db.Column(db.Text)
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'category': self.category,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'altitude': self.altitude,
-            'difficulty_level': self.difficulty_level,
-            'estimated_time': self.estimated_time,
-            'safety_level': self.safety_level,
-            'image_url': self.image_url,
-            'tips': self.tips,
-        }
-
-
-class Route(db.Model):
+    __serialize__ = (
+        'id', 'name', 'description', 'category', 'latitude', 'longitude', 'altitude',
+        'difficulty_level', 'estimated_time', 'safety_level', 'image_url', 'tips',
+    )
+
+
+class Route(SerializerMixin, db.Model):
     __tablename__ = 'routes'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -70,41 +59,79 @@ class Route(db.Model):
     recommended_for = db.Column(db.String(50))
     cable_car_usage = db.Column(db.String(100))
     image_url = db.Column(db.String(500))
+    stops = db.relationship('RouteStop', order_by='RouteStop.position',
+                            cascade='all, delete-orphan', lazy='select')
+
+    def set_attraction_ids(self, attraction_ids):
+        """设置路线途经景点（按顺序），同时更新 route_stops 表和兼容旧版的 JSON 列"""
+        attraction_ids = list(attraction_ids)
+        self.attractions = json.dumps(attraction_ids)
+        self.stops = [
+            RouteStop(position=position, attraction_id=attraction_id)
+            for position, attraction_id in enumerate(attraction_ids)
+        ]
+
+    __serialize__ = (
+        'id', 'name', 'description', 'difficulty', 'estimated_duration',
+        ('attractions', lambda r: _json_list(r.attractions)),
+        'recommended_for', 'cable_car_usage', 'image_url',
+    )
+
+
+class RouteStop(db.Model):
+    __tablename__ = 'route_stops'
+
+    route_id = db.Column(db.Integer, db.ForeignKey('routes.id'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)  # 途经顺序，从 0 开始
+    attraction_id = db.Column(db.Integer, db.ForeignKey('attractions.id'), nullable=False, index=True)
+
+
+class TrailSegment(SerializerMixin, db.Model):
+    __tablename__ = 'trail_segments'
+
+    id = db.Column(db.Integer, primary_key=True)
+    from_attraction_id = db.Column(db.Integer, db.ForeignKey('attractions.id'), nullable=False)
+    to_attraction_id = db.Column(db.Integer, db.ForeignKey('attractions.id'), nullable=False)
+    name = db.Column(db.String(100))
+    kind = db.Column(db.String(20), default='trail')  # trail / cable_car
+    walking_minutes = db.Column(db.Integer, nullable=False)
+    difficulty_level = db.Column(db.Integer, default=0)
+    exposed = db.Column(db.Boolean, default=False)  # 临崖、需攀爬等恐高者应回避的路段
+    bidirectional = db.Column(db.Boolean, default=True)
+
+    __serialize__ = (
+        'id', 'from_attraction_id', 'to_attraction_id', 'name', 'kind', 'walking_minutes',
+        'difficulty_level', 'exposed', 'bidirectional',
+    )
 
-    def to_dict(self):
-        import json
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'difficulty': self.difficulty,
-            'estimated_duration': self.estimated_duration,
-            'attractions': json.loads(self.attractions) if self.attractions else [],
-            'recommended_for': self.recommended_for,
-            'cable_car_usage': self.cable_car_usage,
-            'image_url': self.image_url,
-        }
-
-
-class Explanation(db.Model):
+
+class Explanation(SerializerMixin, db.Model):
     __tablename__ = 'explanations'
+    __table_args__ = (
+        db.Index('ix_explanations_attraction_audience', 'attraction_id', 'audience_type'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     attraction_id = db.Column(db.Integer, db.ForeignKey('attractions.id'))
     audience_type = db.Column(db.String(50))
     text_content = db.Column(db.Text)
+    source_hash = db.Column(db.String(64))  # 生成时景点内容的指纹，用于缓存失效
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'attraction_id': self.attraction_id,
-            'audience_type': self.audience_type,
-            'text_content': self.text_content,
-        }
+    __serialize__ = ('id', 'attraction_id', 'audience_type', 'text_content')
 
 
-class Merchant(db.Model):
+class Merchant(SerializerMixin, db.Model):
     __tablename__ = 'merchants'
+    # 排序分页用的复合索引（SQLite 索引隐含 rowid，即 id，可作为 keyset 的第二键）
+    __table_args__ = (
+        db.Index('ix_merchants_category_rating', 'category', 'rating'),
+        db.Index('ix_merchants_category_distance', 'category', 'distance_from_center'),
+        db.Index('ix_merchants_category_commission', 'category', 'commission_rate'),
+        db.Index('ix_merchants_rating', 'rating'),
+        db.Index('ix_merchants_distance', 'distance_from_center'),
+        db.Index('ix_merchants_commission', 'commission_rate'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -115,37 +142,142 @@ class Merchant(db.Model):
     commission_rate = db.Column(db.Float)
     url = db.Column(db.String(500))
     distance_from_center = db.Column(db.Float)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'category': self.category,
-            'location': self.location,
-            'phone': self.phone,
-            'rating': self.rating,
-            'commission_rate': self.commission_rate,
-            'url': self.url,
-            'distance_from_center': self.distance_from_center,
-        }
-
-
-class UserCheckIn(db.Model):
+    __serialize__ = (
+        'id', 'name', 'category', 'location', 'phone', 'rating', 'commission_rate', 'url',
+        'distance_from_center', 'latitude', 'longitude',
+    )
+
+
+class UserCheckIn(SerializerMixin, db.Model):
     __tablename__ = 'user_checkins'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     attraction_id = db.Column(db.Integer, db.ForeignKey('attractions.id'))
     checked_in_at = db.Column(db.DateTime, default=datetime.utcnow)
     notes = db.Column(db.Text)
     rating = db.Column(db.Integer)
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'attraction_id': self.attraction_id,
-            'checked_in_at': self.checked_in_at.isoformat(),
-            'notes': self.notes,
-            'rating': self.rating,
-        }
+    __serialize__ = ('id', 'user_id', 'attraction_id', 'checked_in_at', 'notes', 'rating')
+
+
+class AttractionStats(SerializerMixin, db.Model):
+    """景点打卡汇总，随打卡批量写入增量更新"""
+    __tablename__ = 'attraction_stats'
+
+    attraction_id = db.Column(db.Integer, db.ForeignKey('attractions.id'), primary_key=True)
+    checkin_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    last_checkin_at = db.Column(db.DateTime)
+
+    __serialize__ = (
+        'attraction_id', 'checkin_count', 'rating_count',
+        ('average_rating', lambda s: round(s.rating_sum / s.rating_count, 2) if s.rating_count else None),
+        'last_checkin_at',
+    )
+
+
+class CheckinHourly(db.Model):
+    """景点每小时打卡数，只保留最近 CHECKIN_STATS_WINDOW_HOURS 小时"""
+    __tablename__ = 'checkin_hourly'
+
+    attraction_id = db.Column(db.Integer, db.ForeignKey('attractions.id'), primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True)  # UTC 时间戳 // 3600
+    checkin_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_checkin_hourly_hour', 'hour'),
+    )
+
+
+class FaqEntry(SerializerMixin, db.Model):
+    __tablename__ = 'faq_entries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    question = db.Column(db.Text, nullable=False)
+    normalized_question = db.Column(db.Text, nullable=False, index=True)
+    answer = db.Column(db.Text, nullable=False)
+    match_type = db.Column(db.String(20), default='question')  # keyword: 关键词包含匹配；question: 相似问题匹配
+    source = db.Column(db.String(20), default='ai')  # seed / ai / manual
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __serialize__ = ('id', 'question', 'answer', 'match_type', 'source')
+
+
+class AiJob(SerializerMixin, db.Model):
+    """异步 AI 任务（job 模式）：客户端拿到 id 后轮询结果"""
+    __tablename__ = 'ai_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # explain / ask / warmup
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / done / failed
+    params = db.Column(db.Text)  # JSON
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime)
+
+    __serialize__ = (
+        ('job_id', 'id'), 'kind', 'status',
+        ('result', lambda j: json.loads(j.result) if j.result else None),
+        'error', 'created_at', 'finished_at',
+    )
+
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RowVersion(db.Model):
+    """离线包的变更记录：每个分区（attractions/routes/explanations/faq）中每一行最后一次变更时的版本号"""
+    __tablename__ = 'row_versions'
+
+    section = db.Column(db.String(20), primary_key=True)
+    row_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+
+
+class RateLimitBucket(db.Model):
+    """AI 接口按客户端限流的令牌桶（AI_LIMIT_BACKEND=sqlite 时使用）"""
+    __tablename__ = 'rate_limit_buckets'
+
+    key = db.Column(db.String(100), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)  # Unix 时间戳
+
+
+class UpstreamLease(db.Model):
+    """占用中的 DeepSeek 并发名额，到期自动失效"""
+    __tablename__ = 'upstream_leases'
+
+    id = db.Column(db.String(32), primary_key=True)
+    expires_at = db.Column(db.Float, nullable=False, index=True)  # Unix 时间戳
+
+
+class SearchDocument(db.Model):
+    """全文搜索的文档：原文与过滤列；分词后的文本在 FTS5 表 search_fts 中，rowid 与 id 相同"""
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        db.Index('ix_search_documents_kind_category', 'kind', 'category'),
+        db.Index('ix_search_documents_kind_parent', 'kind', 'parent_id'),
+        db.Index('ix_search_documents_difficulty', 'difficulty_level'),
+        db.Index('ix_search_documents_safety', 'safety_level'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 由 (kind, ref_id) 计算
+    kind = db.Column(db.String(20), nullable=False)  # attraction / explanation / merchant
+    ref_id = db.Column(db.Integer, nullable=False)
+    parent_id = db.Column(db.Integer)  # 讲解词所属景点
+    title = db.Column(db.Text)
+    body = db.Column(db.Text)
+    category = db.Column(db.String(50))
+    difficulty_level = db.Column(db.Integer)
+    safety_level = db.Column(db.String(50))
@@ -0,0 +1,229 @@
+# backend/offline_bundle.py
+"""
+离线包：景点、路线（含途经站点）、已缓存的讲解词、FAQ 和安全规则打成一个响应，
+客户端在有信号时下载保存，进入无信号区域后离线使用。
+- 全量：GET /api/offline/bundle，按版本缓存序列化结果，ETag 即版本号，支持 304；
+- 增量：GET /api/offline/bundle?since=<版本号>，只返回该版本之后新增/修改的行和被删除行的 id。
+被跟踪模型的每次写入会递增 data_versions 中的 bundle 版本号，并在 row_versions 中记下每一行
+最后一次变更的版本号（删除记为墓碑）。版本号形如 "12-3f9a0c1e"：前半是数据版本，后半是安全规则的指纹。
+绕过 ORM 的批量写入（如 bench.dataset）不会留下变更记录。
+"""
+import hashlib
+import os
+import threading
+from collections import defaultdict
+from itertools import chain
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from catalog import RouteRecord
+from extensions import db
+from models import Attraction, Explanation, FaqEntry, Route, RouteStop, RowVersion
+from safety_rules import SAFETY_LEVEL_ORDER, SAFETY_RULES, safety_tips
+from serialization import dumps, make_encoder
+from versioning import bump_version, get_version
+
+BUNDLE = 'bundle'
+
+# 增量中变更的行数超过该值时直接返回全量
+OFFLINE_DELTA_MAX_ROWS = int(os.getenv("OFFLINE_DELTA_MAX_ROWS", 2000))
+# IN 查询每批的 id 数，低于 SQLite 的参数个数上限
+_ID_CHUNK = 500
+
+_SECTIONS = {
+    Attraction: 'attractions',
+    Route: 'routes',
+    Explanation: 'explanations',
+    FaqEntry: 'faq',
+}
+
+_UPSERT = text(
+    'INSERT INTO row_versions (section, row_id, version, deleted) '
+    'VALUES (:section, :row_id, :version, :deleted) '
+    'ON CONFLICT(section, row_id) DO UPDATE SET version = excluded.version, deleted = excluded.deleted'
+)
+
+
+class BundleError(ValueError):
+    """since 参数无效"""
+
+
+# ==================== 变更记录 ====================
+
+def record_changes(connection, changes):
+    """
+    在当前事务中递增 bundle 版本号，并把 changes（{(分区, 行 id): 是否删除}）记为该版本的变更。
+    SQLite 同一时刻只有一个写事务，版本号的先后即提交的先后。
+    """
+    if not changes:
+        return
+    bump_version(connection, BUNDLE)
+    version = connection.execute(
+        text('SELECT version FROM data_versions WHERE name = :name'), {'name': BUNDLE}
+    ).scalar()
+    connection.execute(_UPSERT, [
+        {'section': section, 'row_id': row_id, 'version': version, 'deleted': deleted}
+        for (section, row_id), deleted in changes.items()
+    ])
+
+
+def _tracked(obj):
+    return type(obj) in _SECTIONS or isinstance(obj, RouteStop)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session, flush_context):
+    changes = {}
+    dirty = (o for o in session.dirty if _tracked(o) and session.is_modified(o))
+    for obj in chain(session.new, dirty):
+        section = _SECTIONS.get(type(obj))
+        if section is not None:
+            changes[(section, obj.id)] = False
+        elif isinstance(obj, RouteStop):
+            changes[('routes', obj.route_id)] = False
+    for obj in session.deleted:
+        section = _SECTIONS.get(type(obj))
+        if section is not None:
+            changes[(section, obj.id)] = True
+        elif isinstance(obj, RouteStop):
+            # 站点被删除只是路线变了；路线本身也删除时墓碑优先
+            changes.setdefault(('routes', obj.route_id), False)
+    record_changes(session.connection(), changes)
+
+
+# ==================== 分区内容 ====================
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), _ID_CHUNK):
+        yield ids[i:i + _ID_CHUNK]
+
+
+def _rows(query, column, ids=None):
+    """ids 为 None 时取全部行，否则按 id 分批取"""
+    if ids is None:
+        return query.order_by(column).all()
+    rows = []
+    for chunk in _chunks(ids):
+        rows.extend(query.filter(column.in_(chunk)).order_by(column).all())
+    return rows
+
+
+# 离线时没有接口可调，安全提示直接附在景点上
+_encode_attraction = make_encoder(
+    list(Attraction.__serialize__) + [('safety_tips', safety_tips)],
+    name='encode_bundle_attraction',
+)
+
+
+def _attractions(ids=None):
+    return [_encode_attraction(a) for a in _rows(Attraction.query, Attraction.id, ids)]
+
+
+def _routes(ids=None):
+    stops = defaultdict(list)
+    for route_id, attraction_id in _rows(
+            db.session.query(RouteStop.route_id, RouteStop.attraction_id).order_by(RouteStop.position),
+            RouteStop.route_id, ids):
+        stops[route_id].append(attraction_id)
+    return [RouteRecord(r, stops.get(r.id)).to_dict() for r in _rows(Route.query, Route.id, ids)]
+
+
+def _explanations(ids=None):
+    return [e.to_dict() for e in _rows(Explanation.query, Explanation.id, ids)]
+
+
+def _faq(ids=None):
+    return [f.to_dict() for f in _rows(FaqEntry.query, FaqEntry.id, ids)]
+
+
+_LOADERS = {
+    'attractions': _attractions,
+    'routes': _routes,
+    'explanations': _explanations,
+    'faq': _faq,
+}
+
+SAFETY = {'rules': SAFETY_RULES, 'levels': SAFETY_LEVEL_ORDER}
+# 安全规则写在代码里，随部署变化，用指纹区分
+SAFETY_HASH = hashlib.sha1(dumps(SAFETY, sort_keys=True)).hexdigest()[:8]
+
+
+def _token(version):
+    return f'{version}-{SAFETY_HASH}'
+
+
+def parse_version(value):
+    """解析客户端持有的版本号，返回 (数据版本, 安全规则指纹)"""
+    version, _, rules_hash = (value or '').partition('-')
+    try:
+        version = int(version)
+    except ValueError:
+        raise BundleError(f'无效的版本号: {value}') from None
+    if version < 0:
+        raise BundleError(f'无效的版本号: {value}')
+    return version, rules_hash
+
+
+# ==================== 全量与增量 ====================
+
+_cached = None
+_lock = threading.Lock()
+
+
+def _build_full(version):
+    payload = {'version': _token(version), 'full': True}
+    for section, load in _LOADERS.items():
+        payload[section] = load()
+    payload['safety'] = SAFETY
+    return dumps(payload)
+
+
+def full_bundle():
+    """当前版本的全量离线包 (body, etag)，每个版本只序列化一次"""
+    global _cached
+    # 先读版本号再读数据：期间有写入时数据只会比版本号新，下次增量会重复下发而不会遗漏
+    token = _token(get_version(BUNDLE))
+    cached = _cached
+    if cached is not None and cached[0] == token:
+        return cached[1], token
+    with _lock:
+        cached = _cached
+        if cached is None or cached[0] != token:
+            cached = (token, _build_full(int(token.partition('-')[0])))
+            _cached = cached
+    return cached[1], token
+
+
+def delta_bundle(since):
+    """
+    since 之后的变更，返回 JSON 字节；客户端版本号比服务端新（数据库被重建）或变更太多时返回 None，
+    调用方改为返回全量。
+    """
+    since_version, rules_hash = parse_version(since)
+    version = get_version(BUNDLE)
+    if since_version > version:
+        return None
+    changed = (
+        RowVersion.query.filter(RowVersion.version > since_version)
+        .limit(OFFLINE_DELTA_MAX_ROWS + 1).all()
+    )
+    if len(changed) > OFFLINE_DELTA_MAX_ROWS:
+        return None
+
+    upserts = defaultdict(set)
+    deleted = defaultdict(set)
+    for entry in changed:
+        (deleted if entry.deleted else upserts)[entry.section].add(entry.row_id)
+
+    payload = {'version': _token(version), 'since': since, 'full': False, 'upserts': {}, 'deleted': {}}
+    for section, load in _LOADERS.items():
+        rows = load(upserts[section]) if upserts[section] else []
+        # 有变更记录但已经不存在的行（未经 ORM 删除）也按删除处理
+        missing = upserts[section] - {row['id'] for row in rows}
+        payload['upserts'][section] = rows
+        payload['deleted'][section] = sorted(deleted[section] | missing)
+    if rules_hash != SAFETY_HASH:
+        payload['safety'] = SAFETY
+    return dumps(payload)
@@ -0,0 +1,27 @@
+# backend/query_counter.py
+"""
+调试模式下统计每个请求执行的 SQL 条数，并通过 X-Query-Count 响应头返回。
+钩子总是注册，是否统计在请求时按 current_app.debug 判断（app.run(debug=True) 在工厂函数之后才开启调试）。
+"""
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'query_count' in g:
+        g.query_count += 1
+
+
+def init_app(app):
+    @app.before_request
+    def _start_counting():
+        if current_app.debug:
+            g.query_count = 0
+
+    @app.after_request
+    def _report_count(response):
+        if 'query_count' in g:
+            response.headers['X-Query-Count'] = str(g.query_count)
+        return response
@@ -1,22 +1,76 @@
-from flask import Blueprint, request, jsonify
-from ai_service import generate_explanation, answer_huashan_question
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context, url_for
+from admin_auth import require_admin
+from admission import client_key, limiter, shed_reason
+from ai_executor import AI_RESULT_TIMEOUT, AI_RETRY_AFTER, AiBusy, AiQueueTimeout, GuardedStream, get_job, submit_job
+from ai_executor import executor as ai_executor
+from ai_service import AUDIENCE_TYPES
+from catalog import get_snapshot, snapshot_response
+from checkin_export import EXPORT_FORMATS, ExportError, export_stream, parse_export_args
+from checkin_stats import attraction_stats, crowd_heat
+from checkin_writer import CHECKIN_ACK_MODE, CHECKIN_ACK_TIMEOUT, CHECKIN_RETRY_AFTER, CheckinQueueFull
+from extensions import db
+from explanation_cache import get_explanation, get_explanations, stream_explanation
+from faq_index import answer_question, stream_answer
+from geo_index import GEO_MAX_K, GEO_MAX_RADIUS_M, attraction_index, merchant_index
+from models import Attraction, Explanation, Merchant, Route, User, UserCheckIn
+from merchant_search import SearchError, search_merchants
+from offline_bundle import BundleError, delta_bundle, full_bundle
+from search_index import QueryError, search
+from serialization import FieldError, parse_fields
+from safety_rules import evaluate, route_verdict, safety_tips, user_profile
+from trail_graph import AVOID_RULES, PlanningError, get_graph, plan_itinerary
+from instrumentation import AI_ADMISSION, record_source, render as render_metrics
 import json
+import logging
+from concurrent.futures import TimeoutError as FutureTimeout
 
 api_bp = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
 
-# 延迟导入以避免循环导入
-def get_db_and_models():
-    """延迟导入以避免循环导入"""
-    from app import db
-    from models import User, Attraction, Route, Explanation, Merchant, UserCheckIn
-    return db, User, Attraction, Route, Explanation, Merchant, UserCheckIn
+# 这些来源表示没有拿到 AI 的完整回答（上游失败、过载降级等）
+DEGRADED_SOURCES = frozenset({'stale', 'template', 'local', 'ai_partial'})
+
+def _wants_stream():
+    """客户端是否请求 SSE 流式响应（?stream=1 或 Accept: text/event-stream）"""
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def _sse(event, data):
+    """格式化一条 SSE 事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(meta, events, cache=None):
+    """
+    将 (事件名, 内容) 序列包装成 text/event-stream 响应。
+    先立即发送 meta 事件以缩短首字节时间；客户端断开时关闭上游流。
+    cache 不为空时按 done 事件的来源记录缓存命中指标。
+    """
+    def generate():
+        try:
+            yield _sse('meta', meta)
+            for kind, value in events:
+                if kind == 'delta':
+                    yield _sse('delta', {'text': value})
+                else:
+                    if cache:
+                        record_source(cache, value)
+                    yield _sse('done', {'source': value, 'degraded': value in DEGRADED_SOURCES})
+        finally:
+            events.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
 
 # ==================== 用户相关 API ====================
 
 @api_bp.route('/users', methods=['POST'])
 def create_user():
     """创建用户"""
-    db, User, _, _, _, _, _ = get_db_and_models()
     data = request.get_json()
     existing_user = User.query.filter_by(username=data['username']).first()
     if existing_user:
@@ -35,7 +89,6 @@ def create_user():
 @api_bp.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
     """获取用户信息"""
-    _, User, _, _, _, _, _ = get_db_and_models()
     user = User.query.get(user_id)
     if not user:
         return jsonify({'error': '用户不存在'}), 404
@@ -45,15 +98,68 @@ def get_user(user_id):
 
 @api_bp.route('/attractions', methods=['GET'])
 def get_attractions():
-    """获取所有景点"""
-    _, _, Attraction, _, _, _, _ = get_db_and_models()
-    attractions = Attraction.query.all()
-    return jsonify([attr.to_dict() for attr in attractions])
+    """获取所有景点；?fields=id,name,latitude,longitude 只返回指定字段（地图视图）"""
+    snapshot = get_snapshot()
+    try:
+        fields = parse_fields(request.args.get('fields'), Attraction)
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
+    if fields:
+        return snapshot_response(*snapshot.attractions_subset(fields))
+    return snapshot_response(snapshot.attractions_json, snapshot.attractions_etag)
+
+def _nearby(index, predicate=None, fields=None):
+    """解析 lat/lon/radius(米)/k 参数并查询空间索引；fields 不为空时只返回这些字段"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        radius = float(request.args['radius']) if 'radius' in request.args else None
+        k = int(request.args['k']) if 'k' in request.args else None
+    except (KeyError, ValueError):
+        return jsonify({'error': '请提供有效的 lat、lon 以及 radius 或 k 参数'}), 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({'error': '经纬度超出范围'}), 400
+    if radius is None and k is None:
+        return jsonify({'error': '请提供 radius（米）或 k'}), 400
+    if radius is not None and not 0 < radius <= GEO_MAX_RADIUS_M:
+        return jsonify({'error': f'radius 须在 0 到 {GEO_MAX_RADIUS_M:g} 米之间'}), 400
+    if k is not None and not 0 < k <= GEO_MAX_K:
+        return jsonify({'error': f'k 须在 1 到 {GEO_MAX_K} 之间'}), 400
+
+    if k is not None:
+        found = index.nearest(lat, lon, k, max_radius_m=radius, predicate=predicate)
+    else:
+        found = index.within(lat, lon, radius, predicate=predicate)
+    if fields:
+        return jsonify([dict({f: payload[f] for f in fields}, distance_m=round(d, 1)) for d, payload in found])
+    return jsonify([dict(payload, distance_m=round(d, 1)) for d, payload in found])
+
+@api_bp.route('/attractions/nearby', methods=['GET'])
+def get_nearby_attractions():
+    """附近景点：?lat=&lon=&radius=米 或 &k=数量，按距离排序；支持 ?fields="""
+    try:
+        fields = parse_fields(request.args.get('fields'), Attraction)
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
+    return _nearby(attraction_index.get(), fields=fields)
+
+@api_bp.route('/attractions/heat', methods=['GET'])
+def get_crowd_heat():
+    """全山人流热度：各景点最近 ?hours=N（默认 1）小时的打卡数"""
+    hours = request.args.get('hours', 1, type=int)
+    return jsonify(crowd_heat(get_snapshot().attractions, hours))
+
+@api_bp.route('/attractions/<int:attraction_id>/stats', methods=['GET'])
+def get_attraction_stats(attraction_id):
+    """景点打卡统计：总数、平均评分及最近 ?hours=N（默认 24）小时的逐小时打卡数"""
+    if attraction_id not in get_snapshot().attractions_by_id:
+        return jsonify({'error': '景点不存在'}), 404
+    hours = request.args.get('hours', 24, type=int)
+    return jsonify(attraction_stats(attraction_id, hours))
 
 @api_bp.route('/attractions/<int:attraction_id>', methods=['GET'])
 def get_attraction(attraction_id):
     """获取单个景点详情"""
-    _, _, Attraction, _, Explanation, _, _ = get_db_and_models()
     attraction = Attraction.query.get(attraction_id)
     if not attraction:
         return jsonify({'error': '景点不存在'}), 404
@@ -66,26 +172,26 @@ def get_attraction(attraction_id):
 
 @api_bp.route('/routes', methods=['GET'])
 def get_routes():
-    """获取所有推荐路线"""
-    _, _, _, Route, _, _, _ = get_db_and_models()
-    routes = Route.query.all()
-    return jsonify([route.to_dict() for route in routes])
+    """获取所有推荐路线；?expand=attractions 时附带按顺序展开的景点详情"""
+    snapshot = get_snapshot()
+    if request.args.get('expand') == 'attractions':
+        return snapshot_response(snapshot.routes_expanded_json, snapshot.routes_expanded_etag)
+    return snapshot_response(snapshot.routes_json, snapshot.routes_etag)
 
 @api_bp.route('/routes/recommend', methods=['POST'])
 def recommend_route():
     """根据用户情况推荐路线"""
-    _, _, _, Route, _, _, _ = get_db_and_models()
     data = request.get_json()
     fitness_level = data.get('fitness_level')
     fear_of_heights = data.get('fear_of_heights', False)
     has_medical_condition = data.get('has_medical_condition', False)
     
     if fear_of_heights or has_medical_condition or fitness_level == 'weak':
-        route_name = '西峰索道上下'
+        route_name = '西峰索道上下（轻松路线）'
     elif fitness_level == 'good' and not fear_of_heights:
-        route_name = '西上北下（经典线路）'
+        route_name = '西上北下（经典一日游）'
     else:
-        route_name = '北上西下'
+        route_name = '北上西下（挑战路线）'
     
     route = Route.query.filter_by(name=route_name).first()
     if not route:
@@ -98,136 +204,398 @@ def recommend_route():
         'reason': f'根据您的体力情况（{fitness_level}）和偏好，推荐此路线'
     })
 
+@api_bp.route('/routes/plan', methods=['POST'])
+def plan_route():
+    """在时间预算、必去景点和回避条件下规划耗时最短的行程"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': '请求体必须是 JSON 对象'}), 400
+
+    fear_of_heights = data.get('fear_of_heights', False)
+    has_medical_condition = data.get('has_medical_condition', False)
+    user_id = data.get('user_id')
+    if user_id:
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': '用户不存在'}), 404
+        fear_of_heights = fear_of_heights or user.fear_of_heights
+        has_medical_condition = has_medical_condition or user.has_medical_condition
+    avoid = data.get('avoid', [])
+    if not isinstance(avoid, list) or not all(isinstance(a, str) for a in avoid):
+        return jsonify({'error': 'avoid 必须是字符串列表'}), 400
+    avoid = set(avoid)
+    if fear_of_heights:
+        avoid.add('fear_of_heights')
+    if has_medical_condition:
+        avoid.add('medical_condition')
+    unknown = avoid - set(AVOID_RULES)
+    if unknown:
+        return jsonify({'error': f'未知的回避条件: {sorted(unknown)}'}), 400
+
+    try:
+        plan = plan_itinerary(
+            get_graph(),
+            start_id=data.get('start_id'),
+            must_see=data.get('must_see', []),
+            end_id=data.get('end_id'),
+            time_budget=data.get('time_budget'),
+            avoid=frozenset(avoid),
+            fill=data.get('fill', False),
+        )
+    except PlanningError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(plan)
+
 @api_bp.route('/routes/<int:route_id>', methods=['GET'])
 def get_route(route_id):
     """获取单个路线详情"""
-    _, _, Attraction, Route, _, _, _ = get_db_and_models()
-    route = Route.query.get(route_id)
-    if not route:
+    detail = get_snapshot().route_details.get(route_id)
+    if detail is None:
         return jsonify({'error': '路线不存在'}), 404
-    result = route.to_dict()
-    attraction_ids = result['attractions']
-    attractions = []
-    for attr_id in attraction_ids:
-        attr = Attraction.query.get(attr_id)
-        if attr:
-            attractions.append(attr.to_dict())
-    result['attraction_details'] = attractions
-    return jsonify(result)
+    body, etag = detail
+    return snapshot_response(body, etag)
 
 # ==================== AI 讲解 API ====================
 
+def _wants_job():
+    """客户端是否选择 job 模式（?mode=job 或 Prefer: respond-async）"""
+    return request.args.get('mode') == 'job' or 'respond-async' in request.headers.get('Prefer', '')
+
+
+def _ai_unavailable(message):
+    resp = jsonify({'error': message})
+    resp.headers['Retry-After'] = str(AI_RETRY_AFTER)
+    return resp, 503
+
+
+def _rate_limited(cost=1, user_id=None):
+    """按客户端限流，超出时返回 429 响应，否则返回 None"""
+    allowed, retry_after = limiter.take(client_key(user_id), cost)
+    if allowed:
+        return None
+    AI_ADMISSION.inc(outcome='rate_limited')
+    resp = jsonify({'error': '请求过于频繁，请稍后重试', 'retry_after': retry_after})
+    resp.headers['Retry-After'] = str(retry_after)
+    return resp, 429
+
+
+def _shed(reason):
+    """记录一次过载降级；降级回答在请求线程内直接由缓存/本地兜底生成，不调用 DeepSeek"""
+    AI_ADMISSION.inc(outcome='shed', reason=reason)
+    logger.info("AI 接口过载，降级为本地回答", extra={'reason': reason})
+
+
+def _run_ai(kind, params, fn, *args):
+    """
+    在 AI 线程池中执行 fn(*args)，返回其结果（dict）的 JSON。
+    job 模式下立即返回 202 和任务信息，线程池已满时返回 503；
+    同步模式下过载、线程池已满、排队超时或 AI_RESULT_TIMEOUT 内没有结果时，
+    改为 fn(*args, offline=True) 的降级结果（超时的任务继续执行，结果写入缓存）。
+    """
+    if _wants_job():
+        try:
+            job = submit_job(kind, params, fn, *args)
+        except AiBusy as e:
+            return _ai_unavailable(str(e))
+        AI_ADMISSION.inc(outcome='admitted')
+        resp = jsonify(job.to_dict())
+        resp.headers['Location'] = url_for('api.get_ai_job', job_id=job.id)
+        return resp, 202
+
+    reason = shed_reason()
+    if reason is None:
+        try:
+            future = ai_executor.submit(fn, *args)
+            AI_ADMISSION.inc(outcome='admitted')
+            return jsonify(future.result(timeout=AI_RESULT_TIMEOUT))
+        except AiBusy:
+            reason = 'busy'
+        except AiQueueTimeout:
+            reason = 'queue_timeout'
+        except FutureTimeout:
+            reason = 'timeout'
+    _shed(reason)
+    return jsonify(fn(*args, offline=True))
+
+
+def _ai_stream(meta, events, fallback, cache=None):
+    """
+    占用 AI 名额的 SSE 响应；过载或名额已满时关闭 events，
+    改为把 fallback()（降级的 (文本, 来源)）作为一段输出
+    """
+    reason = shed_reason()
+    if reason is None:
+        try:
+            guarded = GuardedStream(events)
+        except AiBusy:
+            reason = 'busy'
+        else:
+            AI_ADMISSION.inc(outcome='admitted')
+            return _sse_response(meta, guarded, cache)
+    events.close()
+    _shed(reason)
+    text, source = fallback()
+
+    def degraded():
+        yield 'delta', text
+        yield 'done', source
+
+    return _sse_response(meta, degraded(), cache)
+
+
+def _explain(attraction, audience_type, offline=False):
+    explanation, source = get_explanation(attraction, audience_type, offline)
+    record_source('explanation', source)
+    logger.info("讲解词生成完成", extra={'attraction_id': attraction.id, 'chars': len(explanation), 'source': source})
+    return {
+        'attraction_id': attraction.id,
+        'attraction_name': attraction.name,
+        'audience_type': audience_type,
+        'explanation': explanation,
+        'source': source,
+        'degraded': source in DEGRADED_SOURCES,
+    }
+
+
 @api_bp.route('/ai/explain/<int:attraction_id>', methods=['POST'])
 def get_ai_explanation(attraction_id):
     """获取 AI 生成的景点讲解"""
-    print(f"📌 收到景点讲解请求: attraction_id={attraction_id}")
-    _, _, Attraction, _, _, _, _ = get_db_and_models()
-    attraction = Attraction.query.get(attraction_id)
+    attraction = get_snapshot().attractions_by_id.get(attraction_id)
     if not attraction:
-        print(f"❌ 景点 {attraction_id} 不存在")
         return jsonify({'error': '景点不存在'}), 404
     
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     audience_type = data.get('audience_type', 'all')
-    print(f"📝 生成讲解词: {attraction.name}, audience={audience_type}")
-    
-    explanation = generate_explanation(
-        attraction_name=attraction.name,
-        description=attraction.description,
-        category=attraction.category,
-        audience_type=audience_type
-    )
-    
-    print(f"✅ 讲解词生成完成，长度: {len(explanation)}")
-    return jsonify({
-        'attraction_id': attraction_id,
-        'attraction_name': attraction.name,
-        'audience_type': audience_type,
-        'explanation': explanation
-    })
+    logger.debug("收到景点讲解请求", extra={'attraction_id': attraction_id, 'audience_type': audience_type})
+    limited = _rate_limited(user_id=data.get('user_id'))
+    if limited:
+        return limited
+
+    if _wants_stream():
+        return _ai_stream({
+            'attraction_id': attraction_id,
+            'attraction_name': attraction.name,
+            'audience_type': audience_type,
+        }, stream_explanation(attraction, audience_type),
+            lambda: get_explanation(attraction, audience_type, offline=True), cache='explanation')
+
+    return _run_ai('explain', {'attraction_id': attraction_id, 'audience_type': audience_type},
+                   _explain, attraction, audience_type)
+
+
+def _explain_batch(attractions, audience_types, offline=False):
+    results = get_explanations(attractions, audience_types, offline)
+    for _, source in results.values():
+        record_source('explanation', source)
+    return {
+        'degraded': any(source in DEGRADED_SOURCES for _, source in results.values()),
+        'results': [
+            {
+                'attraction_id': attraction_id,
+                'audience_type': audience_type,
+                'explanation': text,
+                'source': source,
+            }
+            for (attraction_id, audience_type), (text, source) in results.items()
+        ]
+    }
+
+
+@api_bp.route('/ai/explain/batch', methods=['POST'])
+def get_ai_explanations_batch():
+    """批量获取多个景点、多类人群的 AI 讲解"""
+    data = request.get_json(silent=True) or {}
+    attraction_ids = data.get('attraction_ids') or []
+    audience_types = data.get('audience_types') or list(AUDIENCE_TYPES)
+    if not attraction_ids:
+        return jsonify({'error': '请提供 attraction_ids'}), 400
+
+    by_id = get_snapshot().attractions_by_id
+    missing = [i for i in attraction_ids if i not in by_id]
+    if missing:
+        return jsonify({'error': '景点不存在', 'attraction_ids': missing}), 404
+    attractions = [by_id[i] for i in dict.fromkeys(attraction_ids)]
+    # 每个景点计一次请求
+    limited = _rate_limited(len(attractions), data.get('user_id'))
+    if limited:
+        return limited
+
+    return _run_ai('explain_batch', {'attraction_ids': attraction_ids, 'audience_types': audience_types},
+                   _explain_batch, attractions, audience_types)
+
+
+def _answer(question, offline=False):
+    answer, source = answer_question(question, offline)
+    record_source('faq', source)
+    logger.info("回答生成完成", extra={'chars': len(answer), 'source': source})
+    return {
+        'question': question,
+        'answer': answer,
+        'source': source,
+        'degraded': source in DEGRADED_SOURCES,
+    }
+
 
 @api_bp.route('/ai/ask', methods=['POST'])
 def ask_huashan():
     """AI 智能问答"""
-    print(f"📌 收到 AI 问答请求")
-    data = request.get_json()
-    question = data.get('question', '')
-    print(f"❓ 用户问题: {question}")
-    
-    if not question:
-        print(f"❌ 问题为空")
+    data = request.get_json(silent=True) or {}
+    question = data.get('question') if isinstance(data, dict) else None
+    if not isinstance(question, str) or not question.strip():
         return jsonify({'error': '问题不能为空'}), 400
-    
-    print(f"🤖 调用 AI 服务生成回答...")
-    answer = answer_huashan_question(question)
-    print(f"✅ 回答生成完成，长度: {len(answer)}")
-    
-    return jsonify({
-        'question': question,
-        'answer': answer
-    })
+    question = question.strip()
+    logger.debug("收到 AI 问答请求", extra={'question': question[:100]})
+
+    limited = _rate_limited(user_id=data.get('user_id'))
+    if limited:
+        return limited
+
+    if _wants_stream():
+        return _ai_stream({'question': question}, stream_answer(question),
+                          lambda: answer_question(question, offline=True), cache='faq')
+
+    return _run_ai('ask', {'question': question}, _answer, question)
+
+
+@api_bp.route('/ai/jobs/<job_id>', methods=['GET'])
+def get_ai_job(job_id):
+    """查询 job 模式 AI 任务的状态和结果"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    return jsonify(job.to_dict())
 
 # ==================== 商家信息 API ====================
 
 @api_bp.route('/merchants', methods=['GET'])
 def get_merchants():
-    """获取商家列表"""
-    _, _, _, _, _, Merchant, _ = get_db_and_models()
+    """
+    获取商家列表。
+    不带分页参数时返回全部商家（与旧版一致）；带 limit/cursor/sort/order/fields 任一参数时
+    返回 {items, next_cursor, limit, total_estimate}，按游标分页。
+    """
     category = request.args.get('category')
-    query = Merchant.query
-    if category:
-        query = query.filter_by(category=category)
-    merchants = query.all()
-    return jsonify([m.to_dict() for m in merchants])
+    paging_params = ('limit', 'cursor', 'sort', 'order', 'fields')
+    if not any(p in request.args for p in paging_params):
+        query = Merchant.query
+        if category:
+            query = query.filter_by(category=category)
+        merchants = query.all()
+        return jsonify([m.to_dict() for m in merchants])
+
+    try:
+        fields = parse_fields(request.args.get('fields'), Merchant)
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        result = search_merchants(
+            category=category,
+            sort=request.args.get('sort', 'rating'),
+            order=request.args.get('order'),
+            limit=request.args.get('limit'),
+            cursor=request.args.get('cursor'),
+            fields=fields,
+        )
+    except SearchError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+@api_bp.route('/merchants/nearby', methods=['GET'])
+def get_nearby_merchants():
+    """附近商家：?lat=&lon=&radius=米 或 &k=数量，可选 category，按距离排序"""
+    category = request.args.get('category')
+    predicate = (lambda m: m['category'] == category) if category else None
+    return _nearby(merchant_index.get(), predicate)
 
 # ==================== 用户打卡 API ====================
 
 @api_bp.route('/checkin', methods=['POST'])
 def create_checkin():
-    """用户打卡"""
-    db, _, _, _, _, _, UserCheckIn = get_db_and_models()
-    data = request.get_json()
-    checkin = UserCheckIn(
-        user_id=data.get('user_id'),
-        attraction_id=data.get('attraction_id'),
-        notes=data.get('notes', ''),
-        rating=data.get('rating')
-    )
-    db.session.add(checkin)
-    db.session.commit()
-    return jsonify(checkin.to_dict()), 201
+    """用户打卡：校验后交给批量写入队列"""
+    data = request.get_json(silent=True) or {}
+    try:
+        attraction_id = int(data.get('attraction_id'))
+        user_id = data.get('user_id')
+        user_id = int(user_id) if user_id is not None else None
+        rating = data.get('rating')
+        rating = int(rating) if rating is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'user_id、attraction_id、rating 必须是整数'}), 400
+    if attraction_id not in get_snapshot().attractions_by_id:
+        return jsonify({'error': '景点不存在'}), 404
+    if rating is not None and not 1 <= rating <= 5:
+        return jsonify({'error': 'rating 取值为 1-5'}), 400
+
+    writer = current_app.extensions['checkin_writer']
+    try:
+        pending = writer.submit(user_id, attraction_id, data.get('notes', ''), rating)
+    except CheckinQueueFull as e:
+        resp = jsonify({'error': str(e)})
+        resp.headers['Retry-After'] = str(CHECKIN_RETRY_AFTER)
+        return resp, 503
+
+    if CHECKIN_ACK_MODE == 'enqueue' or not pending.wait(CHECKIN_ACK_TIMEOUT):
+        return jsonify(pending.to_dict()), 202
+    if pending.error is not None:
+        resp = jsonify({'error': '打卡写入失败，请稍后重试'})
+        resp.headers['Retry-After'] = str(CHECKIN_RETRY_AFTER)
+        return resp, 503
+    return jsonify(pending.to_dict()), 201
 
 @api_bp.route('/checkins/<int:user_id>', methods=['GET'])
 def get_user_checkins(user_id):
     """获取用户的打卡记录"""
-    _, _, _, _, _, _, UserCheckIn = get_db_and_models()
     checkins = UserCheckIn.query.filter_by(user_id=user_id).all()
     return jsonify([c.to_dict() for c in checkins])
 
+def _export_response(user_id=None):
+    try:
+        args = parse_export_args(request.args)
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    fmt = args.pop('fmt')
+    name = f'checkins-{user_id}' if user_id is not None else 'checkins'
+    return Response(
+        stream_with_context(export_stream(fmt, user_id=user_id, **args)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename={name}.{fmt}',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+@api_bp.route('/checkins/export', methods=['GET'])
+@require_admin
+def export_checkins():
+    """
+    流式导出全部打卡（需管理员令牌）：?format=ndjson|csv&since=&until=（ISO 时间）&cursor=上次收到的最后一条 id
+    """
+    return _export_response()
+
+@api_bp.route('/checkins/<int:user_id>/export', methods=['GET'])
+@require_admin
+def export_user_checkins(user_id):
+    """流式导出某个用户的打卡（需管理员令牌），参数同 /checkins/export"""
+    return _export_response(user_id)
+
 # ==================== 安全检查 API ====================
 
 @api_bp.route('/safety-check', methods=['POST'])
 def safety_check():
     """对于危险景点的安全检查"""
-    _, User, Attraction, _, _, _, _ = get_db_and_models()
     data = request.get_json()
     attraction_id = data.get('attraction_id')
     user_id = data.get('user_id')
     
-    attraction = Attraction.query.get(attraction_id)
-    user = User.query.get(user_id) if user_id else None
-    
+    try:
+        attraction = get_snapshot().attractions_by_id.get(int(attraction_id))
+    except (TypeError, ValueError):
+        attraction = None
     if not attraction:
         return jsonify({'error': '景点不存在'}), 404
+    user = User.query.get(user_id) if user_id else None
     
-    warnings = []
-    if user:
-        if user.fear_of_heights and attraction.difficulty_level >= 3:
-            warnings.append('您可能恐高，该路段较为陡峭，请谨慎')
-        if user.has_medical_condition and attraction.safety_level in ['高危', '极端危险']:
-            warnings.append('您有心脏病/高血压等疾病，建议避免此危险路段')
-        if user.fitness_level == 'weak' and attraction.estimated_time > 100:
-            warnings.append('该路段较长且陡峭，您的体力可能不足，请评估')
+    warnings = evaluate(user_profile(user), [attraction])[0]
     
     return jsonify({
         'attraction_id': attraction_id,
@@ -235,13 +603,122 @@ def safety_check():
         'safety_level': attraction.safety_level,
         'warnings': warnings,
         'can_proceed': len(warnings) == 0,
-        'tips': attraction.tips or f'{attraction.name} 的安全提示：需要注意脚下，手脚并用。'
+        'tips': safety_tips(attraction)
     })
 
+@api_bp.route('/safety-check/batch', methods=['POST'])
+def safety_check_batch():
+    """批量安全检查：一次评估多个景点或整条路线"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': '请求体必须是 JSON 对象'}), 400
+    snapshot = get_snapshot()
+
+    route_id = data.get('route_id')
+    attraction_ids = data.get('attraction_ids') or []
+    if not isinstance(attraction_ids, list):
+        return jsonify({'error': 'attraction_ids 必须是整数列表'}), 400
+    try:
+        route_id = int(route_id) if route_id is not None else None
+        attraction_ids = [int(i) for i in attraction_ids]
+        user_id = data.get('user_id')
+        user_id = int(user_id) if user_id is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'route_id、user_id 和 attraction_ids 中的景点 id 必须是整数'}), 400
+    if data.get('profile') is not None and not isinstance(data['profile'], dict):
+        return jsonify({'error': 'profile 必须是 JSON 对象'}), 400
+
+    if route_id is not None:
+        route = snapshot.routes_by_id.get(route_id)
+        if not route:
+            return jsonify({'error': '路线不存在'}), 404
+        attraction_ids = list(route.attractions)
+    if not attraction_ids:
+        return jsonify({'error': '请提供 attraction_ids 或 route_id'}), 400
+    missing = [i for i in attraction_ids if i not in snapshot.attractions_by_id]
+    if missing:
+        return jsonify({'error': '景点不存在', 'attraction_ids': missing}), 404
+
+    user = None
+    if user_id:
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': '用户不存在'}), 404
+    profile = user_profile(user, data.get('profile'))
+
+    attractions = [snapshot.attractions_by_id[i] for i in attraction_ids]
+    warnings = evaluate(profile, attractions)
+    return jsonify({
+        'route_id': route_id,
+        'results': [
+            {
+                'attraction_id': a.id,
+                'attraction_name': a.name,
+                'safety_level': a.safety_level,
+                'warnings': w,
+                'can_proceed': len(w) == 0,
+                'tips': safety_tips(a),
+            }
+            for a, w in zip(attractions, warnings)
+        ],
+        'verdict': route_verdict(attractions, warnings),
+    })
+
+# ==================== 离线包 API ====================
+
+@api_bp.route('/offline/bundle', methods=['GET'])
+def get_offline_bundle():
+    """
+    离线包：景点、路线、讲解词、FAQ 和安全规则。
+    ?since=<上次拿到的 version> 只返回之后的变更；无法增量时返回全量（full 为 true）
+    """
+    since = request.args.get('since')
+    if since:
+        try:
+            body = delta_bundle(since)
+        except BundleError as e:
+            return jsonify({'error': str(e)}), 400
+        if body is not None:
+            resp = Response(body, mimetype='application/json')
+            resp.headers['Cache-Control'] = 'no-cache'
+            return resp
+    return snapshot_response(*full_bundle())
+
+# ==================== 全文搜索 API ====================
+
+@api_bp.route('/search', methods=['GET'])
+def search_all():
+    """
+    搜索景点、讲解词和商家：?q=关键词，可选 type（attraction/explanation/merchant，逗号分隔）、
+    category、difficulty_level、safety_level、limit、offset；按相关度排序，返回高亮的标题和摘要
+    """
+    args = request.args
+    try:
+        result = search(
+            q=args.get('q'),
+            types=args.get('type'),
+            category=args.get('category'),
+            difficulty_level=args.get('difficulty_level'),
+            safety_level=args.get('safety_level'),
+            limit=args.get('limit'),
+            offset=args.get('offset'),
+        )
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     """健康检查端点"""
     return jsonify({
         'status': 'ok',
-        'message': '后端服务运行正常'
-    }), 200
\ No newline at end of file
+        'message': '后端服务运行正常',
+        'startup_ms': current_app.extensions.get('startup_timings'),
+    }), 200
+
+
+@api_bp.route('/metrics', methods=['GET'])
+@require_admin
+def metrics():
+    """Prometheus 文本格式的运行指标（需管理员令牌）"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
\ No newline at end of file
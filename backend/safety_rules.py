@@ -0,0 +1,114 @@
+# backend/safety_rules.py
+"""
+声明式安全规则与批量评估引擎。
+每条规则由"游客条件"和"景点条件"组成；评估时先筛出对该游客生效的规则，
+再对景点的各字段数组逐条规则整体比较，一次得到所有景点的警告。
+新增规则只需在 SAFETY_RULES 中追加一项，无需修改接口代码。
+"""
+import operator
+
+OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+    'in': lambda value, options: value in options,
+}
+
+# user: (游客属性, 运算符, 值)；attraction: (景点字段, 运算符, 值)
+SAFETY_RULES = [
+    {
+        'id': 'fear_of_heights_steep',
+        'user': ('fear_of_heights', '==', True),
+        'attraction': ('difficulty_level', '>=', 3),
+        'message': '您可能恐高，该路段较为陡峭，请谨慎',
+    },
+    {
+        'id': 'medical_condition_high_risk',
+        'user': ('has_medical_condition', '==', True),
+        'attraction': ('safety_level', 'in', ('高危', '极端危险')),
+        'message': '您有心脏病/高血压等疾病，建议避免此危险路段',
+    },
+    {
+        'id': 'weak_fitness_long_section',
+        'user': ('fitness_level', '==', 'weak'),
+        'attraction': ('estimated_time', '>', 100),
+        'message': '该路段较长且陡峭，您的体力可能不足，请评估',
+    },
+]
+
+# 安全等级由低到高，用于给出整条路线的最高风险
+SAFETY_LEVEL_ORDER = ('安全', '较安全', '中等', '高危', '极端危险')
+
+
+def _test(op, value, expected):
+    if value is None:
+        return False
+    try:
+        return bool(OPS[op](value, expected))
+    except TypeError:
+        return False
+
+
+def active_rules(profile, rules=None):
+    """筛出对该游客生效的规则；profile 为 None（未知游客）时没有规则生效"""
+    if profile is None:
+        return []
+    rules = SAFETY_RULES if rules is None else rules
+    return [r for r in rules if _test(r['user'][1], profile.get(r['user'][0]), r['user'][2])]
+
+
+def evaluate(profile, attractions, rules=None):
+    """
+    批量评估：返回与 attractions 一一对应的警告列表。
+    attractions 可以是 ORM 对象或目录快照记录，只要有规则用到的字段即可。
+    """
+    rules = active_rules(profile, rules)
+    warnings = [[] for _ in attractions]
+    if not rules:
+        return warnings
+
+    columns = {}
+    for rule in rules:
+        field = rule['attraction'][0]
+        if field not in columns:
+            columns[field] = [getattr(a, field) for a in attractions]
+
+    for rule in rules:
+        field, op, expected = rule['attraction']
+        mask = [_test(op, value, expected) for value in columns[field]]
+        message = rule['message']
+        for i, hit in enumerate(mask):
+            if hit:
+                warnings[i].append(message)
+    return warnings
+
+
+def user_profile(user=None, data=None):
+    """由用户记录和/或请求参数组成游客画像，请求参数优先"""
+    if user is None and not data:
+        return None
+    profile = user.to_dict() if user is not None else {}
+    for key in ('fitness_level', 'fear_of_heights', 'has_medical_condition', 'age_group'):
+        if data and key in data:
+            profile[key] = data[key]
+    return profile
+
+
+def safety_tips(attraction):
+    return attraction.tips or f'{attraction.name} 的安全提示：需要注意脚下，手脚并用。'
+
+
+def route_verdict(attractions, warnings):
+    """整条路线的结论"""
+    levels = [a.safety_level for a in attractions if a.safety_level in SAFETY_LEVEL_ORDER]
+    flagged = [a.id for a, w in zip(attractions, warnings) if w]
+    return {
+        'can_proceed': not flagged,
+        'flagged_attraction_ids': flagged,
+        'warning_count': sum(len(w) for w in warnings),
+        'highest_safety_level': max(levels, key=SAFETY_LEVEL_ORDER.index) if levels else None,
+        'total_estimated_time': sum(a.estimated_time or 0 for a in attractions),
+    }
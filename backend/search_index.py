@@ -0,0 +1,413 @@
+# backend/search_index.py
+"""
+全文搜索：景点、讲解词和商家写入 search_documents（原文与过滤列）和 FTS5 表 search_fts。
+中文没有空格分词，写入 FTS 前把连续的汉字切成相邻两字一组（bigram），字母数字按词，
+再由 unicode61 分词器按空格切分；查询按同样方式切分后作为短语匹配，效果等同子串匹配。
+结果按 bm25 排序（标题权重更高），摘要和高亮在 Python 中基于原文生成。
+通过 Session 的 after_flush 事件与模型同步。单字查询或 SQLite 未编译 FTS5 时退回 LIKE。
+"""
+import logging
+import os
+import re
+import unicodedata
+from itertools import chain
+
+from markupsafe import escape
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Attraction, Explanation, Merchant
+from storage import register_query
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DEFAULT_LIMIT = int(os.getenv("SEARCH_DEFAULT_LIMIT", 20))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", 50))
+# 最多翻到的结果位置，避免深分页反复计算排序
+SEARCH_MAX_OFFSET = int(os.getenv("SEARCH_MAX_OFFSET", 1000))
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", 80))
+# bm25 中标题列相对正文列的权重
+SEARCH_TITLE_WEIGHT = float(os.getenv("SEARCH_TITLE_WEIGHT", 5.0))
+
+KINDS = ('attraction', 'explanation', 'merchant')
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS, 1)}
+_BATCH = 1000
+
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_CJK_RE = re.compile(f'[{_CJK}]')
+# 连续的汉字串，或不含汉字的字母数字串
+_TOKEN_RE = re.compile(f'[{_CJK}]+|(?:(?![{_CJK}])[^\\W_])+')
+
+
+class QueryError(ValueError):
+    """搜索参数无效"""
+
+
+# ==================== 分词 ====================
+
+def _normalize(value):
+    return unicodedata.normalize('NFKC', value or '').lower()
+
+
+def _runs(value):
+    """切出连续的汉字串和字母数字串，返回 [(串, 是否汉字)]"""
+    return [(run, bool(_CJK_RE.match(run))) for run in _TOKEN_RE.findall(_normalize(value))]
+
+
+def segment(value):
+    """写入 FTS 的文本：汉字串切成 bigram（单字保留），字母数字串原样，以空格分隔"""
+    tokens = []
+    for run, cjk in _runs(value):
+        if cjk and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return ' '.join(tokens)
+
+
+def match_expression(runs):
+    """
+    由查询串生成 FTS5 MATCH 表达式：每个汉字串是 bigram 组成的短语，字母数字串做前缀匹配，之间为 AND。
+    含单个汉字时 bigram 无法表达，返回 None。
+    """
+    parts = []
+    for run, cjk in runs:
+        if cjk:
+            if len(run) < 2:
+                return None
+            parts.append('"{}"'.format(' '.join(run[i:i + 2] for i in range(len(run) - 1))))
+        else:
+            parts.append(f'"{run}"*')
+    return ' AND '.join(parts)
+
+
+# ==================== 文档 ====================
+
+def doc_id(kind, ref_id):
+    return ref_id * 4 + _KIND_CODES[kind]
+
+
+def _join(*values):
+    return '\n'.join(v for v in values if v)
+
+
+def _attraction_doc(a):
+    return {
+        'id': doc_id('attraction', a.id), 'kind': 'attraction', 'ref_id': a.id, 'parent_id': a.id,
+        'title': a.name, 'body': _join(a.description, a.tips), 'category': a.category,
+        'difficulty_level': a.difficulty_level, 'safety_level': a.safety_level,
+    }
+
+
+def _explanation_doc(e, attraction):
+    """讲解词以所属景点名为标题，并继承景点的过滤列"""
+    return {
+        'id': doc_id('explanation', e.id), 'kind': 'explanation', 'ref_id': e.id, 'parent_id': e.attraction_id,
+        'title': attraction.name if attraction else None, 'body': e.text_content,
+        'category': attraction.category if attraction else None,
+        'difficulty_level': attraction.difficulty_level if attraction else None,
+        'safety_level': attraction.safety_level if attraction else None,
+    }
+
+
+def _merchant_doc(m):
+    return {
+        'id': doc_id('merchant', m.id), 'kind': 'merchant', 'ref_id': m.id, 'parent_id': None,
+        'title': m.name, 'body': _join(m.category, m.location), 'category': m.category,
+        'difficulty_level': None, 'safety_level': None,
+    }
+
+
+_UPSERT_DOC = text(
+    'INSERT OR REPLACE INTO search_documents '
+    '(id, kind, ref_id, parent_id, title, body, category, difficulty_level, safety_level) '
+    'VALUES (:id, :kind, :ref_id, :parent_id, :title, :body, :category, :difficulty_level, :safety_level)'
+)
+_DELETE_DOC = text('DELETE FROM search_documents WHERE id = :id')
+_DELETE_FTS = text('DELETE FROM search_fts WHERE rowid = :id')
+_INSERT_FTS = text('INSERT INTO search_fts (rowid, title, body) VALUES (:id, :title, :body)')
+_ATTRACTION_FILTERS = text(
+    "UPDATE search_documents SET category = :category, difficulty_level = :difficulty_level, "
+    "safety_level = :safety_level WHERE kind = 'explanation' AND parent_id = :parent_id"
+)
+
+_DOC_MODELS = {Attraction: 'attraction', Explanation: 'explanation', Merchant: 'merchant'}
+_tables = None
+
+
+def _existing_tables(conn):
+    """search_documents / search_fts 是否存在；建好之后才缓存"""
+    global _tables
+    if _tables is not None:
+        return _tables
+    names = {name for (name,) in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE name IN ('search_documents', 'search_fts')"
+    ))}
+    tables = {'documents': 'search_documents' in names, 'fts': 'search_fts' in names}
+    if tables['documents']:
+        _tables = tables
+    return tables
+
+
+def _write(conn, docs, fts):
+    if not docs:
+        return
+    conn.execute(_UPSERT_DOC, docs)
+    if fts:
+        conn.execute(_DELETE_FTS, [{'id': d['id']} for d in docs])
+        conn.execute(_INSERT_FTS, [
+            {'id': d['id'], 'title': segment(d['title']), 'body': segment(d['body'])} for d in docs
+        ])
+
+
+def remove_documents(conn, kind, ref_ids):
+    """删除文档；供绕过 ORM 的删除（如讲解词缓存失效）调用"""
+    ids = [{'id': doc_id(kind, ref_id)} for ref_id in ref_ids]
+    tables = _existing_tables(conn)
+    if not ids or not tables['documents']:
+        return
+    conn.execute(_DELETE_DOC, ids)
+    if tables['fts']:
+        conn.execute(_DELETE_FTS, ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_documents(session, flush_context):
+    changed = [o for o in chain(session.new, session.dirty)
+               if type(o) in _DOC_MODELS and (o in session.new or session.is_modified(o))]
+    deleted = [o for o in session.deleted if type(o) in _DOC_MODELS]
+    if not changed and not deleted:
+        return
+    conn = session.connection()
+    tables = _existing_tables(conn)
+    if not tables['documents']:
+        return
+
+    docs = []
+    for obj in changed:
+        if isinstance(obj, Attraction):
+            docs.append(_attraction_doc(obj))
+            conn.execute(_ATTRACTION_FILTERS, {
+                'category': obj.category, 'difficulty_level': obj.difficulty_level,
+                'safety_level': obj.safety_level, 'parent_id': obj.id,
+            })
+        elif isinstance(obj, Merchant):
+            docs.append(_merchant_doc(obj))
+        else:
+            attraction = conn.execute(
+                text('SELECT name, category, difficulty_level, safety_level FROM attractions WHERE id = :id'),
+                {'id': obj.attraction_id},
+            ).first()
+            docs.append(_explanation_doc(obj, attraction))
+    _write(conn, docs, tables['fts'])
+    for obj in deleted:
+        remove_documents(conn, _DOC_MODELS[type(obj)], [obj.id])
+
+
+def create_tables(conn):
+    """建立 FTS5 表；SQLite 未编译 FTS5 时只记录警告，搜索退回 LIKE"""
+    global _tables
+    _tables = None
+    try:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(title, body, tokenize='unicode61')"
+        ))
+    except OperationalError as e:
+        logger.warning("SQLite 不支持 FTS5，搜索使用 LIKE 查询", extra={'error': str(e.orig)})
+
+
+def rebuild(conn):
+    """由景点、讲解词、商家表重建全部文档，返回文档数"""
+    global _tables
+    _tables = None
+    tables = _existing_tables(conn)
+    conn.execute(text('DELETE FROM search_documents'))
+    if tables['fts']:
+        conn.execute(text('DELETE FROM search_fts'))
+    sources = (
+        ('SELECT id, name, description, tips, category, difficulty_level, safety_level FROM attractions',
+         _attraction_doc),
+        ('SELECT e.id, e.attraction_id, e.text_content, a.name, a.category, a.difficulty_level, a.safety_level '
+         'FROM explanations e LEFT JOIN attractions a ON a.id = e.attraction_id',
+         lambda row: _explanation_doc(row, row if row.name is not None else None)),
+        ('SELECT id, name, category, location FROM merchants', _merchant_doc),
+    )
+    total = 0
+    for sql, build in sources:
+        result = conn.execute(text(sql))
+        while True:
+            rows = result.fetchmany(_BATCH)
+            if not rows:
+                break
+            _write(conn, [build(row) for row in rows], tables['fts'])
+            total += len(rows)
+    return total
+
+
+# ==================== 查询 ====================
+
+def _spans(lowered, terms):
+    spans = []
+    for term in terms:
+        start = lowered.find(term)
+        while start != -1:
+            spans.append((start, start + len(term)))
+            start = lowered.find(term, start + len(term))
+    spans.sort()
+    merged = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def highlight(value, terms, width=None):
+    """转义 HTML 并用 <mark> 标出命中的词；width 不为空时截取第一个命中附近的片段"""
+    value = value or ''
+    lowered = value.lower()
+    if len(lowered) != len(value):
+        lowered = value
+    spans = _spans(lowered, terms)
+    start, end = 0, len(value)
+    if width and len(value) > width:
+        first = spans[0][0] if spans else 0
+        start = max(0, min(first - width // 4, len(value) - width))
+        end = start + width
+    out = ['…'] if start > 0 else []
+    pos = start
+    for s, e in spans:
+        if e <= start or s >= end:
+            continue
+        s, e = max(s, start), min(e, end)
+        out.append(str(escape(value[pos:s])))
+        out.append(f'<mark>{escape(value[s:e])}</mark>')
+        pos = e
+    out.append(str(escape(value[pos:end])))
+    if end < len(value):
+        out.append('…')
+    return ''.join(out)
+
+
+def _csv(value):
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+
+def _bounded_int(value, default, low, high, name):
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise QueryError(f'{name} 必须是整数') from None
+    if not low <= number <= high:
+        raise QueryError(f'{name} 须在 {low} 到 {high} 之间')
+    return number
+
+
+def _in_clause(column, values, prefix, params):
+    names = []
+    for i, value in enumerate(values):
+        params[f'{prefix}{i}'] = value
+        names.append(f':{prefix}{i}')
+    return f"{column} IN ({', '.join(names)})"
+
+
+def search(q=None, types=None, category=None, difficulty_level=None, safety_level=None, limit=None, offset=None):
+    """
+    搜索景点、讲解词和商家。types/difficulty_level/safety_level 为逗号分隔的多个值。
+    返回 {query, items, total, limit, offset, next_offset}；参数无效抛出 QueryError。
+    """
+    runs = _runs(q)
+    kinds = _csv(types) or list(KINDS)
+    unknown = [k for k in kinds if k not in _KIND_CODES]
+    if unknown:
+        raise QueryError(f'未知类型: {unknown}')
+    levels = _csv(difficulty_level)
+    try:
+        levels = [int(v) for v in levels]
+    except ValueError:
+        raise QueryError('difficulty_level 必须是整数') from None
+    limit = _bounded_int(limit, SEARCH_DEFAULT_LIMIT, 1, SEARCH_MAX_LIMIT, 'limit')
+    offset = _bounded_int(offset, 0, 0, SEARCH_MAX_OFFSET, 'offset')
+    if not runs and not (category or levels or safety_level):
+        raise QueryError('请提供搜索词 q 或筛选条件')
+
+    params = {'limit': limit, 'offset': offset}
+    where = [_in_clause('d.kind', kinds, 'k', params)]
+    if category:
+        where.append('d.category = :category')
+        params['category'] = category
+    if levels:
+        where.append(_in_clause('d.difficulty_level', levels, 'dl', params))
+    if safety_level:
+        where.append(_in_clause('d.safety_level', _csv(safety_level), 'sl', params))
+
+    expression = match_expression(runs) if runs else None
+    conn = db.session
+    if expression is not None and _existing_tables(conn)['fts']:
+        # CROSS JOIN 固定由 MATCH 驱动，再按 rowid 取文档；否则规划器可能先按 kind 扫描文档再逐行 MATCH
+        source = 'search_fts CROSS JOIN search_documents d ON d.id = search_fts.rowid'
+        where.insert(0, 'search_fts MATCH :match')
+        params.update(match=expression, title_weight=SEARCH_TITLE_WEIGHT)
+        score = 'bm25(search_fts, :title_weight, 1.0)'
+        order = 'score, d.id'
+    else:
+        source = 'search_documents d'
+        score = '0.0'
+        order = 'd.id'
+        if runs:
+            # 单字或不支持 FTS5：每个词都须出现在标题或正文中，标题命中多的排在前面。
+            # 词只含字母数字和汉字，不需要转义 LIKE 通配符
+            title_hits = []
+            for i, (run, _) in enumerate(runs):
+                params[f't{i}'] = f'%{run}%'
+                where.append(f'(d.title LIKE :t{i} OR d.body LIKE :t{i})')
+                title_hits.append(f'(d.title LIKE :t{i})')
+            score = '-({})'.format(' + '.join(title_hits))
+            order = 'score, d.id'
+
+    where_sql = ' AND '.join(where)
+    total = conn.execute(text(f'SELECT count(*) FROM {source} WHERE {where_sql}'), params).scalar()
+    rows = conn.execute(text(
+        f'SELECT d.kind, d.ref_id, d.parent_id, d.title, d.body, d.category, d.difficulty_level, '
+        f'd.safety_level, {score} AS score FROM {source} WHERE {where_sql} ORDER BY {order} '
+        f'LIMIT :limit OFFSET :offset'
+    ), params).fetchall()
+
+    terms = [run for run, _ in runs]
+    items = []
+    for row in rows:
+        item = {
+            'type': row.kind,
+            'id': row.ref_id,
+            'title': row.title,
+            'title_highlight': highlight(row.title, terms),
+            'snippet': highlight(row.body, terms, SEARCH_SNIPPET_CHARS),
+            'category': row.category,
+            'difficulty_level': row.difficulty_level,
+            'safety_level': row.safety_level,
+            'score': round(-row.score, 4) or 0.0,
+        }
+        if row.kind == 'explanation':
+            item['attraction_id'] = row.parent_id
+        items.append(item)
+    next_offset = offset + len(items)
+    return {
+        'query': q or '',
+        'items': items,
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'next_offset': next_offset if next_offset < total and next_offset <= SEARCH_MAX_OFFSET else None,
+    }
+
+
+register_query(
+    'search_documents_by_category',
+    "SELECT id FROM search_documents WHERE kind = :kind AND category = :category ORDER BY id",
+    {'kind': 'attraction', 'category': '主峰'},
+)
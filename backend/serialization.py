@@ -0,0 +1,169 @@
+# backend/serialization.py
+"""
+序列化：
+- dumps() 输出 UTF-8 JSON 字节，安装了 orjson 时使用 orjson，否则退回标准库 json；
+  FastJSONProvider 让 jsonify 也走这条路径；
+- 模型声明 __serialize__ 字段表，首次使用时为每个模型（及每种字段子集）生成一次编码函数，
+  代替手写的 to_dict；
+- parse_fields() 解析 ?fields=id,name,latitude,longitude 这类字段选择参数。
+"""
+import json
+import os
+import threading
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import DateTime
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+# auto：有 orjson 就用；stdlib：强制使用标准库（便于压测对比）
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+# 每个模型最多缓存的字段子集编码函数数
+ENCODER_CACHE_SIZE = int(os.getenv("ENCODER_CACHE_SIZE", 64))
+
+_use_orjson = orjson is not None and JSON_BACKEND != 'stdlib'
+_default = DefaultJSONProvider.default
+
+if _use_orjson:
+    # 日期交给 Flask 的 default 处理，与 jsonify 原来的输出格式保持一致
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class FieldError(ValueError):
+    """字段选择参数无效"""
+
+
+def dumps(obj, sort_keys=False, default=_default):
+    """序列化为紧凑的 UTF-8 JSON 字节"""
+    if _use_orjson:
+        option = _ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            # 超过 64 位的整数等 orjson 不支持的值，交给标准库
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys,
+                      default=default).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify 使用 dumps()；调试模式下的缩进输出仍走标准库"""
+
+    ensure_ascii = False
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = dumps(obj, sort_keys=self.sort_keys, default=self.default)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
+
+
+# ==================== 模型编码 ====================
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def make_encoder(spec, converters=None, name='encode'):
+    """
+    按字段表生成编码函数 encode(obj) -> dict。字段表的每一项为：
+    'attr'（同名输出）、('key', 'attr')（改名）或 ('key', fn)（输出 fn(obj)）。
+    converters 为 {attr: 转换函数}。生成的是普通函数，没有逐字段的循环和分支。
+    """
+    converters = converters or {}
+    namespace = {}
+    items = []
+    for i, entry in enumerate(spec):
+        key, source = (entry, entry) if isinstance(entry, str) else entry
+        if callable(source):
+            namespace[f'_fn{i}'] = source
+            expr = f'_fn{i}(obj)'
+        else:
+            if not source.isidentifier():
+                raise ValueError(f'无效的属性名: {source}')
+            expr = f'obj.{source}'
+            if source in converters:
+                namespace[f'_conv{i}'] = converters[source]
+                expr = f'_conv{i}({expr})'
+        items.append(f'        {key!r}: {expr},')
+    source_code = f'def {name}(obj):\n    return {{\n' + '\n'.join(items) + '\n    }\n'
+    exec(source_code, namespace)
+    return namespace[name]
+
+
+def _spec_key(entry):
+    return entry if isinstance(entry, str) else entry[0]
+
+
+def _column_converters(model):
+    table = getattr(model, '__table__', None)
+    if table is None:
+        return {}
+    return {c.key: _iso for c in table.columns if isinstance(c.type, DateTime)}
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def encoder_for(model, fields=None):
+    """
+    返回模型的编码函数，只包含 fields（按给定顺序）；fields 为空时为完整字段表。
+    同一模型、同一字段子集只生成一次。未知字段抛出 FieldError。
+    """
+    key = (model, tuple(fields) if fields else None)
+    encoder = _encoders.get(key)
+    if encoder is not None:
+        return encoder
+
+    spec = model.__serialize__
+    if fields:
+        by_key = {_spec_key(entry): entry for entry in spec}
+        unknown = [f for f in fields if f not in by_key]
+        if unknown:
+            raise FieldError(f'未知字段: {unknown}')
+        spec = [by_key[f] for f in fields]
+    encoder = make_encoder(spec, _column_converters(model), f'encode_{model.__name__}')
+
+    with _encoders_lock:
+        subsets = [k for k in _encoders if k[0] is model and k[1] is not None]
+        if fields and len(subsets) >= ENCODER_CACHE_SIZE:
+            for k in subsets:
+                del _encoders[k]
+        _encoders[key] = encoder
+    return encoder
+
+
+def field_names(model):
+    return [_spec_key(entry) for entry in model.__serialize__]
+
+
+def parse_fields(value, model, required=('id',)):
+    """解析逗号分隔的字段列表；总是包含 required 中的字段。参数为空时返回 None（全部字段）"""
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    if not fields:
+        return None
+    known = set(field_names(model))
+    unknown = [f for f in fields if f not in known]
+    if unknown:
+        raise FieldError(f'未知字段: {unknown}')
+    return tuple(dict.fromkeys(list(required) + fields))
+
+
+class SerializerMixin:
+    """模型声明 __serialize__ 字段表即可获得 to_dict(fields=None)"""
+
+    __serialize__ = ()
+
+    def to_dict(self, fields=None):
+        return encoder_for(type(self), fields)(self)
@@ -0,0 +1,79 @@
+# backend/singleflight.py
+"""
+Single-flight 合并：同一 key 的并发调用只执行一次，其余调用方等待并共享结果。
+仅在单个进程内生效（gunicorn 多进程时每个 worker 各自合并）。
+"""
+import threading
+
+
+class SingleFlightTimeout(Exception):
+    """等待同 key 的进行中调用超时"""
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """线程安全的 single-flight 合并器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {
+            'calls': 0,          # 总调用次数
+            'executed': 0,       # 实际执行（上游调用）次数
+            'deduplicated': 0,   # 被合并、共享结果的次数
+            'timeouts': 0,       # 等待超时次数
+        }
+
+    def do(self, key, fn, timeout=None):
+        """
+        执行 fn() 并返回结果；若同 key 的调用已在进行中，则最多等待 timeout 秒共享其结果。
+        fn 抛出的异常同样会传递给所有等待者。
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executed'] += 1
+            else:
+                call.waiters += 1
+                self._stats['deduplicated'] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+
+        if not call.event.wait(timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise SingleFlightTimeout(key)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
@@ -0,0 +1,148 @@
+# backend/storage.py
+"""
+存储配置：数据库地址、SQLite 连接参数（WAL、busy_timeout、synchronous、cache_size），
+GET 请求使用的只读连接，以及启动时对常用查询的 EXPLAIN QUERY PLAN 检查。
+"""
+import logging
+import os
+
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database.db")
+# 只读连接地址（例如 sqlite:///file:/path/database.db?mode=ro&uri=true 或同一文件的副本）；
+# 未配置时 GET 请求也使用主连接
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 16384))
+
+QUERY_PLAN_CHECK = os.getenv("QUERY_PLAN_CHECK", "1") not in ("0", "false")
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def _sqlite_pragmas(read_only=False):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # journal_mode 会写入数据库文件头，只需主连接设置
+            cursor.execute(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
+            cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+        else:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        cursor.execute(f'PRAGMA cache_size={-SQLITE_CACHE_SIZE_KB}')
+        cursor.close()
+    return set_pragmas
+
+
+def _resolve_sqlite_url(app, url):
+    """与 Flask-SQLAlchemy 一致：相对路径的 SQLite 文件放在 instance 目录下"""
+    url = make_url(url)
+    database = url.database
+    if (url.drivername.startswith('sqlite') and database and database != ':memory:'
+            and not database.startswith('file:') and not os.path.isabs(database)):
+        url = url.set(database=os.path.join(app.instance_path, database))
+    return url
+
+
+class RoutingSession(Session):
+    """GET/HEAD 请求中的查询走只读连接；flush 和增删改语句始终走主连接"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, UpdateBase)
+                and has_request_context() and request.method in READ_METHODS):
+            engine = self._db.engines.get('__read__')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_app(app, db):
+    """配置数据库地址并初始化 db，为 SQLite 连接设置 PRAGMA，按需创建只读连接"""
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', DATABASE_URL)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _sqlite_pragmas())
+
+        read_url = app.config.get('SQLALCHEMY_READ_URI', DATABASE_READ_URL)
+        if read_url:
+            read_engine = create_engine(_resolve_sqlite_url(app, read_url))
+            if read_engine.dialect.name == 'sqlite':
+                event.listen(read_engine, 'connect', _sqlite_pragmas(read_only=True))
+            # 以保留的绑定名挂在 db.engines 上，随应用一起管理
+            db.engines['__read__'] = read_engine
+
+
+# ==================== 查询计划检查 ====================
+
+# 名称 -> (SQL, 参数)；handler 中按这些列过滤/排序的代表性查询
+PLANNED_QUERIES = {
+    'checkins_by_user': (
+        'SELECT * FROM user_checkins WHERE user_id = :user_id', {'user_id': 1}),
+    'explanation_lookup': (
+        'SELECT * FROM explanations WHERE attraction_id = :attraction_id AND audience_type = :audience',
+        {'attraction_id': 1, 'audience': 'all'}),
+    'explanations_by_attraction': (
+        'SELECT id FROM explanations WHERE attraction_id = :attraction_id', {'attraction_id': 1}),
+    'merchants_by_category': (
+        'SELECT * FROM merchants WHERE category = :category', {'category': '餐饮'}),
+    'merchants_by_category_rating': (
+        'SELECT id, rating FROM merchants WHERE category = :category ORDER BY rating DESC, id DESC LIMIT 21',
+        {'category': '餐饮'}),
+    'attractions_by_safety_level': (
+        'SELECT * FROM attractions WHERE safety_level = :level', {'level': '高危'}),
+    'route_stops_by_attraction': (
+        'SELECT route_id FROM route_stops WHERE attraction_id = :attraction_id', {'attraction_id': 1}),
+    'faq_by_question': (
+        'SELECT * FROM faq_entries WHERE normalized_question = :q', {'q': ''}),
+}
+
+
+def register_query(name, sql, params=None):
+    """登记一条需要在启动时检查查询计划的查询"""
+    PLANNED_QUERIES[name] = (sql, params or {})
+
+
+def _slow_steps(plan):
+    """计划中的全表扫描和临时排序"""
+    slow = []
+    for row in plan:
+        detail = row[-1]
+        if detail.startswith('SCAN') and ' USING ' not in detail:
+            slow.append(detail)
+        elif 'USE TEMP B-TREE' in detail:
+            slow.append(detail)
+    return slow
+
+
+def check_query_plans(db):
+    """对登记的查询执行 EXPLAIN QUERY PLAN，返回 {名称: [慢步骤]}，并打印报告"""
+    if db.engine.dialect.name != 'sqlite':
+        return {}
+    report = {}
+    with db.engine.connect() as conn:
+        for name, (sql, params) in PLANNED_QUERIES.items():
+            try:
+                plan = conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params).fetchall()
+            except Exception as e:
+                report[name] = [f'无法生成查询计划: {getattr(e, "orig", e)}']
+                continue
+            slow = _slow_steps(plan)
+            if slow:
+                report[name] = slow
+    for name, steps in report.items():
+        logger.warning("查询计划较慢 [%s]: %s", name, '; '.join(steps))
+    return report
@@ -0,0 +1,59 @@
+# backend/tests/conftest.py
+"""
+测试公共夹具：临时 SQLite 数据库上的应用，以及 bench.stub_server 提供的 DeepSeek 替身。
+在 backend 目录下运行：python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from bench.stub_server import StubConfig, serve  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    from app import create_app, init_db, seed_db
+
+    path = tmp_path_factory.mktemp('db') / 'test.db'
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        init_db()
+        seed_db()
+    yield app
+    app.extensions['checkin_writer'].stop()
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """默认不调用 DeepSeek（.env 中可能配置了真实地址）；需要上游的测试使用 deepseek 夹具"""
+    import ai_service
+
+    monkeypatch.setattr(ai_service, 'DEEPSEEK_API_KEY', None)
+
+
+@pytest.fixture
+def stub():
+    """DeepSeek 替身，返回 (配置, 地址)；测试中可直接修改配置的延迟和错误率"""
+    config = StubConfig(latency_ms=20, jitter_ms=0)
+    server, base_url = serve(config=config)
+    yield config, base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def deepseek(stub, monkeypatch):
+    """把 ai_service 的共享客户端换成指向替身的客户端，返回替身配置"""
+    import ai_service
+    from deepseek_client import CircuitBreaker, DeepSeekClient
+
+    config, base_url = stub
+    client = DeepSeekClient('test', base_url, max_retries=0, breaker=CircuitBreaker(failure_threshold=100))
+    monkeypatch.setattr(ai_service, '_client', client)
+    monkeypatch.setattr(ai_service, 'DEEPSEEK_API_KEY', 'test')
+    yield config
+    client.close()
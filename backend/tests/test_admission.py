@@ -0,0 +1,70 @@
+# backend/tests/test_admission.py
+import threading
+import uuid
+
+import pytest
+
+import routes
+from admission import MemoryBuckets, RateLimiter, SqliteBuckets
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    buckets = MemoryBuckets(rate=1.0, burst=3, clock=clock)
+
+    assert [buckets.take('ip:a')[0] for _ in range(3)] == [True] * 3
+    allowed, wait = buckets.take('ip:a')
+    assert not allowed and wait == pytest.approx(1.0)
+    assert buckets.take('ip:b')[0]
+
+    clock.now += 1
+    assert buckets.take('ip:a')[0]
+    assert not buckets.take('ip:a')[0]
+
+
+def test_rate_limiter_reports_whole_seconds():
+    limiter = RateLimiter(per_minute=60, burst=2, backend='memory')
+
+    assert limiter.take('ip:a', cost=5) == (True, 0)  # cost 超过容量时按容量计
+    allowed, retry_after = limiter.take('ip:a')
+    assert not allowed and retry_after >= 1
+
+
+def test_sqlite_bucket_does_not_overadmit_under_concurrency(app):
+    buckets = SqliteBuckets(rate=0.001, burst=5)
+    key = f'ip:{uuid.uuid4().hex}'
+    results = []
+    barrier = threading.Barrier(12)
+
+    def worker():
+        with app.app_context():
+            barrier.wait()
+            results.append(buckets.take(key)[0])
+
+    threads = [threading.Thread(target=worker) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 5
+
+
+def test_ask_returns_429_after_burst(app, deepseek, monkeypatch):
+    monkeypatch.setattr(routes, 'limiter', RateLimiter(per_minute=60, burst=2, backend='memory'))
+    client = app.test_client()
+
+    codes = [client.post('/api/ai/ask', json={'question': f'华山第 {i} 问'}).status_code for i in range(2)]
+    assert codes == [200, 200]
+
+    resp = client.post('/api/ai/ask', json={'question': '华山第 3 问'})
+    assert resp.status_code == 429
+    assert int(resp.headers['Retry-After']) >= 1
+    assert resp.get_json()['retry_after'] == int(resp.headers['Retry-After'])
@@ -0,0 +1,14 @@
+# backend/tests/test_ai_ask.py
+import pytest
+
+
+@pytest.mark.parametrize('body', [{}, {'question': ''}, {'question': '   '}, {'question': 123},
+                                  {'question': ['华山']}, {'question': None}, ['华山']])
+def test_ask_rejects_non_string_question(app, body):
+    resp = app.test_client().post('/api/ai/ask', json=body)
+    assert resp.status_code == 400
+
+
+def test_ask_answers_from_faq(app):
+    resp = app.test_client().post('/api/ai/ask', json={'question': '  华山门票  '})
+    assert resp.status_code == 200
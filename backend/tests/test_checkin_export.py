@@ -0,0 +1,110 @@
+# backend/tests/test_checkin_export.py
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import admin_auth
+from checkin_export import _csv_cell, iter_chunks
+from models import Attraction, User, UserCheckIn, db
+
+TOKEN = 'test-admin-token'
+NOTES = ['=HYPERLINK("http://evil","x")', '+1+1', '-2+3', '@SUM(A1)', '\tcmd', '\r=1', '普通备注', '', 'a=b']
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(admin_auth, 'ADMIN_TOKEN', TOKEN)
+    return {'X-Admin-Token': TOKEN}
+
+
+@pytest.fixture
+def user_checkins(app):
+    """一个用户的若干条打卡，备注覆盖各种公式开头；返回 (用户 id, 按 id 升序的打卡 id)"""
+    with app.app_context():
+        user = User(username=f'export-{uuid.uuid4().hex[:8]}')
+        db.session.add(user)
+        db.session.flush()
+        attraction_id = db.session.query(Attraction.id).first()[0]
+        start = datetime(2024, 5, 1)
+        rows = [UserCheckIn(user_id=user.id, attraction_id=attraction_id, notes=notes, rating=i % 5 + 1,
+                            checked_in_at=start + timedelta(hours=i))
+                for i, notes in enumerate(NOTES * 3)]
+        db.session.add_all(rows)
+        db.session.commit()
+        return user.id, [r.id for r in rows]
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('=1+1', "'=1+1"), ('+1', "'+1"), ('-1', "'-1"), ('@A1', "'@A1"), ('\tx', "'\tx"), ('\rx', "'\rx"),
+    ('a=b', 'a=b'), ('', ''), (-1, -1), (None, None),
+])
+def test_csv_cell_neutralises_formulas(value, expected):
+    assert _csv_cell(value) == expected
+
+
+def test_csv_export_escapes_notes(app, admin, user_checkins):
+    user_id, ids = user_checkins
+    resp = app.test_client().get(f'/api/checkins/{user_id}/export?format=csv', headers=admin)
+
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert [int(r['id']) for r in rows] == ids
+    for row, notes in zip(rows, NOTES * 3):
+        if notes[:1] in ('=', '+', '-', '@', '\t', '\r'):
+            assert row['notes'] == "'" + notes
+        else:
+            assert row['notes'] == notes
+
+
+def test_iter_chunks_resumes_after_cursor(app, user_checkins):
+    user_id, ids = user_checkins
+    with app.app_context():
+        chunks = list(iter_chunks(user_id=user_id, cursor=ids[4], chunk_size=4))
+    assert all(len(rows) <= 4 for rows in chunks)
+    assert [row.id for rows in chunks for row in rows] == ids[5:]
+
+
+def test_export_resume_and_time_range(app, admin, user_checkins):
+    user_id, ids = user_checkins
+    client = app.test_client()
+
+    first = client.get(f'/api/checkins/{user_id}/export', headers=admin).get_data(as_text=True)
+    records = [json.loads(line) for line in first.splitlines()]
+    assert [r['id'] for r in records] == ids
+
+    resumed = client.get(f'/api/checkins/{user_id}/export?format=csv&cursor={ids[9]}', headers=admin)
+    rows = list(csv.reader(io.StringIO(resumed.get_data(as_text=True))))
+    assert rows[0][0] != 'id'  # 续传不重复表头
+    assert [int(row[0]) for row in rows] == ids[10:]
+
+    ranged = client.get(f'/api/checkins/{user_id}/export?since=2024-05-01T02:00:00&until=2024-05-01T05:00:00',
+                        headers=admin)
+    assert [json.loads(line)['id'] for line in ranged.get_data(as_text=True).splitlines()] == ids[2:5]
+
+
+@pytest.mark.parametrize('query', ['format=xml', 'cursor=abc', 'since=yesterday'])
+def test_export_rejects_bad_arguments(app, admin, query):
+    assert app.test_client().get(f'/api/checkins/export?{query}', headers=admin).status_code == 400
+
+
+@pytest.mark.parametrize('path', ['/api/checkins/export', '/api/checkins/1/export', '/api/metrics'])
+def test_admin_endpoints_are_closed_without_configured_token(app, monkeypatch, path):
+    monkeypatch.setattr(admin_auth, 'ADMIN_TOKEN', None)
+    client = app.test_client()
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={'X-Admin-Token': ''}).status_code == 403
+
+
+@pytest.mark.parametrize('path', ['/api/checkins/export', '/api/metrics'])
+def test_admin_endpoints_require_matching_token(app, admin, path):
+    client = app.test_client()
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={'X-Admin-Token': 'wrong'}).status_code == 401
+    assert client.get(path, headers={'Authorization': f'Basic {TOKEN}'}).status_code == 401
+    assert client.get(path, headers=admin).status_code == 200
+    assert client.get(path, headers={'Authorization': f'Bearer {TOKEN}'}).status_code == 200
@@ -0,0 +1,82 @@
+# backend/tests/test_checkin_writer.py
+import threading
+import uuid
+
+import pytest
+
+from checkin_writer import CheckinWriter
+from models import Attraction, User, UserCheckIn, db
+
+THREADS = 8
+PER_THREAD = 25
+
+
+@pytest.fixture
+def ids(app):
+    with app.app_context():
+        user = User(username=f'writer-{uuid.uuid4().hex[:8]}')
+        db.session.add(user)
+        db.session.commit()
+        return user.id, db.session.query(Attraction.id).first()[0]
+
+
+def submit_concurrently(writers, user_id, attraction_id):
+    """每个线程轮流向各 writer 提交打卡，notes 唯一，返回全部 PendingCheckin"""
+    pendings = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(THREADS)
+
+    def worker(t):
+        barrier.wait()
+        for i in range(PER_THREAD):
+            writer = writers[(t + i) % len(writers)]
+            pending = writer.submit(user_id, attraction_id, notes=f'{t}-{i}')
+            with lock:
+                pendings.append(pending)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for pending in pendings:
+        assert pending.wait(10)
+        assert pending.error is None
+    return pendings
+
+
+def assert_ids_match_rows(app, pendings):
+    ids = [p.row['id'] for p in pendings]
+    assert None not in ids
+    assert len(set(ids)) == len(ids)
+    with app.app_context():
+        rows = dict(db.session.query(UserCheckIn.id, UserCheckIn.notes)
+                    .filter(UserCheckIn.id.in_(ids)).all())
+    assert rows == {p.row['id']: p.row['notes'] for p in pendings}
+
+
+def test_flushed_checkins_get_their_own_ids(app, ids):
+    writer = CheckinWriter(app, interval_ms=20, max_rows=16)
+    try:
+        pendings = submit_concurrently([writer], *ids)
+    finally:
+        writer.stop()
+
+    assert_ids_match_rows(app, pendings)
+    stats = writer.stats()
+    assert stats['flushed'] == THREADS * PER_THREAD
+    assert stats['failed'] == 0
+    assert stats['batches'] >= (THREADS * PER_THREAD) // 16
+
+
+def test_ids_stay_correct_with_competing_writers(app, ids):
+    # 两个 writer 模拟两个 worker 进程同时写同一张表
+    writers = [CheckinWriter(app, interval_ms=5, max_rows=8) for _ in range(2)]
+    try:
+        pendings = submit_concurrently(writers, *ids)
+    finally:
+        for writer in writers:
+            writer.stop()
+
+    assert_ids_match_rows(app, pendings)
+    assert sum(w.stats()['flushed'] for w in writers) == THREADS * PER_THREAD
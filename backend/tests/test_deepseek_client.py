@@ -0,0 +1,147 @@
+# backend/tests/test_deepseek_client.py
+import threading
+
+import pytest
+
+from deepseek_client import (CircuitBreaker, CircuitOpenError, DeepSeekClient, DeepSeekError,
+                             DeepSeekRequestError)
+
+PAYLOAD = {'model': 'deepseek-chat', 'messages': [{'role': 'user', 'content': '华山门票多少钱？'}]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_client(base_url, **kwargs):
+    return DeepSeekClient('test', base_url, backoff_base=0.01, backoff_max=0.02, **kwargs)
+
+
+def test_retryable_status_is_retried_then_raises(stub):
+    config, base_url = stub
+    config.error_rate = 1.0
+    client = make_client(base_url, max_retries=2)
+
+    with pytest.raises(DeepSeekError):
+        client.chat(PAYLOAD)
+    assert config.stats['requests'] == 3
+
+
+def test_breaker_opens_after_threshold_and_stops_calling(stub):
+    config, base_url = stub
+    config.error_rate = 1.0
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, clock=FakeClock())
+    client = make_client(base_url, max_retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(DeepSeekError):
+            client.chat(PAYLOAD)
+    assert breaker.state == 'open'
+
+    with pytest.raises(CircuitOpenError):
+        client.chat(PAYLOAD)
+    assert config.stats['requests'] == 2
+
+
+def test_half_open_probe_failure_reopens_and_success_closes(stub):
+    config, base_url = stub
+    config.error_rate = 1.0
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30, clock=clock)
+    client = make_client(base_url, max_retries=0, breaker=breaker)
+    with pytest.raises(DeepSeekError):
+        client.chat(PAYLOAD)
+    assert breaker.state == 'open'
+
+    clock.now += 30
+    assert breaker.state == 'half_open'
+    with pytest.raises(DeepSeekError):
+        client.chat(PAYLOAD)
+    assert config.stats['requests'] == 2
+    assert breaker.state == 'open'
+
+    clock.now += 30
+    config.error_rate = 0.0
+    content, _ = client.chat(PAYLOAD)
+    assert content
+    assert breaker.state == 'closed'
+
+
+def test_half_open_lets_only_one_probe_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+
+    allowed = []
+    barrier = threading.Barrier(8)
+
+    def probe():
+        barrier.wait()
+        allowed.append(breaker.allow())
+
+    threads = [threading.Thread(target=probe) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert allowed.count(True) == 1
+
+
+def test_client_errors_do_not_open_the_circuit(stub):
+    config, base_url = stub
+    config.error_rate = 1.0
+    config.error_status = 401
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, clock=FakeClock())
+    client = make_client(base_url, max_retries=2, breaker=breaker)
+
+    for _ in range(3):
+        with pytest.raises(DeepSeekRequestError):
+            client.chat(PAYLOAD)
+    assert config.stats['requests'] == 3
+    assert breaker.state == 'closed'
+
+
+class BrokenSession:
+    def post(self, *args, **kwargs):
+        raise RuntimeError('boom')
+
+    def close(self):
+        pass
+
+
+def test_unexpected_error_in_half_open_probe_does_not_wedge_breaker(stub):
+    config, base_url = stub
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 30
+
+    with pytest.raises(RuntimeError):
+        DeepSeekClient('test', base_url, breaker=breaker, session=BrokenSession()).chat(PAYLOAD)
+    assert breaker.state == 'open'
+
+    clock.now += 30
+    content, _ = make_client(base_url, breaker=breaker).chat(PAYLOAD)
+    assert content
+    assert breaker.state == 'closed'
+
+
+def test_client_error_in_half_open_probe_allows_next_probe(stub):
+    config, base_url = stub
+    config.error_rate = 1.0
+    config.error_status = 400
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 30
+    client = make_client(base_url, breaker=breaker)
+
+    with pytest.raises(DeepSeekRequestError):
+        client.chat(PAYLOAD)
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
@@ -0,0 +1,69 @@
+# backend/tests/test_faq_index.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import faq_index
+from faq_index import FaqIndex, learn, normalize_text
+from models import FaqEntry, db
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        faq_index.reload_index()
+        yield
+        db.session.rollback()
+
+
+def test_keyword_entry_needs_question_coverage():
+    index = FaqIndex()
+    index.add(1, normalize_text('门票'), '门票 160 元', 'keyword')
+
+    assert index.search('门票多少钱')[0] > index.search('从西安坐高铁过去以后门票在哪里买比较方便')[0]
+
+
+def test_remove_and_prune_drop_entries_from_postings():
+    index = FaqIndex()
+    now = datetime.utcnow()
+    index.add(1, normalize_text('华山几点开门'), 'a', expires_at=now - timedelta(seconds=1))
+    index.add(2, normalize_text('华山门票多少钱'), 'b')
+
+    assert not index.contains(normalize_text('华山几点开门'))
+    assert index.prune() == 1
+    index.remove([2])
+    assert len(index) == 0
+    assert not index._postings and not index._normalized
+
+
+def test_learn_does_not_skip_rows_written_by_other_workers(ctx):
+    # 另一个 worker 写入、本进程尚未加载的条目
+    other = FaqEntry(question='北峰索道几点停运', normalized_question=normalize_text('北峰索道几点停运'),
+                     answer='北峰索道 19:00 停运', match_type='question', source='ai')
+    db.session.add(other)
+    db.session.commit()
+
+    learn('西峰索道几点停运', '西峰索道 19:00 停运', force=True)
+
+    assert faq_index._index.contains(normalize_text('北峰索道几点停运'))
+    assert faq_index._index.contains(normalize_text('西峰索道几点停运'))
+    assert faq_index._index.loaded_id >= other.id
+
+
+def test_relearning_expired_answer_replaces_it(ctx, monkeypatch):
+    normalized = normalize_text('长空栈道要排队多久')
+    stale = FaqEntry(question='长空栈道要排队多久', normalized_question=normalized, answer='旧答案',
+                     match_type='question', source='ai', created_at=datetime.utcnow() - timedelta(days=30))
+    db.session.add(stale)
+    db.session.commit()
+    stale_id = stale.id
+    faq_index._refresh(force=True)
+    assert stale_id not in faq_index._index._entries
+    size = len(faq_index._index)
+
+    learn('长空栈道要排队多久', '新答案', force=True)
+
+    rows = FaqEntry.query.filter_by(normalized_question=normalized).all()
+    assert [r.answer for r in rows] == ['新答案']
+    assert len(faq_index._index) == size + 1
+    assert faq_index._index.search('长空栈道要排队多久')[2] == '新答案'
@@ -0,0 +1,115 @@
+# backend/tests/test_geo_index.py
+import random
+
+import pytest
+
+from geo_index import GridIndex, haversine, merchant_index
+from models import Merchant, db
+
+CENTER = (34.4778, 110.0847)
+
+
+def random_points(seed, n=300, spread=0.05):
+    rng = random.Random(seed)
+    return [(CENTER[0] + rng.uniform(-spread, spread), CENTER[1] + rng.uniform(-spread, spread), i)
+            for i in range(n)]
+
+
+def brute_force(points, lat, lon, k=None, max_radius_m=None, predicate=None):
+    found = sorted(
+        (haversine(lat, lon, plat, plon), payload) for plat, plon, payload in points
+        if predicate is None or predicate(payload)
+    )
+    if max_radius_m is not None:
+        found = [item for item in found if item[0] <= max_radius_m]
+    return found if k is None else found[:k]
+
+
+def distances(result):
+    return [round(d, 6) for d, _ in result]
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('cell', [None, 0.001, 0.02])
+def test_nearest_matches_brute_force(seed, cell):
+    points = random_points(seed)
+    index = GridIndex(points, cell=cell)
+    rng = random.Random(seed + 100)
+    for _ in range(20):
+        lat = CENTER[0] + rng.uniform(-0.06, 0.06)
+        lon = CENTER[1] + rng.uniform(-0.06, 0.06)
+        k = rng.randint(1, 20)
+        result = index.nearest(lat, lon, k)
+        assert distances(result) == distances(brute_force(points, lat, lon, k))
+        assert distances(result) == sorted(distances(result))
+
+
+def test_nearest_with_radius_and_predicate():
+    points = random_points(1)
+    index = GridIndex(points, cell=0.002)
+    even = lambda payload: payload % 2 == 0  # noqa: E731
+
+    result = index.nearest(*CENTER, 10, max_radius_m=1500, predicate=even)
+
+    assert distances(result) == distances(brute_force(points, *CENTER, 10, 1500, even))
+    assert all(payload % 2 == 0 for _, payload in result)
+
+
+@pytest.mark.parametrize('lat, lon', [
+    (CENTER[0] + 0.05, CENTER[1] + 0.05),   # 数据范围的角上
+    (CENTER[0] - 0.2, CENTER[1]),           # 数据范围之外
+    (0.0, 0.0),                             # 很远：改为逐点扫描
+    (-60.0, -120.0),
+])
+def test_nearest_outside_grid(lat, lon):
+    points = random_points(2)
+    index = GridIndex(points, cell=0.0005)
+
+    result = index.nearest(lat, lon, 5)
+
+    assert distances(result) == distances(brute_force(points, lat, lon, 5))
+
+
+def test_nearest_handles_ties_and_empty_index():
+    points = [(CENTER[0], CENTER[1], {'id': i}) for i in range(4)]
+    assert len(GridIndex(points).nearest(*CENTER, 3)) == 3
+    assert GridIndex([]).nearest(*CENTER, 3) == []
+    assert GridIndex(points).nearest(*CENTER, 0) == []
+
+
+@pytest.mark.parametrize('radius', [50, 500, 3000])
+def test_within_matches_brute_force(radius):
+    points = random_points(3)
+    index = GridIndex(points)
+
+    result = index.within(*CENTER, radius)
+
+    assert distances(result) == distances(brute_force(points, *CENTER, max_radius_m=radius))
+
+
+def test_versioned_index_rebuilds_after_commit(app):
+    with app.app_context():
+        before = merchant_index.get()
+        merchant = Merchant(name='测试客栈', category='hotel', latitude=CENTER[0], longitude=CENTER[1])
+        db.session.add(merchant)
+        db.session.commit()
+        merchant_id = merchant.id
+
+        index = merchant_index.get()
+        assert index is not before
+        assert merchant_id in [p['id'] for _, p in index.nearest(*CENTER, 5)]
+
+        db.session.delete(merchant)
+        db.session.commit()
+        assert merchant_id not in [p['id'] for _, p in merchant_index.get().nearest(*CENTER, 5)]
+
+
+def test_nearby_rejects_out_of_range_parameters(app):
+    client = app.test_client()
+    lat, lon = CENTER
+    assert client.get(f'/api/merchants/nearby?lat={lat}&lon={lon}&k=100000').status_code == 400
+    assert client.get(f'/api/merchants/nearby?lat={lat}&lon={lon}&radius=1e9').status_code == 400
+    assert client.get(f'/api/attractions/nearby?lat={lat}&lon={lon}&radius=nan').status_code == 400
+    resp = client.get(f'/api/attractions/nearby?lat={lat}&lon={lon}&k=3')
+    assert resp.status_code == 200
+    assert [a['distance_m'] for a in resp.get_json()] == sorted(a['distance_m'] for a in resp.get_json())
@@ -0,0 +1,106 @@
+# backend/tests/test_merchant_search.py
+import base64
+import json
+import random
+
+import pytest
+from sqlalchemy import insert
+
+from bench.dataset import _merchants
+from merchant_search import encode_cursor
+from models import Merchant, db
+
+CATEGORY = '分页测试'
+COUNT = 240
+
+
+@pytest.fixture(scope='module')
+def merchants(app):
+    """评分保留一位小数（大量并列），并有一部分排序列为 NULL"""
+    rng = random.Random(7)
+    rows = []
+    for row in _merchants(rng, COUNT):
+        row['category'] = CATEGORY
+        for key in ('rating', 'commission_rate', 'distance_from_center'):
+            if rng.random() < 0.15:
+                row[key] = None
+        rows.append(row)
+    with app.app_context():
+        db.session.execute(insert(Merchant), rows)
+        db.session.commit()
+        return {m.id: m.to_dict() for m in Merchant.query.filter_by(category=CATEGORY)}
+
+
+def expected_order(merchants, key, order):
+    """SQLite 的排序：NULL 升序时在最前、降序时在最后，并列时按 id 同方向"""
+    def sort_key(m):
+        return (m[key] is not None, m[key] or 0, m['id'])
+    return [m['id'] for m in sorted(merchants.values(), key=sort_key, reverse=order == 'desc')]
+
+
+def page_all(client, sort, order, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {'category': CATEGORY, 'sort': sort, 'order': order, 'limit': limit}
+        if cursor:
+            params['cursor'] = cursor
+        resp = client.get('/api/merchants', query_string=params)
+        assert resp.status_code == 200
+        body = resp.get_json()
+        assert len(body['items']) <= limit
+        ids.extend(item['id'] for item in body['items'])
+        cursor = body['next_cursor']
+        pages += 1
+        if not cursor:
+            return ids, pages
+
+
+@pytest.mark.parametrize('sort, key', [
+    ('rating', 'rating'), ('distance', 'distance_from_center'), ('commission_rate', 'commission_rate'),
+])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('limit', [3, 7, 100])
+def test_keyset_pages_cover_every_row_once(app, merchants, sort, key, order, limit):
+    ids, pages = page_all(app.test_client(), sort, order, limit)
+
+    assert len(ids) == len(set(ids)) == COUNT
+    assert ids == expected_order(merchants, key, order)
+    assert pages == -(-COUNT // limit)
+
+
+def test_fields_projection_and_total(app, merchants):
+    resp = app.test_client().get('/api/merchants', query_string={
+        'category': CATEGORY, 'fields': 'name,rating', 'limit': 5})
+    body = resp.get_json()
+    assert resp.status_code == 200
+    assert set(body['items'][0]) == {'id', 'name', 'rating'}
+    assert body['total_estimate'] == COUNT
+
+
+def b64(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-base64!',
+    '%%%',
+    b64('abcd'),
+    b64([1, 2, 3]),
+    b64({'sort': 'rating'}),
+    b64(['rating', 'desc', {'x': 1}, 5]),
+    b64(['rating', 'desc', [4.5], 5]),
+    b64(['rating', 'desc', 4.5, 'x']),
+    b64(['rating', 'desc', 4.5, True]),
+    encode_cursor('distance', 'asc', 1.0, 5),   # 与排序参数不一致
+])
+def test_invalid_cursor_is_400(app, merchants, cursor):
+    resp = app.test_client().get('/api/merchants', query_string={
+        'category': CATEGORY, 'sort': 'rating', 'order': 'desc', 'cursor': cursor})
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize('params', [
+    {'sort': 'name'}, {'order': 'up'}, {'limit': 'x'}, {'fields': 'no_such_field'},
+])
+def test_invalid_parameters_are_400(app, params):
+    assert app.test_client().get('/api/merchants', query_string=params).status_code == 400
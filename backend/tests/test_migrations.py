@@ -0,0 +1,42 @@
+# backend/tests/test_migrations.py
+import pytest
+from sqlalchemy import inspect, text
+
+import migrations
+from extensions import db
+
+
+@pytest.fixture
+def failing_migration(app, monkeypatch):
+    """在最新版本之后追加一个中途失败的迁移：先 ALTER 再报错"""
+    with app.app_context():
+        number = migrations.latest_version() + 1
+
+        def _broken(conn):
+            conn.execute(text('ALTER TABLE attractions ADD COLUMN broken_column INTEGER'))
+            conn.execute(text('CREATE TABLE broken_table (id INTEGER PRIMARY KEY)'))
+            raise RuntimeError('迁移中途失败')
+
+        monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS + [(number, 'broken', _broken)])
+        yield number
+
+
+def test_failed_migration_rolls_back_ddl_and_version(app, failing_migration):
+    with app.app_context():
+        before = migrations.latest_version() - 1
+
+        with pytest.raises(RuntimeError):
+            migrations.migrate()
+
+        with db.engine.connect() as conn:
+            assert migrations.current_version(conn) == before
+            inspector = inspect(conn)
+            assert 'broken_column' not in {c['name'] for c in inspector.get_columns('attractions')}
+            assert 'broken_table' not in inspector.get_table_names()
+
+
+def test_migrate_is_noop_when_up_to_date(app):
+    with app.app_context():
+        version = migrations.migrate()
+        assert version == migrations.latest_version()
+        assert migrations.migrate() == version
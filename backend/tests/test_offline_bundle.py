@@ -0,0 +1,88 @@
+# backend/tests/test_offline_bundle.py
+import json
+
+import pytest
+
+from models import Attraction, Explanation, FaqEntry, Route, RouteStop, db
+from offline_bundle import SAFETY_HASH
+
+
+def bundle(client, since=None):
+    resp = client.get('/api/offline/bundle', query_string={'since': since} if since else None)
+    assert resp.status_code == 200
+    return json.loads(resp.get_data())
+
+
+@pytest.fixture
+def explanation_id(app):
+    with app.app_context():
+        attraction_id = db.session.query(Attraction.id).first()[0]
+        explanation = Explanation(attraction_id=attraction_id, audience_type='adult', text_content='将被删除的讲解')
+        db.session.add(explanation)
+        db.session.commit()
+        return explanation.id
+
+
+def test_delta_contains_only_changed_rows_and_tombstones(app, explanation_id):
+    client = app.test_client()
+    base = bundle(client)
+    assert base['full']
+    attraction_ids = [a['id'] for a in base['attractions']]
+
+    with app.app_context():
+        edited = db.session.get(Attraction, attraction_ids[0])
+        edited.description = '增量测试修改后的简介'
+        faq = FaqEntry(question='增量测试新问题', normalized_question='增量测试新问题', answer='答案',
+                       match_type='question', source='admin')
+        db.session.add(faq)
+        db.session.delete(db.session.get(Explanation, explanation_id))
+        route = Route.query.first()
+        route_id = route.id
+        # 改动途经站点只影响所属路线
+        last_stop = RouteStop.query.filter_by(route_id=route_id).order_by(RouteStop.position.desc()).first()
+        db.session.delete(last_stop)
+        db.session.commit()
+        faq_id = faq.id
+        stops_left = RouteStop.query.filter_by(route_id=route_id).count()
+
+    delta = bundle(client, base['version'])
+
+    assert not delta['full'] and delta['since'] == base['version']
+    assert delta['version'] != base['version']
+    assert [a['id'] for a in delta['upserts']['attractions']] == [attraction_ids[0]]
+    assert delta['upserts']['attractions'][0]['description'] == '增量测试修改后的简介'
+    assert [f['id'] for f in delta['upserts']['faq']] == [faq_id]
+    assert [r['id'] for r in delta['upserts']['routes']] == [route_id]
+    assert len(delta['upserts']['routes'][0]['attractions']) == stops_left
+    assert delta['upserts']['explanations'] == []
+    assert delta['deleted'] == {'attractions': [], 'routes': [], 'explanations': [explanation_id], 'faq': []}
+    assert 'safety' not in delta
+
+    # 从最新版本取增量：没有任何变更
+    latest = bundle(client, delta['version'])
+    assert latest['version'] == delta['version']
+    assert all(rows == [] for rows in latest['upserts'].values())
+    assert all(ids == [] for ids in latest['deleted'].values())
+
+    with app.app_context():
+        db.session.delete(db.session.get(FaqEntry, faq_id))
+        db.session.commit()
+    assert bundle(client, delta['version'])['deleted']['faq'] == [faq_id]
+
+
+def test_delta_falls_back_or_rejects(app):
+    client = app.test_client()
+    version = bundle(client)['version']
+    number = int(version.partition('-')[0])
+
+    assert bundle(client, f'{number + 100}-{SAFETY_HASH}')['full']   # 客户端版本比服务端新
+    assert 'safety' in bundle(client, f'{number}-oldhash')            # 安全规则已变化
+    for since in ('abc', '-1'):
+        assert client.get('/api/offline/bundle', query_string={'since': since}).status_code == 400
+
+
+def test_full_bundle_supports_304(app):
+    client = app.test_client()
+    resp = client.get('/api/offline/bundle')
+    etag = resp.headers['ETag']
+    assert client.get('/api/offline/bundle', headers={'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,13 @@
+# backend/tests/test_query_counter.py
+
+
+def test_query_count_header_follows_debug_flag(app, monkeypatch):
+    client = app.test_client()
+    monkeypatch.setattr(app, 'debug', False)
+    assert 'X-Query-Count' not in client.get('/api/routes/1').headers
+
+    # 与 app.run(debug=True) 一样，在工厂函数返回之后才开启调试
+    monkeypatch.setattr(app, 'debug', True)
+    resp = client.get('/api/routes/1')
+    assert resp.status_code == 200
+    assert resp.headers['X-Query-Count'].isdigit()
@@ -0,0 +1,40 @@
+# backend/tests/test_safety_check.py
+import pytest
+
+
+@pytest.mark.parametrize('body', [
+    None,
+    [1, 2],
+    {'route_id': 'abc'},
+    {'attraction_ids': 1},
+    {'attraction_ids': ['x']},
+    {'attraction_ids': [[1]]},
+    {'attraction_ids': [1], 'user_id': 'abc'},
+    {'attraction_ids': [1], 'profile': 'abc'},
+    {},
+])
+def test_batch_rejects_bad_input(app, body):
+    client = app.test_client()
+    if body is None:
+        resp = client.post('/api/safety-check/batch', data='not json', content_type='application/json')
+    else:
+        resp = client.post('/api/safety-check/batch', json=body)
+    assert resp.status_code == 400
+
+
+def test_batch_accepts_string_route_id(app):
+    client = app.test_client()
+    by_int = client.post('/api/safety-check/batch', json={'route_id': 1})
+    by_str = client.post('/api/safety-check/batch', json={'route_id': '1'})
+
+    assert by_int.status_code == by_str.status_code == 200
+    assert by_str.get_json() == by_int.get_json()
+    assert by_str.get_json()['route_id'] == 1
+
+
+def test_batch_unknown_ids_are_404(app):
+    client = app.test_client()
+    assert client.post('/api/safety-check/batch', json={'route_id': 9999}).status_code == 404
+    resp = client.post('/api/safety-check/batch', json={'attraction_ids': [1, 9999]})
+    assert resp.status_code == 404
+    assert resp.get_json()['attraction_ids'] == [9999]
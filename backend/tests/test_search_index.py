@@ -0,0 +1,106 @@
+# backend/tests/test_search_index.py
+import pytest
+
+import search_index
+from models import Merchant, db
+from search_index import QueryError, highlight, match_expression, search, segment, _runs
+
+EVIL = '<script>alert("x")</script>华山论剑客栈'
+
+
+@pytest.fixture
+def merchant_id(app):
+    with app.app_context():
+        merchant = Merchant(name=EVIL, category='住宿', location='玉泉院 & 东门 <旁>')
+        db.session.add(merchant)
+        db.session.commit()
+        yield merchant.id
+        db.session.delete(db.session.get(Merchant, merchant.id))
+        db.session.commit()
+
+
+@pytest.fixture(params=['fts', 'like'])
+def backend(request, monkeypatch):
+    """同一组查询分别走 FTS5 和 LIKE 回退"""
+    if request.param == 'like':
+        monkeypatch.setattr(search_index, '_existing_tables', lambda conn: {'documents': True, 'fts': False})
+    return request.param
+
+
+def ids(result, kind='merchant'):
+    return [item['id'] for item in result['items'] if item['type'] == kind]
+
+
+def test_segment_and_match_expression():
+    assert segment('华山ABC 论剑') == '华山 abc 论剑'
+    assert segment('西峰索道') == '西峰 峰索 索道'
+    assert match_expression(_runs('西峰索道 cable')) == '"西峰 峰索 索道" AND "cable"*'
+    assert match_expression(_runs('峰')) is None
+
+
+@pytest.mark.parametrize('q, hit', [
+    ('华山论剑', True),
+    ('论剑客栈', True),
+    ('山论', True),        # 词中间的两个字
+    ('剑论', False),       # 顺序不同不是子串
+    ('论剑 客栈', True),
+    ('论剑 不存在', False),
+    ('script', True),
+])
+def test_bigram_query_behaves_like_substring(app, merchant_id, backend, q, hit):
+    with app.app_context():
+        assert search_index._existing_tables(db.session)['fts'] is (backend == 'fts')
+        assert (merchant_id in ids(search(q, types='merchant'))) is hit
+
+
+def test_single_character_query_uses_like(app, merchant_id):
+    with app.app_context():
+        assert merchant_id in ids(search('栈', types='merchant'))
+
+
+def test_highlight_output_is_escaped(app, merchant_id, backend):
+    with app.app_context():
+        item = next(i for i in search('论剑', types='merchant')['items'] if i['id'] == merchant_id)
+    assert '<script>' not in item['title_highlight']
+    assert item['title_highlight'] == (
+        '&lt;script&gt;alert(&#34;x&#34;)&lt;/script&gt;华山<mark>论剑</mark>客栈'
+    )
+    assert '<旁>' not in item['snippet'] and '&lt;旁&gt;' in item['snippet']
+    assert item['title'] == EVIL
+
+
+def test_highlight_snippet_and_case():
+    assert highlight('Cable <car>', ['cable']) == '<mark>Cable</mark> &lt;car&gt;'
+    snippet = highlight('甲' * 50 + '索道' + '乙' * 50, ['索道'], width=20)
+    assert snippet.startswith('…') and snippet.endswith('…')
+    assert '<mark>索道</mark>' in snippet
+    assert highlight(None, ['x']) == ''
+
+
+def test_documents_follow_model_changes(app, merchant_id):
+    with app.app_context():
+        merchant = db.session.get(Merchant, merchant_id)
+        merchant.name = '苍龙岭茶舍'
+        db.session.commit()
+        assert merchant_id in ids(search('苍龙岭茶舍'))
+        assert merchant_id not in ids(search('论剑客栈'))
+
+
+@pytest.mark.parametrize('query', ['', 'q=%25', 'q=华山&type=hotel', 'q=华山&limit=0', 'q=华山&offset=x',
+                                   'q=华山&difficulty_level=hard'])
+def test_invalid_queries_are_400(app, query):
+    assert app.test_client().get(f'/api/search?{query}').status_code == 400
+
+
+def test_search_endpoint_filters_and_pages(app):
+    client = app.test_client()
+    first = client.get('/api/search?q=华山&limit=2').get_json()
+    assert len(first['items']) <= 2
+    if first['next_offset']:
+        second = client.get(f"/api/search?q=华山&limit=2&offset={first['next_offset']}").get_json()
+        assert not {(i['type'], i['id']) for i in first['items']} & {(i['type'], i['id']) for i in second['items']}
+    attractions = client.get('/api/search?q=华山&type=attraction').get_json()['items']
+    assert all(item['type'] == 'attraction' for item in attractions)
+    with pytest.raises(QueryError):
+        with app.app_context():
+            search('华山', types='nope')
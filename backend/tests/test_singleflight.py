@@ -0,0 +1,61 @@
+# backend/tests/test_singleflight.py
+import threading
+
+import pytest
+
+import ai_service
+from singleflight import SingleFlight
+
+N = 8
+
+
+@pytest.fixture(autouse=True)
+def fresh_inflight(monkeypatch):
+    monkeypatch.setattr(ai_service, '_inflight', SingleFlight())
+
+
+def ask_concurrently(prompts):
+    results = [None] * len(prompts)
+    barrier = threading.Barrier(len(prompts))
+
+    def worker(i):
+        barrier.wait()
+        results[i] = ai_service._call_deepseek('你是华山导游', prompts[i])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(prompts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_identical_concurrent_calls_hit_upstream_once(deepseek):
+    deepseek.latency_ms = 300
+
+    results = ask_concurrently(['华山门票多少钱？'] * N)
+
+    assert deepseek.stats['requests'] == 1
+    assert results[0] and len(set(results)) == 1
+    stats = ai_service._inflight.stats()
+    assert stats['executed'] == 1
+    assert stats['deduplicated'] == N - 1
+
+
+def test_different_prompts_are_not_merged(deepseek):
+    deepseek.latency_ms = 100
+
+    results = ask_concurrently([f'第 {i} 个问题' for i in range(4)])
+
+    assert deepseek.stats['requests'] == 4
+    assert all(results)
+
+
+def test_shared_failure_falls_back_once(deepseek):
+    deepseek.latency_ms = 300
+    deepseek.error_rate = 1.0
+
+    results = ask_concurrently(['华山几点开门？'] * N)
+
+    assert deepseek.stats['requests'] == 1
+    assert results == [''] * N
@@ -0,0 +1,168 @@
+# backend/tests/test_trail_graph.py
+import random
+from itertools import permutations
+from types import SimpleNamespace
+
+import pytest
+
+import trail_graph
+from trail_graph import INF, PlanningError, TrailGraph, plan_itinerary
+
+
+def attraction(id, minutes=10, difficulty=1, safety='安全'):
+    return SimpleNamespace(id=id, name=f'景点{id}', estimated_time=minutes,
+                           difficulty_level=difficulty, safety_level=safety)
+
+
+def segment(id, a, b, minutes, difficulty=1, exposed=False, bidirectional=True):
+    return SimpleNamespace(id=id, from_attraction_id=a, to_attraction_id=b, name=f'路段{id}', kind='trail',
+                           walking_minutes=minutes, difficulty_level=difficulty, exposed=exposed,
+                           bidirectional=bidirectional)
+
+
+def random_graph(seed, n=12, extra=14):
+    rng = random.Random(seed)
+    nodes = [attraction(i, rng.randint(5, 30)) for i in range(1, n + 1)]
+    segments = [segment(i, i, i + 1, rng.randint(5, 60)) for i in range(1, n)]
+    for k in range(extra):
+        a, b = rng.sample(range(1, n + 1), 2)
+        segments.append(segment(n + k, a, b, rng.randint(5, 90), bidirectional=rng.random() < 0.7))
+    return TrailGraph(1, nodes, segments)
+
+
+def floyd(graph):
+    n = len(graph.nodes)
+    d = [[0 if i == j else INF for j in range(n)] for i in range(n)]
+    for u, v, edge in graph.arcs:
+        d[u][v] = min(d[u][v], edge.minutes)
+    for k in range(n):
+        for i in range(n):
+            for j in range(n):
+                d[i][j] = min(d[i][j], d[i][k] + d[k][j])
+    return d
+
+
+def brute_force_travel(d, start, stops, end):
+    best = INF
+    for order in permutations(stops):
+        seq = [start, *order] + ([end] if end is not None else [])
+        best = min(best, sum(d[a][b] for a, b in zip(seq, seq[1:])))
+    return best
+
+
+def check_legs(plan):
+    for leg in plan['legs']:
+        segments = leg['segments']
+        assert segments[0]['from_attraction_id'] == leg['from_attraction_id']
+        assert segments[-1]['to_attraction_id'] == leg['to_attraction_id']
+        assert sum(s['minutes'] for s in segments) == leg['minutes']
+    assert sum(leg['minutes'] for leg in plan['legs']) == plan['travel_minutes']
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_exact_order_matches_brute_force(seed):
+    graph = random_graph(seed)
+    d = floyd(graph)
+    must_see = [3, 6, 8, 11, 5]
+    plan = plan_itinerary(graph, 1, must_see, end_id=12)
+
+    expected = brute_force_travel(d, 0, [graph.index[a] for a in must_see], graph.index[12])
+    assert plan['travel_minutes'] == expected
+    assert {s['attraction_id'] for s in plan['stops']} == {1, 12, *must_see}
+    assert plan['feasible']
+    check_legs(plan)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_heuristic_order_visits_every_stop(seed, monkeypatch):
+    graph = random_graph(seed)
+    must_see = [3, 6, 8, 11, 5]
+    exact = plan_itinerary(graph, 1, must_see)
+    monkeypatch.setattr(trail_graph, 'EXACT_ORDER_LIMIT', 0)
+
+    plan = plan_itinerary(graph, 1, must_see)
+
+    assert {s['attraction_id'] for s in plan['stops']} == {1, *must_see}
+    assert plan['travel_minutes'] >= exact['travel_minutes']
+    check_legs(plan)
+
+
+def test_heuristic_follows_line(monkeypatch):
+    # 一条直线上的景点：最优顺序就是沿线依次经过
+    graph = TrailGraph(1, [attraction(i) for i in range(1, 9)],
+                       [segment(i, i, i + 1, 10) for i in range(1, 8)])
+    monkeypatch.setattr(trail_graph, 'EXACT_ORDER_LIMIT', 0)
+
+    plan = plan_itinerary(graph, 1, [7, 3, 5, 2, 6, 4], end_id=8)
+
+    assert [s['attraction_id'] for s in plan['stops']] == list(range(1, 9))
+    assert plan['travel_minutes'] == 70
+
+
+def test_avoided_must_see_makes_plan_infeasible():
+    graph = TrailGraph(1, [attraction(1), attraction(2), attraction(3, difficulty=4)],
+                       [segment(1, 1, 2, 10), segment(2, 2, 3, 10)])
+
+    plan = plan_itinerary(graph, 1, [2, 3], avoid={'fear_of_heights'})
+
+    assert not plan['feasible']
+    assert plan['excluded_must_see'] == [{'attraction_id': 3, 'reason': 'avoided'}]
+    assert [s['attraction_id'] for s in plan['stops']] == [1, 2]
+
+
+def test_blocked_node_is_not_passed_through_and_exposed_edge_is_avoided():
+    # 1-2-4 经过陡峭景点 2；1-4 直达路段临崖；只能走 1-3-4
+    graph = TrailGraph(1, [attraction(1), attraction(2, difficulty=3), attraction(3), attraction(4)], [
+        segment(1, 1, 2, 5), segment(2, 2, 4, 5),
+        segment(3, 1, 4, 1, exposed=True),
+        segment(4, 1, 3, 20), segment(5, 3, 4, 20),
+    ])
+
+    assert plan_itinerary(graph, 1, end_id=4)['travel_minutes'] == 1
+    plan = plan_itinerary(graph, 1, end_id=4, avoid={'fear_of_heights'})
+    assert plan['travel_minutes'] == 40
+    assert [s['segment_id'] for s in plan['legs'][0]['segments']] == [4, 5]
+
+
+def test_unreachable_must_see_and_time_budget():
+    graph = TrailGraph(1, [attraction(1), attraction(2), attraction(3)], [segment(1, 1, 2, 30)])
+
+    plan = plan_itinerary(graph, 1, [2, 3], time_budget=30)
+
+    assert plan['excluded_must_see'] == [{'attraction_id': 3, 'reason': 'unreachable'}]
+    assert plan['total_minutes'] == 50 and not plan['feasible']
+
+
+def test_fill_inserts_stops_within_budget():
+    graph = TrailGraph(1, [attraction(i, 10) for i in range(1, 6)],
+                       [segment(i, i, i + 1, 10) for i in range(1, 5)])
+
+    plan = plan_itinerary(graph, 1, end_id=3, time_budget=60, fill=True)
+
+    assert [s['attraction_id'] for s in plan['stops']] == [1, 2, 3]
+    assert plan['total_minutes'] <= 60 and plan['feasible']
+    check_legs(plan)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'start_id': '1'},
+    {'start_id': 1, 'must_see': 2},
+    {'start_id': 1, 'must_see': [True]},
+    {'start_id': 1, 'time_budget': '60'},
+    {'start_id': 1, 'time_budget': -1},
+    {'start_id': 99},
+])
+def test_invalid_arguments(kwargs):
+    graph = TrailGraph(1, [attraction(1), attraction(2)], [segment(1, 1, 2, 10)])
+    with pytest.raises(PlanningError):
+        plan_itinerary(graph, **kwargs)
+
+
+def test_plan_endpoint(app):
+    client = app.test_client()
+    assert client.post('/api/routes/plan', data='x', content_type='application/json').status_code == 400
+    assert client.post('/api/routes/plan', json={'start_id': 1, 'must_see': 'abc'}).status_code == 400
+
+    resp = client.post('/api/routes/plan', json={'start_id': 1, 'must_see': [2, 3]})
+    assert resp.status_code == 200
+    check_legs(resp.get_json())
@@ -0,0 +1,433 @@
+# backend/trail_graph.py
+"""
+步道图与行程规划：景点为节点，步道/索道为边（耗时、难度、是否临崖）。
+每个回避条件只缓存邻接表（O(N+E)），最短路在规划请求中按需计算：
+只从起点、必去景点（以及补充景点时行程中的景点）各跑一次正向 / 反向 Dijkstra，
+不保存 N×N 的全源最短路，内存与首个请求的耗时都不随景点数平方增长。
+"""
+import heapq
+import os
+import threading
+import time
+from array import array
+from itertools import combinations
+
+from models import Attraction, TrailSegment
+from versioning import get_version, on_commit, track_changes
+
+TRAIL_GRAPH = 'trail_graph'
+
+# 必去景点不超过该数量时用状态压缩 DP 求精确顺序，否则用最近邻 + 2-opt
+EXACT_ORDER_LIMIT = int(os.getenv("PLANNER_EXACT_ORDER_LIMIT", 8))
+GRAPH_VERSION_CHECK_INTERVAL = float(os.getenv("GRAPH_VERSION_CHECK_INTERVAL", 1.0))
+
+INF = float('inf')
+
+track_changes(TRAIL_GRAPH, Attraction, TrailSegment)
+
+# 回避条件：节点规则决定哪些景点不能停留或途经，边规则决定哪些路段不能走
+AVOID_RULES = {
+    'fear_of_heights': {
+        'node': lambda a: (a.difficulty_level or 0) >= 3,
+        'edge': lambda s: bool(s.exposed),
+        'reason': '恐高：回避陡峭景点和临崖路段',
+    },
+    'medical_condition': {
+        'node': lambda a: a.safety_level in ('高危', '极端危险'),
+        'edge': lambda s: (s.difficulty_level or 0) >= 4,
+        'reason': '身体状况：回避高危景点和高难度路段',
+    },
+}
+
+
+class PlanningError(ValueError):
+    """规划参数无效"""
+
+
+class _Node:
+    __slots__ = ('id', 'name', 'estimated_time', 'difficulty_level', 'safety_level')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.name = row.name
+        self.estimated_time = row.estimated_time or 0
+        self.difficulty_level = row.difficulty_level
+        self.safety_level = row.safety_level
+
+
+class _Edge:
+    __slots__ = ('id', 'name', 'kind', 'minutes', 'difficulty_level', 'exposed')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.name = row.name
+        self.kind = row.kind or 'trail'
+        self.minutes = row.walking_minutes
+        self.difficulty_level = row.difficulty_level
+        self.exposed = row.exposed
+
+
+class _Profile:
+    """某一回避条件下的图：不能停留或途经的节点、正反向邻接表，以及每对节点间最快的路段"""
+    __slots__ = ('blocked', 'adj', 'radj', 'edge')
+
+    def __init__(self, blocked, adj, radj, edge):
+        self.blocked = blocked
+        self.adj = adj
+        self.radj = radj
+        self.edge = edge
+
+
+class TrailGraph:
+    """某一版本的步道图，按回避条件懒构建并缓存邻接表"""
+
+    def __init__(self, version, attractions, segments):
+        self.version = version
+        self.nodes = [_Node(a) for a in attractions]
+        self.index = {node.id: i for i, node in enumerate(self.nodes)}
+        self.arcs = []  # (起点下标, 终点下标, 边)
+        for row in segments:
+            u = self.index.get(row.from_attraction_id)
+            v = self.index.get(row.to_attraction_id)
+            if u is None or v is None or row.walking_minutes is None:
+                continue
+            edge = _Edge(row)
+            self.arcs.append((u, v, edge))
+            if row.bidirectional:
+                self.arcs.append((v, u, edge))
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def profile(self, avoid=frozenset()):
+        avoid = frozenset(avoid)
+        profile = self._profiles.get(avoid)
+        if profile is None:
+            with self._lock:
+                profile = self._profiles.get(avoid)
+                if profile is None:
+                    profile = self._build_profile(avoid)
+                    self._profiles[avoid] = profile
+        return profile
+
+    def _build_profile(self, avoid):
+        rules = [AVOID_RULES[name] for name in sorted(avoid)]
+        blocked = frozenset(
+            i for i, node in enumerate(self.nodes) if any(r['node'](node) for r in rules)
+        )
+        n = len(self.nodes)
+        adj = [[] for _ in range(n)]
+        radj = [[] for _ in range(n)]
+        best_edge = {}
+        for u, v, edge in self.arcs:
+            if any(r['edge'](edge) for r in rules):
+                continue
+            current = best_edge.get((u, v))
+            if current is None or edge.minutes < current.minutes:
+                best_edge[(u, v)] = edge
+        for (u, v), edge in best_edge.items():
+            adj[u].append((v, edge.minutes))
+            radj[v].append((u, edge.minutes))
+        return _Profile(blocked, adj, radj, best_edge)
+
+    def distances(self, avoid=frozenset()):
+        return _Distances(self.profile(avoid), len(self.nodes))
+
+
+class _Distances:
+    """
+    一次规划内按需计算、按节点缓存的最短路。
+    dist[u][v] 为 u 到 v 的耗时（从 u 出发的正向 Dijkstra），to(v)[u] 同样是 u 到 v 的耗时（到 v 的反向 Dijkstra），
+    补充景点时用后者求"候选景点到行程中下一站"的距离，避免对每个候选景点各跑一次。
+    """
+
+    def __init__(self, profile, n):
+        self.profile = profile
+        self.blocked = profile.blocked
+        self.n = n
+        self._from = {}
+        self._to = {}
+
+    def _forward(self, u):
+        result = self._from.get(u)
+        if result is None:
+            result = self._from[u] = _dijkstra(u, self.profile.adj, self.blocked, self.n)
+        return result
+
+    def __getitem__(self, u):
+        return self._forward(u)[0]
+
+    def to(self, v):
+        # 反向图上的 Dijkstra：被回避的景点同样可以作为起点，但不能途经
+        dist = self._to.get(v)
+        if dist is None:
+            dist = self._to[v] = _dijkstra(v, self.profile.radj, self.blocked, self.n)[0]
+        return dist
+
+    def path(self, u, v):
+        """u 到 v 的节点下标序列"""
+        prev = self._forward(u)[1]
+        nodes = [v]
+        while nodes[-1] != u:
+            nodes.append(prev[nodes[-1]])
+        return nodes[::-1]
+
+
+def _dijkstra(src, adj, blocked, n):
+    """返回 (耗时, 前驱)：dist[v] 为 src 到 v 的最短耗时，prev[v] 为最短路上 v 的前一个节点"""
+    dist = array('d', [INF]) * n
+    prev = array('l', [-1]) * n
+    dist[src] = 0.0
+    prev[src] = src
+    heap = [(0.0, src)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        # 被回避的景点可以作为终点，但不能途经
+        if u != src and u in blocked:
+            continue
+        for v, w in adj[u]:
+            nd = d + w
+            if nd < dist[v]:
+                dist[v] = nd
+                prev[v] = u
+                heapq.heappush(heap, (nd, v))
+    return dist, prev
+
+
+def _order_exact(dist, start, stops, end):
+    """状态压缩 DP：固定起点（和终点）时经过全部 stops 的最短顺序"""
+    k = len(stops)
+    full = (1 << k) - 1
+    dp = {}
+    for j, s in enumerate(stops):
+        dp[(1 << j, j)] = (dist[start][s], None)
+    for size in range(2, k + 1):
+        for subset in combinations(range(k), size):
+            mask = 0
+            for j in subset:
+                mask |= 1 << j
+            for j in subset:
+                prev_mask = mask ^ (1 << j)
+                best = None
+                for i in subset:
+                    if i == j or (prev_mask, i) not in dp:
+                        continue
+                    cost = dp[(prev_mask, i)][0] + dist[stops[i]][stops[j]]
+                    if best is None or cost < best[0]:
+                        best = (cost, i)
+                if best is not None:
+                    dp[(mask, j)] = best
+    best_j, best_cost = None, INF
+    for j in range(k):
+        if (full, j) not in dp:
+            continue
+        cost = dp[(full, j)][0] + (dist[stops[j]][end] if end is not None else 0)
+        if cost < best_cost:
+            best_j, best_cost = j, cost
+    if best_j is None:
+        raise PlanningError('必去景点之间无法互相到达')
+    order, mask, j = [], full, best_j
+    while j is not None:
+        order.append(stops[j])
+        mask, j = mask ^ (1 << j), dp[(mask, j)][1]
+    return order[::-1]
+
+
+def _minutes(value):
+    return int(value) if float(value).is_integer() else round(value, 1)
+
+
+def _tour_cost(dist, seq):
+    return sum(dist[a][b] for a, b in zip(seq, seq[1:]))
+
+
+def _order_heuristic(dist, start, stops, end):
+    """最近邻构造 + 2-opt 改进"""
+    remaining = set(stops)
+    order, current = [], start
+    while remaining:
+        nxt = min(remaining, key=lambda s: dist[current][s])
+        order.append(nxt)
+        remaining.discard(nxt)
+        current = nxt
+    head, tail = [start], ([end] if end is not None else [])
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                if _tour_cost(dist, head + candidate + tail) < _tour_cost(dist, head + order + tail):
+                    order, improved = candidate, True
+    return order
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def plan_itinerary(graph, start_id, must_see=(), end_id=None, time_budget=None,
+                   avoid=frozenset(), fill=False):
+    """
+    规划行程：从 start 出发，经过全部必去景点（按耗时最短的顺序），到 end 结束（可选）。
+    fill=True 时在预算允许的范围内贪心插入其他景点。
+    耗时 = 路程时间 + 每个停留景点的 estimated_time。
+    有必去景点因回避条件或不可达被排除时，feasible 为 false，被排除的景点见 excluded_must_see。
+    """
+    if not all(_is_id(a) for a in [start_id, end_id] if a is not None):
+        raise PlanningError('start_id 和 end_id 必须是景点 id')
+    if not isinstance(must_see, (list, tuple)) or not all(_is_id(a) for a in must_see):
+        raise PlanningError('must_see 必须是景点 id 列表')
+    if time_budget is not None and (not _is_number(time_budget) or time_budget < 0):
+        raise PlanningError('time_budget 必须是非负的分钟数')
+    if start_id not in graph.index:
+        raise PlanningError('起点景点不存在')
+    if end_id is not None and end_id not in graph.index:
+        raise PlanningError('终点景点不存在')
+    unknown = [a for a in must_see if a not in graph.index]
+    if unknown:
+        raise PlanningError(f'景点不存在: {unknown}')
+
+    dist = graph.distances(avoid)
+    start = graph.index[start_id]
+    end = graph.index[end_id] if end_id is not None else None
+    visit = [node.estimated_time for node in graph.nodes]
+
+    excluded = []
+    stops = []
+    for attraction_id in dict.fromkeys(must_see):
+        i = graph.index[attraction_id]
+        if i in (start, end):
+            continue
+        if i in dist.blocked:
+            excluded.append({'attraction_id': attraction_id, 'reason': 'avoided'})
+        elif dist[start][i] == INF or (end is not None and dist[i][end] == INF):
+            excluded.append({'attraction_id': attraction_id, 'reason': 'unreachable'})
+        else:
+            stops.append(i)
+    if end is not None and dist[start][end] == INF:
+        raise PlanningError('在当前回避条件下无法到达终点')
+
+    if not stops:
+        order = []
+    elif len(stops) <= EXACT_ORDER_LIMIT:
+        order = _order_exact(dist, start, stops, end)
+    else:
+        order = _order_heuristic(dist, start, stops, end)
+
+    seq = [start] + order + ([end] if end is not None else [])
+
+    def total(sequence):
+        stays = set(sequence)
+        return _tour_cost(dist, sequence) + sum(visit[i] for i in stays)
+
+    if fill and time_budget is not None:
+        chosen = set(seq)
+        candidates = [
+            i for i in range(len(graph.nodes))
+            if i not in chosen and i not in dist.blocked
+        ]
+        current = total(seq)
+        while candidates:
+            best = None
+            for c in candidates:
+                for pos in range(1, len(seq) if end is not None else len(seq) + 1):
+                    a = seq[pos - 1]
+                    delta = dist[a][c] + visit[c]
+                    if pos < len(seq):
+                        b = seq[pos]
+                        delta += dist.to(b)[c] - dist[a][b]
+                    if best is None or delta < best[0]:
+                        best = (delta, c, pos)
+            if best is None or current + best[0] > time_budget:
+                break
+            delta, c, pos = best
+            seq.insert(pos, c)
+            candidates.remove(c)
+            current += delta
+
+    travel = _tour_cost(dist, seq)
+    if travel == INF:
+        raise PlanningError('必去景点之间无法互相到达')
+    stays = list(dict.fromkeys(seq))
+    visit_minutes = sum(visit[i] for i in stays)
+    total_minutes = travel + visit_minutes
+
+    edge = dist.profile.edge
+    legs = []
+    for a, b in zip(seq, seq[1:]):
+        nodes = dist.path(a, b)
+        legs.append({
+            'from_attraction_id': graph.nodes[a].id,
+            'to_attraction_id': graph.nodes[b].id,
+            'minutes': _minutes(dist[a][b]),
+            'segments': [
+                {
+                    'from_attraction_id': graph.nodes[u].id,
+                    'to_attraction_id': graph.nodes[v].id,
+                    'segment_id': edge[(u, v)].id,
+                    'name': edge[(u, v)].name,
+                    'kind': edge[(u, v)].kind,
+                    'minutes': edge[(u, v)].minutes,
+                }
+                for u, v in zip(nodes, nodes[1:])
+            ],
+        })
+
+    return {
+        'feasible': not excluded and (time_budget is None or total_minutes <= time_budget),
+        'total_minutes': _minutes(total_minutes),
+        'travel_minutes': _minutes(travel),
+        'visit_minutes': _minutes(visit_minutes),
+        'time_budget': time_budget,
+        'stops': [
+            {'attraction_id': graph.nodes[i].id, 'name': graph.nodes[i].name,
+             'visit_minutes': visit[i]}
+            for i in stays
+        ],
+        'legs': legs,
+        'excluded_must_see': excluded,
+        'avoid': sorted(avoid),
+    }
+
+
+_graph = None
+_checked_at = 0.0
+_graph_lock = threading.Lock()
+
+
+def _invalidate():
+    global _checked_at
+    _checked_at = 0.0
+
+
+on_commit(TRAIL_GRAPH, _invalidate)
+
+
+def get_graph():
+    """
+    返回当前步道图，图数据版本变化后重新加载。
+    加载只读取景点和路段（O(N+E)），最短路在规划请求中按需计算，无需预计算或后台重建。
+    """
+    global _graph, _checked_at
+    now = time.monotonic()
+    graph = _graph
+    if graph is not None and now - _checked_at < GRAPH_VERSION_CHECK_INTERVAL:
+        return graph
+
+    version = get_version(TRAIL_GRAPH)
+    with _graph_lock:
+        _checked_at = now
+        graph = _graph
+        if graph is None or graph.version != version:
+            graph = _graph = TrailGraph(
+                version,
+                Attraction.query.order_by(Attraction.id).all(),
+                TrailSegment.query.order_by(TrailSegment.id).all(),
+            )
+        return graph
@@ -0,0 +1,69 @@
+# backend/versioning.py
+"""
+数据版本号：写入被跟踪的模型时，在同一事务里把 data_versions 表中对应名称的版本号加一。
+各进程通过比较版本号判断内存中的派生数据（快照、索引等）是否需要重建。
+"""
+from collections import defaultdict
+from itertools import chain
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from extensions import db
+
+_tracked = defaultdict(set)      # 模型类 -> 版本名称集合
+_listeners = defaultdict(list)   # 版本名称 -> 提交后回调
+
+
+def track_changes(name, *models):
+    """这些模型的行发生增删改时，递增名为 name 的版本号"""
+    for model in models:
+        _tracked[model].add(name)
+
+
+def on_commit(name, callback):
+    """本进程提交了影响 name 的写入后调用 callback()"""
+    _listeners[name].append(callback)
+
+
+def get_version(name):
+    """读取当前版本号，不存在时为 0"""
+    version = db.session.execute(
+        text('SELECT version FROM data_versions WHERE name = :name'), {'name': name}
+    ).scalar()
+    return version or 0
+
+
+def bump_version(connection, name):
+    connection.execute(text(
+        'INSERT INTO data_versions (name, version) VALUES (:name, 1) '
+        'ON CONFLICT(name) DO UPDATE SET version = version + 1'
+    ), {'name': name})
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_versions(session, flush_context):
+    names = set()
+    for obj in chain(session.new, session.deleted):
+        names |= _tracked.get(type(obj), set())
+    for obj in session.dirty:
+        if type(obj) in _tracked and session.is_modified(obj):
+            names |= _tracked[type(obj)]
+    if not names:
+        return
+    connection = session.connection()
+    for name in sorted(names):
+        bump_version(connection, name)
+    session.info.setdefault('changed_versions', set()).update(names)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_listeners(session):
+    for name in session.info.pop('changed_versions', ()):
+        for callback in _listeners[name]:
+            callback()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('changed_versions', None)